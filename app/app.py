@@ -1,34 +1,116 @@
 """The main module"""
 
-# TODO [Enhancement] enable method combining (combine/compare the nearness sample clipping intervals to evaluate the quality of a clip)
-# TODO [Enhancement] enable method chaining (feed samples from one method into another to create sub-clips)
+import os
 import sys
 
+import jobqueue
 import tester
 from audioprocessor import AudioProcessor
-from cli.cli import process_command_line_arguments
+from cli.cli import process_command_line_arguments, load_urls
 from configuration.configuration import Configuration
+from daemon import Daemon
+from jobqueue import JobQueue, Worker
 from logger import Logger
+from manifest import Manifest
+from metrics import Metrics
+from pipeline import Pipeline
+from scheduler import Scheduler
 
 
-def main():
-    configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug = process_command_line_arguments()
-    Configuration().load_configuration_and_logic(configuration_and_logic_file_path, work_root, verbose, debug)
+def process(recording: AudioProcessor, manifest: Manifest, url: str, logic_hash: str) -> bool:
+    """
+    Clip a source unless the run manifest shows that its clips are up to date
+    Args:
+    :param recording:  the audio processor
+    :param manifest:   the run manifest
+    :param url:        the Uniform Resource Identifier of the source
+    :param logic_hash: the hash of the current configuration and logic
+    """
+    source_hash: str = Manifest.source_hash(url)
 
-    recording = AudioProcessor(preserve_cache=True)
+    if manifest.is_current(url, source_hash, logic_hash):
+        Logger.debug(f"Skipping {url}, its {len(manifest.clips(url))} clips are up to date", separator=True)
+        Metrics.increment('sources_total', outcome='skipped')
+        return True
 
-    url = tester.source(10)
+    for clip in manifest.clips(url):  # clips exported with an earlier source or logic are stale
+        if os.path.isfile(clip):
+            os.remove(clip)
 
     try:
         recording.load(url)
-    except FileNotFoundError:
+        recording.normalize()
+        recording.slice()
+        recording.fade()
+        recording.export()
+    except FileNotFoundError as error:
         Logger.error(f"Unable to access {url} [Processing with next URL]")
-        sys.exit(-1)
+        manifest.fail(url, source_hash, logic_hash, str(error))
+        Metrics.increment('sources_total', outcome='failed')
+        return False
+    except Exception as error:
+        Logger.error(f"Unable to clip {url}: {error} [Processing with next URL]")
+        manifest.fail(url, source_hash, logic_hash, str(error))
+        Metrics.increment('sources_total', outcome='failed')
+        return False
+
+    manifest.complete(url, source_hash, logic_hash, recording.exported)
+    Metrics.increment('sources_total', outcome='processed')
+    return True
+
+
+def main():
+    configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, incremental, pipeline, schedule, coordinator, worker, job_queue, shard, daemon = process_command_line_arguments()
+    Configuration().load_configuration_and_logic(configuration_and_logic_file_path, work_root, verbose, debug)
+    Metrics.start()  # when a metrics file or port is configured
 
-    recording.normalize()
-    recording.slice()
-    recording.fade()
-    recording.export()
+    logic_hash: str = Manifest.logic_hash()
+
+    if not worker and daemon is None:
+        urls: [str] = [url] if url else load_urls(url_file_path) if url_file_path else [tester.source(10)]
+        if shard:  # a static hash partition, each node is given the same URLs and a different shard
+            urls = jobqueue.shard(urls, *jobqueue.parse_shard(shard))
+            Logger.debug(f"Shard {shard}: {len(urls)} sources")
+
+    if coordinator:  # the sources are processed by the worker nodes
+        jobs: JobQueue = JobQueue.open(job_queue)
+        queued: int = jobs.enqueue(urls, logic_hash)
+        Logger.debug(f"Queued {queued} of {len(urls)} sources: {jobs.counts()}", separator=True)
+        for job in jobs.dead():
+            Logger.warning(f"Dead-lettered {job['url']} after {job['attempts']} attempts: {job['error']}")
+        jobs.close()
+        return
+
+    recording = AudioProcessor(preserve_cache=True, incremental=incremental)
+
+    if daemon is not None:  # a long running process, warmed up once, serves the jobs submitted to it
+        service: Daemon = Daemon(recording, port=daemon if daemon else None)
+        service.warm_up()
+        service.serve()
+        return
+
+    manifest: Manifest = Manifest()
+
+    failures: int = 0
+    if worker:  # jobs are leased from the shared job queue until it is drained
+        jobs: JobQueue = JobQueue.open(job_queue)
+        processed, failures = Worker(jobs, recording, manifest, logic_hash).run()
+        jobs.close()
+        Logger.debug(f"Processed {processed + failures} sources, {failures} failed", separator=True)
+    elif pipeline:  # downloads, analysis, and exports of different sources overlap
+        failures = Pipeline(recording, manifest, logic_hash).run(urls)
+        Logger.debug(f"Processed {len(urls)} sources, {failures} failed", separator=True)
+    elif schedule:  # as many recordings at once as their estimated peak memory allows, the shortest first
+        failures = Scheduler(recording, manifest, logic_hash).run(urls)
+        Logger.debug(f"Processed {len(urls)} sources, {failures} failed", separator=True)
+    else:
+        for url in urls:
+            if not process(recording, manifest, url, logic_hash):
+                failures += 1
+        Logger.debug(f"Processed {len(urls)} sources, {failures} failed", separator=True)
+
+    if failures:
+        sys.exit(-1)
 
 
 if "__main__" == __name__:
@@ -1,15 +1,23 @@
 """
 The main audio processing module
 """
+import os
+import time
 from pathlib import Path
 from typing import Optional
 
 import loader
+from cache import Cache
+from catalog import Catalog
 from clip import Clip
 from configuration.configuration import Configuration
+from envelope import Envelope
+from exporter import Exporter
 from file import rm_md, md
 from logger import Logger
+from metrics import Metrics
 from normalizer import Normalizer
+from pcm import PCMRecording
 from slicer import Slicer
 from tagger import Tagger
 
@@ -19,52 +27,106 @@ class AudioProcessor(object):
     The class that orchestrates the audio processing methods
     """
 
-    def __init__(self, preserve_cache: bool = True):
+    def __init__(self, preserve_cache: bool = True, incremental: bool = False, cache: Cache = None):
         """
         Download a video or audio recording from the internet and save only the audio to a file
             - mono frame: single sample value
             - stereo frame: sample value pair
         Args:
         :param preserve_cache: should downloaded source media files be kept after processing to prevent re-download later
+                               (when not preserved, only the cache entries not in use by other processes are removed)
+        :param incremental:    keep the clips exported by prior runs (sources that are up to date in the run manifest are not reprocessed)
+        :param cache:          the cache of a processor that already prepared the working directories, e.g., for the recordings of a pipeline
+                               (the directories are not prepared, and the cache is not evicted, again)
         """
         import pydub
 
-        rm_md(cache_root=(None if preserve_cache else Configuration().get('cache_root')), export_root=Configuration().get('export_root'), log_root=Configuration().get('log_root'), temp_root=Configuration().get('temp_root'))
-
-        if preserve_cache:
+        if cache is None:
+            rm_md(cache_root=None, export_root=(None if incremental else Configuration().get('export_root')), log_root=Configuration().get('log_root'), temp_root=Configuration().get('temp_root'))
             md(Configuration().get('cache_root'), 'Cache root')
 
+            cache = Cache()
+
+            if preserve_cache:
+                cache.evict()
+            else:
+                cache.clear()
+
+        self.cache: Cache = cache
         self.tagger: Tagger = Tagger()
-        self.loader = loader.Loader(tagger=self.tagger)
+        self.loader = loader.Loader(tagger=self.tagger, cache=self.cache)
         self.slicer = Slicer()
+        self.catalog: Catalog = Catalog()
 
+        self.uri: Optional[str] = None
         self.recording: Optional[pydub.AudioSegment] = None
+        self.audio_file: Optional[str] = None
+        self.envelope: Optional[Envelope] = None
         self.clips: [Clip] = []
+        self.exported: [str] = []
+        self.cataloged: [{}] = []  # the clip manifest of the last export (file, interval, and slicing stages of each clip)
 
     def load(self, uri: str):
         """
-        Downloads or copies a file and converts it into a pydub AudioSegmant object
+        Downloads or copies a file and converts it into a pydub AudioSegmant object, trimmed of its leading and trailing silence
+        Args:
+        :param uri: The source Uniform Resource Identifier from which to extract the audio recording
+        """
+        return self.decode(uri).trim().store()
+
+    def decode(self, uri: str):
+        """
+        Downloads or copies a file (unless it is cached) and decodes it
         Args:
         :param uri: The source Uniform Resource Identifier from which to extract the audio recording
         """
-        self.recording, audio_file = self.loader.load(uri)
+        self.uri = uri
+
+        def within(recording, audio_file: str) -> None:  # the envelope is kept alongside the decoded audio in the cache entry, read or written before it can be evicted
+            self.envelope = Envelope.of(recording, f"{os.path.splitext(audio_file)[0]}.envelope.npz")
+
+        self.recording, self.audio_file = self.loader.load(uri, within)
         Logger.properties(self.recording, "Post-download recording characteristics")
+        return self
 
-        self.trim()
-        self.recording.export(audio_file, format=Configuration().get('output_file_type')).close()
-        self.tagger.write_audio_file_tags(audio_file)
+    def store(self):
+        """
+        Write the (trimmed) recording back to its cache entry audio file and tag it with the recording statistics
+        Note: the cache entry is locked again while it is rewritten (it may be in use by another process, and it may have been evicted since it was loaded)
+        """
+        if isinstance(self.recording, PCMRecording):  # the trimmed recording is a window of the memory mapped file, it is not rewritten
+            for tag, value in Tagger.statistics(self.recording, self.envelope).items():
+                self.tagger.set(tag, value)
+            return self
+        with self.loader.cache.entry(loader.Loader.key(self.uri), self.uri, lookup=False):
+            with Cache.atomic(self.audio_file) as part_file:
+                self.recording.export(part_file, format=Configuration().get('output_file_type')).close()
+            for tag, value in Tagger.statistics(self.recording, self.envelope).items():  # the trimmed recording is already in memory, no need to decode the file again
+                self.tagger.set(tag, value)
+            self.tagger.write_audio_file_tags(self.audio_file)
         Logger.properties(self.recording, "Post-trim recording characteristics")
         return self
 
     def trim(self):
+        """
+        Remove the leading and trailing silence of the recording, found from the 10 milisecond levels of its envelope
+        """
         import pydub
 
-        def trim(recording: pydub.AudioSegment):
-            import pydub.silence
+        if self.envelope is None:
+            self.envelope = Envelope.build(self.recording)
+        envelope: Envelope = self.envelope
 
+        def trim(recording: pydub.AudioSegment):
             trim.call += 1
-            silence_ms: int = pydub.silence.detect_leading_silence(recording, silence_threshold=-50.0, chunk_size=10)
+            silence_ms: int = envelope.silence(threshold=-50.0, chunk_miliseconds=10, reverse=(2 == trim.call))
+            frame_count: int = int(recording.frame_count())
+            silence_frames: int = min(frame_count, (silence_ms + 1) * recording.frame_rate // 1000)
             recording = recording[silence_ms + 1:].reverse()
+            if 1 == trim.call:
+                envelope.trim(silence_frames, frame_count)
+            else:
+                envelope.trim(0, frame_count - silence_frames)
 
             if Configuration().get('log_debug'):
                 debug_file_name: str = f"{Configuration().get('temp_root')}\\{'leading' if trim.call == 1 else 'leading.and.trailing'}.trim.wav"
@@ -75,6 +137,10 @@ class AudioProcessor(object):
             return recording
 
         Logger.properties(self.recording, "Pre-trim recording characteristics:")
+        if isinstance(self.recording, PCMRecording):
+            self.recording.trim(threshold=-50.0, chunk_miliseconds=10, envelope=envelope)
+            Logger.properties(self.recording, "Post-trim recording characteristics")
+            return self
         trim.call = 0
         self.recording = trim(trim(self.recording))
 
@@ -87,18 +153,63 @@ class AudioProcessor(object):
         Normalize the recording volume
         """
         Logger.properties(self.recording, "Pre-normalization recording characteristics:")
-        self.recording = Normalizer.stereo_normalization(self.recording)
+        peak: Optional[float] = self.envelope.peak() if self.envelope is not None else None  # no scan of the samples for their peak
+        self.recording = self.recording.normalize(peak=peak) if isinstance(self.recording, PCMRecording) else Normalizer.stereo_normalization(self.recording, peak)
+        if self.envelope is not None and peak is not None:
+            self.envelope.gain *= Normalizer.gain(peak)
         Logger.properties(self.recording, "Post-normalization recording characteristics")
         Logger.debug("Note: sample count should not be less than the prior sample count")
         return self
 
-    def slice(self, logic: [{}] = None):
+    def slice(self, logic: [{}] = None, meter=None, deadline: float = None):
         """
         Executes slicer methods in order defined in the methods list
+        Args:
+        :param logic:    the slicers to use to slice the recording and the slicer arguments (defaults to the configured logic)
+        :param meter:    measures the memory and CPU time of each stage's analysis (a scheduler.Meter)
+        :param deadline: the wall clock seconds the slicing may take (defaults to the configured slice deadline, 0 for no limit)
         """
         logic = logic if logic is not None else Configuration().get('logic')
         Logger.separator(mode='debug')
-        self.clips = self.slicer.slice(recording=self.recording, logic=logic).get()
+        with Metrics.timer('stage_seconds', stage='slice'):
+            self.clips = self.slicer.slice(recording=self.recording, logic=logic, envelope=self.envelope, meter=meter, deadline=deadline).get()
+        if Configuration().get('deduplicate_clips'):
+            self.deduplicate()
+        return self
+
+    def deduplicate(self):
+        """
+        Drop the clips that are near-duplicates (by fingerprint) of a better ranked clip of the recording, or of a clip exported from another source
+        """
+        import numpy
+        from features import Features
+        from fingerprint import Fingerprint
+
+        missing: [str] = Fingerprint.missing()
+        if missing or not self.clips:
+            if missing:
+                Logger.warning(f"Clip fingerprints require {missing}, which are not installed [Skipping de-duplication]")
+            return self
+
+        intervals: [(int, int)] = [(int(clip.begin['index']), int(clip.end['index'])) for clip in self.clips]
+        if self.slicer.features is not None:  # one batch from the shared short time Fourier transform
+            fingerprints = Fingerprint.of(self.slicer.features.chroma(), intervals)
+        else:  # a memory mapped recording has no shared features, each clip is analyzed from its own samples
+            fingerprints = numpy.concatenate([Fingerprint.of(Features(clip.segment).chroma(), [(0, int(clip.segment.frame_count()))]) for clip in self.clips])
+
+        keep = Fingerprint.distinct(fingerprints)
+        Metrics.increment('clips_deduplicated_total', int((~keep).sum()), scope='recording')
+        if Configuration().get('deduplicate_across_sources'):
+            for index, duplicate in zip(numpy.flatnonzero(keep), self.catalog.duplicates([fingerprints[index].tobytes() for index in numpy.flatnonzero(keep)], self.uri)):
+                if duplicate is not None:
+                    Logger.debug(f"Clip {intervals[index]} is a near-duplicate of {duplicate} [Not exported]")
+                    Metrics.increment('clips_deduplicated_total', scope='catalog')
+                    keep[index] = False
+
+        for clip, fingerprint in zip(self.clips, fingerprints):
+            clip.fingerprint = fingerprint.tobytes()
+        Logger.debug(f"De-duplication kept {int(keep.sum())} of {len(self.clips)} clips")
+        self.clips = [clip for clip, kept in zip(self.clips, keep) if kept]
         return self
 
     def fade(self, fade_in_duration: int = None, fade_out_duration: int = None):
@@ -118,11 +229,16 @@ class AudioProcessor(object):
         """
         Export the audio clips
         """
+        started: float = time.monotonic()
         export_root = Configuration().get('export_root')
         export_file_name = self.tagger.get('clip title')
         output_file_type = Configuration().get('output_file_type')
         Logger.debug(f"Exporting '{export_file_name}' clips to {export_root} as {output_file_type}", separator=True)
+        self.exported = []
+        self.cataloged = []
+        encode: [Clip] = []
         counter: int = 0
+        Path(export_root).mkdir(parents=True, exist_ok=True)
         for index, clip in enumerate(self.clips):
             begin: {} = getattr(clip, 'begin')
             begin_time: int = int(begin['time'] * 1000)
@@ -130,12 +246,29 @@ class AudioProcessor(object):
             end: {} = getattr(clip, 'end')
             end_time: int = int(end['time'] * 1000)
             end_index: int = int(end['index'])
-            Path(export_root).mkdir(parents=True, exist_ok=True)
             filename = f"{export_root}\\{export_file_name}.[{begin_time:,}-{end_time:,}].{output_file_type}"
-            getattr(clip, "segment").export(filename, format=output_file_type).close()
-            self.tagger.set('source time indexes', f"{begin_time:,}-{end_time * 1000:,}ms")
-            self.tagger.set('source sample indexes', f"{begin_index:,}-{end_index:,}")
-            self.tagger.write_audio_file_tags(filename)
+            if 'wav' == output_file_type:  # samples and tags written together, no temporary files or converter processes
+                self.tagger.set('source time indexes', f"{begin_time:,}-{end_time * 1000:,}ms")
+                self.tagger.set('source sample indexes', f"{begin_index:,}-{end_index:,}")
+                Exporter.write_wav(getattr(clip, "segment"), filename, self.tagger.tags)
+                self.tagger.mark_written(filename)
+            else:
+                encode += [clip]
+            self.exported += [filename]
+            self.cataloged += [{'path': filename, 'begin_index': begin_index, 'end_index': end_index, 'begin_miliseconds': begin_time, 'end_miliseconds': end_time, 'stages': getattr(clip, 'stages'), 'fingerprint': getattr(clip, 'fingerprint').hex() if getattr(clip, 'fingerprint') is not None else None}]
             counter += 1
+
+        if encode:  # compressed clips are encoded as a batch by a single converter process, then tagged
+            Exporter.encode([getattr(clip, "segment") for clip in encode], self.exported, output_file_type)
+            for clip, filename in zip(encode, self.exported):
+                begin: {} = getattr(clip, 'begin')
+                end: {} = getattr(clip, 'end')
+                self.tagger.set('source time indexes', f"{int(begin['time'] * 1000):,}-{int(end['time'] * 1000) * 1000:,}ms")
+                self.tagger.set('source sample indexes', f"{int(begin['index']):,}-{int(end['index']):,}")
+                self.tagger.write_audio_file_tags(filename)
+
+        self.catalog.record(self.uri, dict((tag, value) for tag, value in self.tagger.tags.items() if not tag.startswith('source ')), self.cataloged)  # one transaction per source
+        Metrics.increment('clips_exported_total', counter)
+        Metrics.observe('stage_seconds', time.monotonic() - started, stage='export')
         Logger.debug(f"Exported {counter} '{export_file_name}' clips to {export_root}", separator=True)
         return self
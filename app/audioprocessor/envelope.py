@@ -0,0 +1,233 @@
+"""
+The module that keeps a multi-resolution (min, max, RMS) envelope of a recording
+"""
+import math
+import os
+from typing import Optional
+
+from cache import Cache
+from logger import Logger
+from pcm import frames
+
+
+class Envelope(object):
+    """
+    A pyramid of the minimum, maximum, and mean square sample values (0.0 to 1.0 of full scale, all channels mixed) of a recording,
+    measured once at blocks of 1, 10, 100, and 1000 miliseconds
+
+    - a question about a range of the recording is answered from the coarsest level that resolves it, in O(range / level) rather than O(samples)
+    - as trimming and normalizing do not change the shape of the recording, they only set the offset, length, and gain applied to the answers
+    """
+    from numpy import ndarray
+
+    levels_miliseconds: [int] = [1, 10, 100, 1000]
+    factor: int = 10  # the blocks of a level per block of the next level
+
+    def __init__(self, frame_rate: int, frame_count: int, minimums: [ndarray], maximums: [ndarray], squares: [ndarray], counts: [ndarray]):
+        """
+        Args:
+        :param frame_rate:  the frames per second of the recording
+        :param frame_count: the frames of the recording
+        :param minimums:    the lowest sample value of each block, per level
+        :param maximums:    the highest sample value of each block, per level
+        :param squares:     the sum of the squared sample values of each block, per level
+        :param counts:      the number of sample values of each block, per level
+        """
+        self.frame_rate: int = frame_rate
+        self.frame_count: int = frame_count
+        self.block_frames: [int] = [(frame_rate // 1000) * miliseconds for miliseconds in Envelope.levels_miliseconds]
+        self.minimums: [ndarray] = minimums
+        self.maximums: [ndarray] = maximums
+        self.squares: [ndarray] = squares
+        self.counts: [ndarray] = counts
+        self.offset: int = 0  # the frame of the measured recording that is the first frame of the (trimmed) recording
+        self.length: int = frame_count
+        self.gain: float = 1.0
+
+    @staticmethod
+    def build(recording) -> 'Envelope':
+        """
+        Measure the finest level a window of samples at a time, then each coarser level from the level below it
+        Args:
+        :param recording: the in memory (AudioSegment) or memory mapped (PCMRecording) recording
+        """
+        import numpy
+
+        samples = frames(recording)
+        block_frames: int = max(1, recording.frame_rate // 1000)
+        blocks: int = math.ceil(len(samples) / block_frames)
+        full_scale: float = float(recording.max_possible_amplitude)
+
+        minimums = numpy.zeros(blocks, dtype=numpy.float32)
+        maximums = numpy.zeros(blocks, dtype=numpy.float32)
+        squares = numpy.zeros(blocks, dtype=numpy.float64)
+        counts = numpy.zeros(blocks, dtype=numpy.int64)
+
+        window_blocks: int = max(1, (1 << 20) // block_frames)
+        for first in range(0, blocks, window_blocks):
+            last: int = min(blocks, first + window_blocks)
+            window = samples[first * block_frames:last * block_frames].astype(numpy.float32).reshape(-1) / full_scale
+            starts = numpy.arange(0, len(window), block_frames * recording.channels)
+            minimums[first:last] = numpy.minimum.reduceat(window, starts)
+            maximums[first:last] = numpy.maximum.reduceat(window, starts)
+            squares[first:last] = numpy.add.reduceat(numpy.square(window, dtype=numpy.float64), starts)
+            counts[first:last] = numpy.diff(numpy.append(starts, len(window)))
+
+        levels: ([ndarray], [ndarray], [ndarray], [ndarray]) = ([minimums], [maximums], [squares], [counts])
+        for _ in Envelope.levels_miliseconds[1:]:
+            starts = numpy.arange(0, len(levels[0][-1]), Envelope.factor)
+            levels[0].append(numpy.minimum.reduceat(levels[0][-1], starts) if len(starts) else levels[0][-1][:0])
+            levels[1].append(numpy.maximum.reduceat(levels[1][-1], starts) if len(starts) else levels[1][-1][:0])
+            levels[2].append(numpy.add.reduceat(levels[2][-1], starts) if len(starts) else levels[2][-1][:0])
+            levels[3].append(numpy.add.reduceat(levels[3][-1], starts) if len(starts) else levels[3][-1][:0])
+
+        return Envelope(recording.frame_rate, len(samples), *levels)
+
+    @staticmethod
+    def load(file_path: str, recording) -> Optional['Envelope']:
+        """
+        Read the envelope of a recording from a file, None when there is no envelope file or it was measured from other audio
+        """
+        import numpy
+
+        try:
+            with numpy.load(file_path, allow_pickle=False) as stored:
+                if int(stored['frame_rate']) != recording.frame_rate or int(stored['frame_count']) != int(recording.frame_count()):
+                    return None
+                levels: int = len(Envelope.levels_miliseconds)
+                return Envelope(recording.frame_rate, int(recording.frame_count()), *[[stored[f"{name}_{level}"] for level in range(levels)] for name in ('minimums', 'maximums', 'squares', 'counts')])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as error:
+            Logger.warning(f"Envelope file {file_path} is unreadable and will be measured again [{error}]")
+            return None
+
+    def save(self, file_path: str) -> None:
+        import numpy
+
+        arrays: {} = {'frame_rate': numpy.array(self.frame_rate), 'frame_count': numpy.array(self.frame_count)}
+        for name in ('minimums', 'maximums', 'squares', 'counts'):
+            for level, array in enumerate(getattr(self, name)):
+                arrays[f"{name}_{level}"] = array
+        with Cache.atomic(file_path) as part_file_path:
+            with open(part_file_path, 'wb') as npz_file:
+                numpy.savez(npz_file, **arrays)
+
+    @staticmethod
+    def of(recording, file_path: str = None) -> 'Envelope':
+        """
+        The envelope of a recording, read from its envelope file when there is one, otherwise measured (and written to the file)
+        Args:
+        :param recording: the in memory (AudioSegment) or memory mapped (PCMRecording) recording
+        :param file_path: the envelope file kept alongside the decoded audio in the cache
+        """
+        envelope: Optional[Envelope] = Envelope.load(file_path, recording) if file_path is not None and os.path.isfile(file_path) else None
+        if envelope is None:
+            envelope = Envelope.build(recording)
+            Logger.debug(f"Measured the envelope of the recording at {Envelope.levels_miliseconds} miliseconds")
+            if file_path is not None:
+                envelope.save(file_path)
+        return envelope
+
+    def trim(self, begin: int, end: int) -> 'Envelope':
+        """
+        Narrow the envelope to the frames begin to end of the current recording
+        """
+        self.offset += begin
+        self.length = max(0, min(self.length, end) - begin)
+        return self
+
+    def level(self, resolution_frames: int) -> int:
+        """
+        The coarsest level whose blocks are no larger than the resolution
+        """
+        level: int = 0
+        while level + 1 < len(self.block_frames) and self.block_frames[level + 1] <= resolution_frames:
+            level += 1
+        return level
+
+    def block(self, resolution_miliseconds: int) -> int:
+        """
+        The frames of each block a query at a resolution answers about (the resolution rounded to the blocks of the level that answers)
+        """
+        resolution_frames: int = max(1, (self.frame_rate // 1000) * resolution_miliseconds)
+        block: int = self.block_frames[self.level(resolution_frames)]
+        return block * max(1, resolution_frames // block)
+
+    def query(self, begin: int = 0, end: int = None, resolution_miliseconds: int = 10) -> (ndarray, ndarray, ndarray):
+        """
+        The minimum, maximum, and RMS level (-1.0 to 1.0, 0.0 to 1.0) of each consecutive resolution sized block of a range of the recording
+        Args:
+        :param begin:                  the first frame of the range
+        :param end:                    the frame after the range (defaults to the end of the recording)
+        :param resolution_miliseconds: the size of the blocks (rounded to the blocks of the level that answers)
+        """
+        import numpy
+
+        end = self.length if end is None else min(end, self.length)
+        resolution_frames: int = max(1, (self.frame_rate // 1000) * resolution_miliseconds)
+        level: int = self.level(resolution_frames)
+        block: int = self.block_frames[level]
+        first: int = (self.offset + max(0, begin)) // block
+        last: int = max(first, math.ceil((self.offset + end) / block))
+        starts = numpy.arange(0, last - first, self.block(resolution_miliseconds) // block)
+        if 0 == len(starts) or first >= len(self.counts[level]):
+            return numpy.zeros(0), numpy.zeros(0), numpy.zeros(0)
+        last = min(last, len(self.counts[level]))
+        starts = starts[starts < last - first]
+
+        minimums = numpy.minimum.reduceat(self.minimums[level][first:last], starts) * self.gain
+        maximums = numpy.maximum.reduceat(self.maximums[level][first:last], starts) * self.gain
+        counts = numpy.add.reduceat(self.counts[level][first:last], starts)
+        rms = numpy.sqrt(numpy.add.reduceat(self.squares[level][first:last], starts) / numpy.maximum(counts, 1)) * self.gain
+        return numpy.clip(minimums, -1.0, 1.0), numpy.clip(maximums, -1.0, 1.0), rms
+
+    def peak(self, begin: int = 0, end: int = None) -> float:
+        """
+        The highest absolute sample value (0.0 to 1.0) in a range of the recording
+        """
+        minimums, maximums, _ = self.query(begin, end, self.resolution(begin, end))
+        return float(max(-minimums.min(), maximums.max())) if len(maximums) else 0.0
+
+    def rms(self, begin: int = 0, end: int = None) -> float:
+        """
+        The RMS level (0.0 to 1.0) of a range of the recording
+        """
+        import numpy
+
+        _, _, rms = self.query(begin, end, self.resolution(begin, end))
+        return float(numpy.sqrt(numpy.mean(numpy.square(rms)))) if len(rms) else 0.0
+
+    def resolution(self, begin: int, end: int = None) -> int:
+        """
+        The miliseconds resolution that answers a question about a whole range from about a hundred blocks
+        """
+        end = self.length if end is None else min(end, self.length)
+        return max(1, (end - begin) // max(1, self.frame_rate // 1000) // 100)
+
+    def silence(self, threshold: float = -50.0, chunk_miliseconds: int = 10, reverse: bool = False) -> int:
+        """
+        The miliseconds of silence (chunks whose RMS level is below the threshold) that lead (or trail) the recording
+        Args:
+        :param threshold:         the level in decibels full scale below which a chunk is silent
+        :param chunk_miliseconds: the size of the chunks whose level is measured
+        :param reverse:           measure the trailing silence
+        """
+        import numpy
+
+        _, _, rms = self.query(0, None, chunk_miliseconds)
+        loud = numpy.flatnonzero((rms[::-1] if reverse else rms) >= 10 ** (threshold / 20))
+        return int(loud[0]) * chunk_miliseconds if len(loud) else len(rms) * chunk_miliseconds
+
+    def thumbnail(self, width: int) -> (ndarray, ndarray):
+        """
+        The minimum and maximum levels of width equal columns of the recording, e.g., to draw a waveform
+        """
+        import numpy
+
+        resolution: int = max(1, self.length // max(1, self.frame_rate // 1000) // max(1, width))
+        minimums, maximums, _ = self.query(0, None, resolution)
+        if len(minimums) <= width:
+            return minimums, maximums
+        starts = (numpy.arange(width) * len(minimums)) // width  # the blocks are regrouped into exactly width columns
+        return numpy.minimum.reduceat(minimums, starts), numpy.maximum.reduceat(maximums, starts)
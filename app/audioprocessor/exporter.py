@@ -0,0 +1,173 @@
+"""
+The module that writes audio clips to files
+"""
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+
+from cache import Cache
+from logger import Logger
+
+# Tags written as ID3v2 text frames (all other tags are written as user defined TXXX frames, the way taglib maps them)
+
+tag_to_id3_frame: {} = {
+    'title': 'TIT2', 'subtitle': 'TIT3', 'artist': 'TPE1', 'albumartist': 'TPE2', 'album artist': 'TPE2', 'conductor': 'TPE3', 'remixer': 'TPE4',
+    'album': 'TALB', 'genre': 'TCON', 'date': 'TDRC', 'composer': 'TCOM', 'lyricist': 'TEXT', 'tracknumber': 'TRCK', 'copyright': 'TCOP',
+    'encodedby': 'TENC', 'publisher': 'TPUB', 'isrc': 'TSRC', 'bpm': 'TBPM'
+}
+
+# Tags also written to the RIFF LIST INFO chunk (read by players that do not understand the id3 chunk)
+
+tag_to_riff_info: {} = {
+    'title': b'INAM', 'artist': b'IART', 'album': b'IPRD', 'comment': b'ICMT', 'genre': b'IGNR', 'date': b'ICRD', 'tracknumber': b'ITRK', 'copyright': b'ICOP'
+}
+
+# Encoder and ffmpeg muxer for the compressed output file types
+
+encoders: {} = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'ogg': ('libvorbis', 'ogg'),
+    'opus': ('libopus', 'opus'),
+    'flac': ('flac', 'flac'),
+    'm4a': ('aac', 'ipod'),
+    'aac': ('aac', 'adts')
+}
+
+raw_sample_formats: {} = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+
+unsigned_bias: bytes = bytes((value + 128) & 0xFF for value in range(256))  # 8 bit WAV samples are unsigned
+
+
+def syncsafe(size: int) -> bytes:
+    """
+    ID3v2.4 sizes are stored 7 bits per byte
+    """
+    return bytes(((size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F))
+
+
+def id3_frame(frame_id: str, body: bytes) -> bytes:
+    return frame_id.encode('ascii') + syncsafe(len(body)) + b'\x00\x00' + body
+
+
+def id3_tag(tags: {}) -> bytes:
+    """
+    Build an ID3v2.4 tag (UTF-8 text frames) from the tags
+    Args:
+    :param tags: the tag names and values
+    """
+    frames: bytes = b''
+    for tag, value in tags.items():
+        value: bytes = str(value).encode('utf-8')
+        if tag in tag_to_id3_frame:
+            frames += id3_frame(tag_to_id3_frame[tag], b'\x03' + value)
+        elif 'comment' == tag:
+            frames += id3_frame('COMM', b'\x03eng\x00' + value)
+        else:
+            frames += id3_frame('TXXX', b'\x03' + tag.upper().encode('utf-8') + b'\x00' + value)
+    return b'ID3\x04\x00\x00' + syncsafe(len(frames)) + frames
+
+
+def riff_chunk(chunk_id: bytes, data: bytes) -> bytes:
+    return chunk_id + struct.pack('<I', len(data)) + data + (b'\x00' if len(data) % 2 else b'')
+
+
+def riff_info(tags: {}) -> bytes:
+    """
+    Build a RIFF LIST INFO chunk from the tags
+    Args:
+    :param tags: the tag names and values
+    """
+    info: bytes = b''.join(riff_chunk(tag_to_riff_info[tag], str(value).encode('utf-8') + b'\x00') for tag, value in tags.items() if tag in tag_to_riff_info)
+    return riff_chunk(b'LIST', b'INFO' + info) if info else b''
+
+
+class Exporter(object):
+    """
+    Writes WAV files directly from the sample buffer, and encodes compressed files in batches with a single ffmpeg process
+    """
+    import pydub
+
+    @staticmethod
+    def write_wav(segment: pydub.AudioSegment, filename: str, tags: {} = None) -> None:
+        """
+        Write a WAV file, including its RIFF INFO and ID3 tag chunks, in a single write from the sample buffer
+        Args:
+        :param segment:  the audio to be written
+        :param filename: the WAV file to be (over)written
+        :param tags:     the tags to embed in the file
+        """
+        tags = tags if tags is not None else {}
+        data: bytes = segment.raw_data if 1 != segment.sample_width else segment.raw_data.translate(unsigned_bias)
+        block_align: int = segment.channels * segment.sample_width
+        chunks: bytes = riff_chunk(b'fmt ', struct.pack('<HHIIHH', 1, segment.channels, segment.frame_rate, segment.frame_rate * block_align, block_align, 8 * segment.sample_width))
+        chunks += riff_chunk(b'data', data)
+        chunks += riff_info(tags)
+        if tags:
+            chunks += riff_chunk(b'id3 ', id3_tag(tags))
+
+        with Cache.atomic(filename) as part_filename:
+            with open(part_filename, 'wb') as wav_file:
+                wav_file.write(b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks)
+
+    @staticmethod
+    def encode(segments: [pydub.AudioSegment], filenames: [str], output_file_type: str) -> None:
+        """
+        Encode a batch of clips with one ffmpeg process: the clips are streamed in turn through a pipe as raw samples, and a filter graph
+        splits the stream at the exact sample where each clip begins and ends, into one encoder and file per clip
+        Note: each clip is encoded on its own, so its file holds exactly the clip's samples (the encoder delay and padding are recorded
+              in the container where it has a place for them e.g., the LAME header of an mp3, the edit list of an m4a, or the Opus pre-skip)
+        Args:
+        :param segments:         the clips to be encoded (all with the same frame rate, channels, and sample width)
+        :param filenames:        the file to be (over)written for each clip
+        :param output_file_type: the compressed file type e.g., 'mp3' or 'ogg'
+        """
+        import pydub
+
+        if not segments:
+            return
+
+        encoder, muxer = encoders.get(output_file_type, (None, output_file_type))
+        frame_rate: int = segments[0].frame_rate
+        channels: int = segments[0].channels
+        sample_width: int = segments[0].sample_width
+
+        # The [begin, end) sample offsets of each clip in the stream, each clip's branch of the graph trims the stream to its offsets
+
+        offsets: [(int, int)] = []
+        position: int = 0
+        for segment in segments:
+            clip_samples: int = int(segment.frame_count())
+            offsets += [(position, position + clip_samples)]
+            position += clip_samples
+
+        branches: str = ''.join(f"[split{index}]" for index in range(len(segments)))
+        graph: str = f"[0:a]asplit={len(segments)}{branches}" if 1 < len(segments) else "[0:a]anull[split0]"
+        graph += ''.join(f";[split{index}]atrim=start_sample={begin}:end_sample={end},asetpts=PTS-STARTPTS[clip{index}]" for index, (begin, end) in enumerate(offsets))
+
+        workspace: str = tempfile.mkdtemp(prefix='bytter.encode.')
+        command: [str] = [pydub.AudioSegment.converter, '-hide_banner', '-loglevel', 'error', '-y',
+                          '-f', raw_sample_formats[sample_width], '-ar', str(frame_rate), '-ac', str(channels), '-i', 'pipe:0', '-filter_complex', graph]
+        for index in range(len(segments)):
+            command += ['-map', f"[clip{index}]"] + (['-c:a', encoder] if encoder is not None else []) + ['-f', muxer, os.path.join(workspace, f"clip.{index:06d}.{output_file_type}")]
+
+        Logger.debug(f"Encoding {len(segments)} clips as {output_file_type} with one {encoder if encoder is not None else 'default'} encoder process")
+
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                for segment in segments:
+                    process.stdin.write(segment.raw_data if 1 != sample_width else segment.raw_data.translate(unsigned_bias))
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            errors: bytes = process.stderr.read()
+            if 0 != process.wait():
+                Logger.error(f"Encoding clips as {output_file_type} failed: {errors.decode('utf-8', errors='replace')}")
+                raise RuntimeError(f"ffmpeg exited with status {process.returncode} encoding {output_file_type} clips")
+
+            for index, filename in enumerate(filenames):
+                os.replace(os.path.join(workspace, f"clip.{index:06d}.{output_file_type}"), filename)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
@@ -1,6 +1,7 @@
 """
 The module that provides audio volume leveling functionality
 """
+import math
 
 
 class Normalizer(object):
@@ -12,13 +13,23 @@ class Normalizer(object):
     stereo_normalizer = getattr(pydub.AudioSegment, 'normalize')
 
     @staticmethod
-    def stereo_normalization(recording: pydub.AudioSegment) -> pydub.AudioSegment:
+    def gain(peak: float, headroom: float = 0.1) -> float:
+        """
+        The gain that brings a peak (0.0 to 1.0 of full scale) to the headroom below full scale (as pydub's normalize does)
+        """
+        return 10 ** ((-20 * math.log10(peak) - headroom) / 20) if 0 < peak else 1.0
+
+    @staticmethod
+    def stereo_normalization(recording: pydub.AudioSegment, peak: float = None) -> pydub.AudioSegment:
         """
         Stereo volume normalization
         Args:
         :param recording: an audio segment object that contains the audio samples to be processed
+        :param peak:      the already measured peak (0.0 to 1.0 of full scale) of the recording e.g., from its envelope (the samples are scanned when not provided)
         """
-        return Normalizer.stereo_normalizer(recording)
+        if peak is None:
+            return Normalizer.stereo_normalizer(recording)
+        return recording.apply_gain(20 * math.log10(Normalizer.gain(peak))) if 0 < peak else recording
 
     from numpy import ndarray
 
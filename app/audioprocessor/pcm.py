@@ -0,0 +1,233 @@
+"""
+The module that processes very long recordings out of core, from a memory mapped PCM file
+"""
+import math
+import os
+import subprocess
+from typing import Optional
+
+from cache import Cache
+from configuration.configuration import Configuration
+from logger import Logger
+
+raw_sample_formats: {} = {2: 's16le', 4: 's32le'}
+
+
+def frames(recording):
+    """
+    The (frames, channels) samples of an in memory (AudioSegment) or memory mapped (PCMRecording) recording, without copying them
+    Note: the gain of a normalized PCMRecording is not applied
+    Args:
+    :param recording: the recording
+    """
+    import numpy
+
+    if isinstance(recording, PCMRecording):
+        return recording.frames()
+    samples = numpy.frombuffer(recording.raw_data, dtype={1: numpy.int8, 2: numpy.int16, 4: numpy.int32}[recording.sample_width])
+    return samples[:len(samples) - len(samples) % recording.channels].reshape(-1, recording.channels)
+
+
+class PCMRecording(object):
+    """
+    A recording decoded to a raw PCM file and memory mapped, so that only the windows being processed are resident in memory
+
+    - stands in for a pydub AudioSegment wherever the pipeline only needs the recording's format, size, statistics, and sample slices
+    - trimming narrows the window of the file that is the recording, and normalizing sets a gain applied as windows are read (neither copies the file)
+    - sample slices are read into (small) AudioSegment objects, e.g., to slice a window or to cut a clip
+    """
+    import pydub
+    from numpy import ndarray
+
+    def __init__(self, file_path: str, frame_rate: int, channels: int, sample_width: int):
+        """
+        Args:
+        :param file_path:    the raw (headerless, interleaved, little endian) PCM file
+        :param frame_rate:   the frames per second of the PCM file
+        :param channels:     the channels of the PCM file
+        :param sample_width: the bytes per sample of the PCM file (2 or 4)
+        """
+        import numpy
+        import pydub
+
+        self.file_path: str = file_path
+        self.frame_rate: int = frame_rate
+        self.channels: int = channels
+        self.sample_width: int = sample_width
+        self.converter: str = pydub.AudioSegment.converter
+        self.samples: numpy.memmap = numpy.memmap(file_path, dtype={2: numpy.int16, 4: numpy.int32}[sample_width], mode='r').reshape(-1, channels)
+        self.begin: int = 0
+        self.end: int = len(self.samples)
+        self.gain: float = 1.0
+        self.measured: Optional[(int, float)] = None  # the (max, rms) of the window before gain
+
+    @staticmethod
+    def decode(media_file: str, pcm_file: str) -> 'PCMRecording':
+        """
+        Decode a media file to a raw PCM file in the configured format (streamed by the converter, the audio is never held in memory)
+        Args:
+        :param media_file: the media (video or audio) file to be decoded
+        :param pcm_file:   the raw PCM file to be written (an existing file is reused)
+        """
+        import pydub
+
+        frame_rate: int = Configuration().get('frame_rate')
+        channels: int = Configuration().get('channels')
+        sample_width: int = Configuration().get('sample_width') if Configuration().get('sample_width') in raw_sample_formats else 2
+
+        if os.path.isfile(pcm_file):
+            Logger.debug(f"Decoded PCM file {pcm_file} is cached on the local file system")
+        else:
+            Logger.debug(f"Decoding {media_file} to the PCM file {pcm_file}")
+            with Cache.atomic(pcm_file) as part_file:
+                command: [str] = [pydub.AudioSegment.converter, '-hide_banner', '-loglevel', 'error', '-y', '-i', media_file, '-vn',
+                                  '-f', raw_sample_formats[sample_width], '-ar', str(frame_rate), '-ac', str(channels), part_file]
+                completed = subprocess.run(command, stderr=subprocess.PIPE)
+                if 0 != completed.returncode:
+                    Logger.error(f"Decoding {media_file} failed: {completed.stderr.decode('utf-8', errors='replace')}")
+                    raise RuntimeError(f"ffmpeg exited with status {completed.returncode} decoding {media_file}")
+
+        return PCMRecording(pcm_file, frame_rate, channels, sample_width)
+
+    def frame_count(self) -> int:
+        return self.end - self.begin
+
+    def __len__(self) -> int:
+        """
+        The duration in miliseconds (as for an AudioSegment)
+        """
+        return round(1000 * self.frame_count() / self.frame_rate)
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.frame_count() / self.frame_rate
+
+    @property
+    def max_possible_amplitude(self) -> float:
+        return (2 ** (self.sample_width * 8)) / 2
+
+    def frames(self) -> ndarray:
+        """
+        The (frames, channels) samples of the recording as a view of the memory mapped file (the gain is not applied)
+        """
+        return self.samples[self.begin:self.end]
+
+    def window_frames(self) -> int:
+        return max(1, (self.frame_rate // 1000) * Configuration().get('out_of_core_window_miliseconds'))
+
+    def get_sample_slice(self, start_sample: int = None, end_sample: int = None) -> pydub.AudioSegment:
+        """
+        Read frames of the recording (gain applied) into an AudioSegment
+        Args:
+        :param start_sample: the index of the first frame
+        :param end_sample:   the index after the last frame
+        """
+        import numpy
+        import pydub
+
+        start_sample = max(0, start_sample if start_sample is not None else 0)
+        end_sample = min(self.frame_count(), end_sample if end_sample is not None else self.frame_count())
+        window = self.samples[self.begin + start_sample:self.begin + max(start_sample, end_sample)]
+        if 1.0 != self.gain:
+            limit: int = int(self.max_possible_amplitude)
+            window = numpy.clip(numpy.rint(window.astype(numpy.float64) * self.gain), -limit, limit - 1).astype(window.dtype)
+        return pydub.AudioSegment(data=numpy.ascontiguousarray(window).tobytes(), frame_rate=self.frame_rate, sample_width=self.sample_width, channels=self.channels)
+
+    def measure(self) -> (int, float):
+        """
+        The peak and RMS sample values of the recording before gain, read a block at a time
+        """
+        import numpy
+
+        if self.measured is None:
+            peak: int = 0
+            squares: float = 0.0
+            frames = self.frames()
+            for first in range(0, len(frames), self.window_frames()):
+                block = frames[first:first + self.window_frames()].astype(numpy.float64)
+                if block.size:
+                    peak = max(peak, int(numpy.abs(block).max()))
+                    squares += float(numpy.square(block).sum())
+            self.measured = (peak, math.sqrt(squares / max(1, frames.size)))
+        return self.measured
+
+    @property
+    def max(self) -> int:
+        return min(int(self.max_possible_amplitude), int(self.measure()[0] * self.gain))
+
+    @property
+    def rms(self) -> int:
+        return int(self.measure()[1] * self.gain)
+
+    @property
+    def dBFS(self) -> float:
+        return 20 * math.log10(self.rms / self.max_possible_amplitude) if self.rms else -float("infinity")
+
+    @property
+    def max_dBFS(self) -> float:
+        return 20 * math.log10(self.max / self.max_possible_amplitude) if self.max else -float("infinity")
+
+    def silence(self, threshold: float = -50.0, chunk_miliseconds: int = 10, reverse: bool = False) -> int:
+        """
+        The miliseconds of silence (chunks quieter than the threshold) that lead (or trail) the recording, read a window at a time
+        Args:
+        :param threshold:         the level in decibels full scale below which a chunk is silent
+        :param chunk_miliseconds: the size of the chunks whose level is measured
+        :param reverse:           measure the trailing silence
+        """
+        import numpy
+        from numpy import ndarray
+
+        chunk_frames: int = max(1, (self.frame_rate // 1000) * chunk_miliseconds)
+        window: int = max(1, self.window_frames() // chunk_frames) * chunk_frames
+        level: float = self.max_possible_amplitude * 10 ** (threshold / 20) / self.gain  # the RMS sample value of the threshold, before gain
+        frames = self.frames()
+        total: int = len(frames)
+
+        def levels(block: ndarray) -> ndarray:  # the RMS sample value of each chunk of a block (the last chunk may be short)
+            starts = numpy.arange(0, len(block), chunk_frames)
+            squares = numpy.square(block.astype(numpy.float64)).sum(axis=1)
+            return numpy.sqrt(numpy.add.reduceat(squares, starts) / (numpy.diff(numpy.append(starts, len(block))) * self.channels))
+
+        for first in range(0, total, window):
+            block = frames[first:first + window] if not reverse else frames[max(0, total - first - window):total - first][::-1]  # reversed, chunks align with the end
+            loud = numpy.flatnonzero(levels(block) >= level)
+            if len(loud):
+                return (first // chunk_frames + int(loud[0])) * chunk_miliseconds
+        return len(self)
+
+    def trim(self, threshold: float = -50.0, chunk_miliseconds: int = 10, envelope=None) -> 'PCMRecording':
+        """
+        Narrow the recording to exclude its leading and trailing silence (as AudioProcessor.trim does for an in memory recording)
+        Args:
+        :param threshold:         the level in decibels full scale below which a chunk is silent
+        :param chunk_miliseconds: the size of the chunks whose level is measured
+        :param envelope:          the envelope of the recording, the silence is found from its levels rather than the samples (and it is trimmed too)
+        """
+        silence = envelope.silence if envelope is not None else self.silence
+        leading: int = silence(threshold, chunk_miliseconds)
+        begin: int = min(self.end - self.begin, (leading + 1) * self.frame_rate // 1000)
+        self.begin += begin
+        if envelope is not None:
+            envelope.trim(begin, self.end - self.begin + begin)
+        Logger.debug(f"Trimmed {leading} ms of leading silence from the recording")
+        trailing: int = silence(threshold, chunk_miliseconds, reverse=True)
+        self.end = max(self.begin, self.end - (trailing + 1) * self.frame_rate // 1000)
+        if envelope is not None:
+            envelope.trim(0, self.end - self.begin)
+        Logger.debug(f"Trimmed {trailing} ms of trailing silence from the recording")
+        self.measured = None
+        return self
+
+    def normalize(self, headroom: float = 0.1, peak: float = None) -> 'PCMRecording':
+        """
+        Set the gain that brings the peak to the headroom below full scale (as pydub's normalize does)
+        Args:
+        :param headroom: the decibels below full scale of the normalized peak
+        :param peak:     the already measured peak (0.0 to 1.0 of full scale) before gain e.g., from the envelope (the samples are scanned when not provided)
+        """
+        peak = peak if peak is not None else self.measure()[0] / self.max_possible_amplitude
+        if peak:
+            self.gain = 10 ** ((-20 * math.log10(peak) - headroom) / 20)
+        Logger.debug(f"Normalization gain {self.gain:.4f}")
+        return self
@@ -0,0 +1,4 @@
+"""Cache module that indexes, locks, and size limits the media files held in the application cache directory, and keeps audio analysis results"""
+
+from .analysis import AnalysisCache
+from .cache import Cache, FileLock
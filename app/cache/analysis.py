@@ -0,0 +1,109 @@
+"""
+Persistent on disk cache of audio analysis results (NumPy .npz files)
+"""
+import hashlib
+import json
+import os
+from importlib.metadata import version, PackageNotFoundError
+
+from configuration.configuration import Configuration
+from logger import Logger
+from metrics import Metrics
+
+from .cache import Cache
+
+
+class AnalysisCache(object):
+    """
+    Analysis results (e.g., beat tracks, onset envelopes) kept across runs so that iterating on a logic file does not recompute them
+
+    - an entry is keyed by the hash of the decoded audio, the analysis frame rate, the feature name, its parameters, and the analysis library version
+    - an entry holds a NumPy array, or a tuple of arrays, in an .npz file named by the key
+    """
+
+    def __init__(self, cache_root: str = None, enabled: bool = None, library: str = 'librosa'):
+        """
+        Args:
+        :param cache_root: the directory holding the analysis results (defaults to the configured analysis cache root)
+        :param enabled:    read and write analysis results (defaults to the configured setting)
+        :param library:    the analysis library whose version is part of every key
+        """
+        self.cache_root: str = cache_root if cache_root is not None else Configuration().get('analysis_cache_root')
+        self.enabled: bool = enabled if enabled is not None else Configuration().get('analysis_cache')
+        try:
+            self.library_version: str = f"{library} {version(library)}"
+        except PackageNotFoundError:
+            self.library_version: str = f"{library} unknown"
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def key(self, audio_hash: str, frame_rate: int, feature: str, parameters: {}) -> str:
+        """
+        Args:
+        :param audio_hash: the hash of the decoded audio samples
+        :param frame_rate: the frame rate the audio was analyzed at
+        :param feature:    the name of the analysis e.g., 'beat_track'
+        :param parameters: the parameters of the analysis
+        """
+        description: str = json.dumps([audio_hash, frame_rate, feature, parameters, self.library_version], sort_keys=True, default=str)
+        return f"{feature}.{hashlib.md5(description.encode('utf-8')).hexdigest()}"
+
+    def path(self, key: str) -> str:
+        return f"{self.cache_root}\\{key}.npz"
+
+    def get(self, key: str):
+        """
+        The cached analysis result, or None when the result is not cached (or is unreadable)
+        """
+        import numpy
+
+        try:
+            with numpy.load(self.path(key), allow_pickle=False) as entry:
+                arrays = [entry[f"arr_{index}"] for index in range(len(entry.files) - 1)]
+                return tuple(arrays) if 'tuple' == str(entry['kind']) else arrays[0]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as error:
+            Logger.warning(f"Analysis cache entry {self.path(key)} is unreadable and will be recomputed [{error}]")
+            os.remove(self.path(key))
+            return None
+
+    def put(self, key: str, value) -> None:
+        """
+        Store an analysis result, a NumPy array or a tuple of them
+        """
+        import numpy
+
+        os.makedirs(self.cache_root, exist_ok=True)
+        arrays = value if isinstance(value, tuple) else (value,)
+        with Cache.atomic(self.path(key)) as part_file_path:
+            with open(part_file_path, 'wb') as npz_file:
+                numpy.savez(npz_file, *[numpy.asarray(array) for array in arrays], kind=numpy.array('tuple' if isinstance(value, tuple) else 'array'))
+
+    def fetch(self, audio_hash: str, frame_rate: int, feature: str, parameters: {}, compute):
+        """
+        Read an analysis result from the cache, computing and storing it on a miss
+        Args:
+        :param audio_hash: the hash of the decoded audio samples
+        :param frame_rate: the frame rate the audio is analyzed at
+        :param feature:    the name of the analysis e.g., 'beat_track'
+        :param parameters: the parameters of the analysis
+        :param compute:    the function that computes the result
+        """
+        if not self.enabled:
+            return compute()
+
+        key: str = self.key(audio_hash, frame_rate, feature, parameters)
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            Metrics.increment('cache_requests_total', cache='analysis', result='hit')
+            Logger.debug(f"Analysis cache hit for '{feature}' [{key}]")
+            return value
+
+        self.misses += 1
+        Metrics.increment('cache_requests_total', cache='analysis', result='miss')
+        Logger.debug(f"Analysis cache miss for '{feature}' [{key}]")
+        value = compute()
+        self.put(key, value)
+        return value
@@ -0,0 +1,320 @@
+"""
+Size capped, least recently used (LRU) evicting, multi-process safe index of the application cache directory
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+from metrics import Metrics
+
+
+class FileLock(object):
+    """
+    An advisory lock held by exclusively creating a lock file (works on every platform and across processes)
+
+    - while the lock is held its lock file's modification time is refreshed, so that a long download is not mistaken for a crashed owner
+    - a stale lock file is broken by renaming it aside (only one waiter can), and only when it is still the same stale file that was examined
+    """
+
+    def __init__(self, path: str, stale_seconds: float = None):
+        """
+        Args:
+        :param path:          the lock file to be created while the lock is held
+        :param stale_seconds: the age after which a lock file left behind by a crashed process is broken
+        """
+        self.path: str = path
+        self.stale_seconds: float = stale_seconds if stale_seconds is not None else Configuration().get('cache_lock_stale_seconds')
+        self.held: bool = False
+        self.identity: Optional[tuple] = None  # the (inode, device) of the lock file this lock created
+        self.stopped: threading.Event = threading.Event()
+        self.refresher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def identify(status: os.stat_result) -> tuple:
+        return status.st_ino, status.st_dev
+
+    def acquire(self, blocking: bool = True, poll_seconds: float = 0.1) -> bool:
+        """
+        Take the lock
+        Args:
+        :param blocking:     wait until the lock is available (otherwise give up immediately when the lock is held elsewhere)
+        :param poll_seconds: how often to retry while waiting for the lock
+        """
+        while True:
+            try:
+                descriptor: int = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(descriptor, f"{os.getpid()} {time.time()}".encode('utf-8'))
+                self.identity = FileLock.identify(os.fstat(descriptor))
+                os.close(descriptor)
+                self.held = True
+                self.stopped.clear()
+                self.refresher = threading.Thread(target=self.refresh, name=f"lock-{os.path.basename(self.path)}", daemon=True)
+                self.refresher.start()
+                return True
+            except FileExistsError:
+                if self.break_stale():
+                    continue
+                if not blocking:
+                    return False
+                time.sleep(poll_seconds)
+
+    def release(self) -> None:
+        """
+        Give up the lock
+        """
+        if not self.held:
+            return
+        self.stopped.set()
+        self.refresher.join()
+        try:
+            if FileLock.identify(os.stat(self.path)) == self.identity:  # never remove a lock file another process created after breaking this one
+                os.remove(self.path)
+            else:
+                Logger.warning(f"Lock file {self.path} was broken and taken by another process while it was held")
+        except FileNotFoundError:
+            Logger.warning(f"Lock file {self.path} was removed while it was held")
+        self.held = False
+
+    def refresh(self) -> None:
+        """
+        Touch the lock file a few times per stale lock period until the lock is released
+        """
+        while not self.stopped.wait(max(0.1, self.stale_seconds / 4)):
+            try:
+                if FileLock.identify(os.stat(self.path)) != self.identity:
+                    return
+                os.utime(self.path)
+            except OSError:
+                return
+
+    def break_stale(self) -> bool:
+        """
+        Remove a lock file whose owner has not refreshed it within the stale lock period
+        Note: the lock file is renamed aside (an atomic operation only one waiter succeeds at), then removed only when the renamed file is still
+              the stale file that was examined, a fresh lock file that another waiter created in the meantime is put back
+        """
+        try:
+            examined: os.stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        age: float = time.time() - examined.st_mtime
+        if age < self.stale_seconds:
+            return False
+
+        aside: str = f"{self.path}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:  # another waiter broke it
+            return True
+        renamed: os.stat_result = os.stat(aside)
+        if (FileLock.identify(renamed), renamed.st_mtime_ns) != (FileLock.identify(examined), examined.st_mtime_ns):
+            try:  # put the fresh lock file back without replacing a lock file created since
+                os.link(aside, self.path)
+            except OSError:
+                Logger.warning(f"Lock file {self.path} was taken while a stale lock was being broken and could not be restored")
+            os.remove(aside)
+            return False
+        Logger.warning(f"Breaking stale lock {self.path} [{age:.0f} secs old]")
+        os.remove(aside)
+        return True
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.release()
+
+
+class Cache(object):
+    """
+    The index of the media files in the cache directory
+
+    - every cached source is an entry keyed by the md5 file name base the Loader assigns to its URI
+    - an entry owns every file in the cache root that starts with '<key>.' (media, metadata, and converted audio files)
+    - the index records each entry's source URI, size in bytes, and last access time
+    - when the total size exceeds 'cache_maximum_bytes' the least recently used unlocked entries are evicted
+    """
+
+    def __init__(self, cache_root: str = None, maximum_bytes: int = None):
+        """
+        Args:
+        :param cache_root:    the directory holding the cached files (defaults to the configured cache root)
+        :param maximum_bytes: the cache size budget in bytes, 0 for no limit (defaults to the configured budget)
+        """
+        self.cache_root: str = cache_root if cache_root is not None else Configuration().get('cache_root')
+        self.maximum_bytes: int = int(maximum_bytes if maximum_bytes is not None else Configuration().get('cache_maximum_bytes'))
+        self.index_file_path: str = f"{self.cache_root}\\{Configuration().get('cache_index_file_name')}"
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def lock(self, key: str) -> FileLock:
+        """
+        The per entry lock that serializes loading, converting, and evicting a cached source across processes
+        Args:
+        :param key: the cache entry key
+        """
+        return FileLock(f"{self.cache_root}\\{key}.lock")
+
+    def index_lock(self) -> FileLock:
+        """
+        The lock that serializes reading and rewriting the index file across processes
+        """
+        return FileLock(f"{self.index_file_path}.lock")
+
+    def load_index(self) -> {}:
+        try:
+            with open(self.index_file_path, encoding='utf-8') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as error:
+            Logger.warning(f"Cache index {self.index_file_path} is unreadable and will be rebuilt [{error}]")
+            return {}
+
+    def save_index(self, index: {}) -> None:
+        with Cache.atomic(self.index_file_path) as part_file_path:
+            with open(part_file_path, 'w', encoding='utf-8') as json_file:
+                json.dump(index, json_file, ensure_ascii=False, indent=4)
+
+    def files(self, key: str) -> [str]:
+        """
+        List the cached files that belong to an entry
+        Args:
+        :param key: the cache entry key
+        """
+        if not Path(self.cache_root).is_dir():
+            return []
+        prefix: str = f"{key}."
+        return [entry.path for entry in os.scandir(self.cache_root) if entry.is_file() and entry.name.startswith(prefix) and not entry.name.endswith(('.lock', '.tmp', '.stale'))]
+
+    @contextmanager
+    def entry(self, key: str, source: str, lookup: bool = True):
+        """
+        Hold the lock of a cache entry while its files are being used, then record its size and access time and evict down to the budget
+        Args:
+        :param key:    the cache entry key
+        :param source: the Uniform Resource Identifier the entry was loaded from
+        :param lookup: count the use as a cache hit or miss (a later use of an entry already loaded is not a lookup)
+        """
+        with self.lock(key):
+            if lookup and self.files(key):
+                self.hits += 1
+                Metrics.increment('cache_requests_total', cache='media', result='hit')
+                Logger.debug(f"Cache hit for {source} [{key}]")
+            elif lookup:
+                self.misses += 1
+                Metrics.increment('cache_requests_total', cache='media', result='miss')
+                Logger.debug(f"Cache miss for {source} [{key}]")
+            yield f"{self.cache_root}\\{key}"
+            self.touch(key, source)
+        self.evict()
+
+    def touch(self, key: str, source: str = None) -> None:
+        """
+        Record the current size and access time of an entry
+        Args:
+        :param key:    the cache entry key
+        :param source: the Uniform Resource Identifier the entry was loaded from (kept from a prior touch when not provided)
+        """
+        files: [str] = self.files(key)
+        with self.index_lock():
+            index: {} = self.load_index()
+            if not files:
+                index.pop(key, None)
+            else:
+                entry: {} = index.get(key, {})
+                index[key] = {
+                    'source': source if source is not None else entry.get('source', ''),
+                    'size': sum(os.path.getsize(file) for file in files),
+                    'last_access': time.time(),
+                    'files': [Path(file).name for file in files]
+                }
+            self.save_index(index)
+
+    def size(self) -> int:
+        """
+        The total number of bytes held by the indexed cache entries
+        """
+        return sum(entry['size'] for entry in self.load_index().values())
+
+    def remove(self, key: str) -> int:
+        """
+        Delete the files of an entry (the caller must hold the entry lock)
+        Args:
+        :param key: the cache entry key
+        """
+        removed: int = 0
+        for file in self.files(key):
+            try:
+                removed += os.path.getsize(file)
+                os.remove(file)
+            except OSError as error:
+                Logger.warning(f"Cached file {file} could not be removed [{error}]")
+        return removed
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits the configured byte budget (a budget of 0 means no limit)
+        """
+        return self.shrink(self.maximum_bytes) if 0 < self.maximum_bytes else 0
+
+    def shrink(self, maximum_bytes: int) -> int:
+        """
+        Remove least recently used entries until the cache fits a byte budget, entries locked by other processes are skipped
+        Args:
+        :param maximum_bytes: the byte budget to shrink the cache down to
+        """
+        evicted: int = 0
+        with self.index_lock():
+            index: {} = self.load_index()
+            total: int = sum(entry['size'] for entry in index.values())
+            for key in sorted(index, key=lambda _key: index[_key]['last_access']):
+                if total <= maximum_bytes:
+                    break
+                lock: FileLock = self.lock(key)
+                if not lock.acquire(blocking=False):
+                    Logger.debug(f"Cache entry {key} is in use and cannot be evicted")
+                    continue
+                try:
+                    removed: int = self.remove(key)
+                finally:
+                    lock.release()
+                Logger.debug(f"Evicted cache entry {key} ({removed:,} bytes) loaded from {index[key]['source']}")
+                total -= index[key]['size']
+                evicted += removed
+                del index[key]
+            self.save_index(index)
+
+        if evicted:
+            Logger.debug(f"Evicted {evicted:,} bytes from the cache, {total:,} bytes remain")
+        return evicted
+
+    def clear(self) -> int:
+        """
+        Remove every cache entry that is not in use by another process
+        """
+        Logger.debug(f"Clearing the cache {self.cache_root}")
+        return self.shrink(0)
+
+    @staticmethod
+    @contextmanager
+    def atomic(file_path: str):
+        """
+        Write to a temporary file then rename it over the target, so readers never see a partially written file
+        Args:
+        :param file_path: the file to be (over)written
+        """
+        part_file_path: str = f"{file_path}.{os.getpid()}.tmp"
+        try:
+            yield part_file_path
+            os.replace(part_file_path, file_path)
+        finally:
+            if os.path.exists(part_file_path):
+                os.remove(part_file_path)
@@ -0,0 +1,3 @@
+"""Catalog module that indexes sources, their metadata, and their exported clips in an embedded SQLite database"""
+
+from .catalog import Catalog
@@ -0,0 +1,194 @@
+"""
+Embedded SQLite catalog of the sources, source metadata, and exported clips
+"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+
+schema: [str] = [
+    "CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, uri TEXT NOT NULL UNIQUE, filename TEXT, title TEXT, artist TEXT, duration REAL, updated REAL)",
+    "CREATE TABLE IF NOT EXISTS tags (source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE, tag TEXT NOT NULL, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS clips (id INTEGER PRIMARY KEY, source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE, path TEXT NOT NULL UNIQUE, begin_index INTEGER, end_index INTEGER, begin_miliseconds INTEGER, end_miliseconds INTEGER, stages TEXT)",
+    "CREATE INDEX IF NOT EXISTS sources_artist ON sources (artist)",
+    "CREATE INDEX IF NOT EXISTS sources_title ON sources (title)",
+    "CREATE INDEX IF NOT EXISTS tags_tag_value ON tags (tag, value)",
+    "CREATE INDEX IF NOT EXISTS tags_source ON tags (source_id)",
+    "CREATE INDEX IF NOT EXISTS clips_source ON clips (source_id)",
+    "CREATE INDEX IF NOT EXISTS clips_interval ON clips (begin_miliseconds, end_miliseconds)",
+    "CREATE TABLE IF NOT EXISTS fingerprints (path TEXT PRIMARY KEY, source_id INTEGER NOT NULL REFERENCES sources(id) ON DELETE CASCADE, fingerprint BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS fingerprint_bands (band INTEGER NOT NULL, hash INTEGER NOT NULL, path TEXT NOT NULL, PRIMARY KEY (band, hash, path)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS fingerprints_source ON fingerprints (source_id)",
+    "CREATE INDEX IF NOT EXISTS fingerprint_bands_path ON fingerprint_bands (path)"
+]
+
+
+class Catalog(object):
+    """
+    Indexed tables of sources, tags, and clips (interval, slicing stage provenance, and file path), and the fingerprint index of the clips
+    (each fingerprint is also indexed by its locality sensitive hash bands, so near-duplicates are found without a scan of every fingerprint)
+    """
+
+    def __init__(self, file_path: str = None):
+        """
+        Args:
+        :param file_path: the SQLite database file (defaults to the configured catalog file path)
+        """
+        self.file_path: str = file_path if file_path is not None else Configuration().get('catalog_file_path')
+        self.connection: sqlite3.Connection = sqlite3.connect(self.file_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")  # readers are not blocked while a batch is written
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        for statement in schema:
+            self.connection.execute(statement)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into a single transaction (one disk sync per batch rather than per row)
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def record_source(self, uri: str, tags: {}) -> int:
+        """
+        Insert or update a source and replace its tags, returns the source id (call within a transaction)
+        Args:
+        :param uri:  the Uniform Resource Identifier of the source
+        :param tags: the source metadata tags
+        """
+        try:
+            duration: float = float(tags.get('duration', ''))
+        except ValueError:
+            duration = None
+
+        self.connection.execute("INSERT INTO sources (uri, filename, title, artist, duration, updated) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(uri) DO UPDATE SET filename=excluded.filename, title=excluded.title, artist=excluded.artist, duration=excluded.duration, updated=excluded.updated",
+                                (uri, tags.get('filename'), tags.get('title'), tags.get('artist'), duration, time.time()))
+        source_id: int = self.connection.execute("SELECT id FROM sources WHERE uri = ?", (uri,)).fetchone()[0]
+        self.connection.execute("DELETE FROM tags WHERE source_id = ?", (source_id,))
+        self.connection.executemany("INSERT INTO tags (source_id, tag, value) VALUES (?, ?, ?)", ((source_id, tag, value) for tag, value in tags.items()))
+        return source_id
+
+    def record_clips(self, source_id: int, clips: [{}]) -> None:
+        """
+        Replace the clips of a source (call within a transaction)
+        Args:
+        :param source_id: the id of the source the clips were sliced from
+        :param clips:     dictionaries of path, begin_index, end_index, begin_miliseconds, end_miliseconds, stages (a list of stage indexes),
+                          and optionally fingerprint (the packed fingerprint as hexadecimal)
+        """
+        from fingerprint import Fingerprint
+
+        self.connection.execute("DELETE FROM fingerprint_bands WHERE path IN (SELECT path FROM fingerprints WHERE source_id = ?)", (source_id,))
+        self.connection.execute("DELETE FROM fingerprints WHERE source_id = ?", (source_id,))
+        self.connection.execute("DELETE FROM clips WHERE source_id = ?", (source_id,))
+        self.connection.executemany("INSERT OR REPLACE INTO clips (source_id, path, begin_index, end_index, begin_miliseconds, end_miliseconds, stages) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    ((source_id, clip['path'], clip['begin_index'], clip['end_index'], clip['begin_miliseconds'], clip['end_miliseconds'], ','.join(str(stage) for stage in clip['stages'])) for clip in clips))
+
+        fingerprinted: [{}] = [clip for clip in clips if clip.get('fingerprint') is not None]
+        self.connection.executemany("DELETE FROM fingerprint_bands WHERE path = ?", ((clip['path'],) for clip in fingerprinted))  # a path exported by another source before
+        self.connection.executemany("INSERT OR REPLACE INTO fingerprints (path, source_id, fingerprint) VALUES (?, ?, ?)", ((clip['path'], source_id, bytes.fromhex(clip['fingerprint'])) for clip in fingerprinted))
+        self.connection.executemany("INSERT OR IGNORE INTO fingerprint_bands (band, hash, path) VALUES (?, ?, ?)",
+                                    ((band, value, clip['path']) for clip in fingerprinted for band, value in Fingerprint.bands(bytes.fromhex(clip['fingerprint']))))
+
+    def record(self, uri: str, tags: {}, clips: [{}]) -> None:
+        """
+        Record a source, its tags, and its clips in one batched transaction
+        Args:
+        :param uri:   the Uniform Resource Identifier of the source
+        :param tags:  the source metadata tags
+        :param clips: the exported clips (see record_clips())
+        """
+        with self.transaction():
+            source_id: int = self.record_source(uri, tags)
+            self.record_clips(source_id, clips)
+        Logger.debug(f"Cataloged {len(clips)} clips of {uri} in {self.file_path}")
+
+    def duplicates(self, fingerprints: [bytes], uri: str, maximum_distance: float = None) -> [Optional[str]]:
+        """
+        The exported clip of another source that each fingerprint is a near-duplicate of (None for a fingerprint without one)
+        Note: the candidates are the indexed fingerprints sharing a band with the fingerprint, a candidate whose clip file no longer exists is not a duplicate
+        Args:
+        :param fingerprints:     the packed fingerprints of the clips of a source
+        :param uri:              the Uniform Resource Identifier of the source (its own earlier clips are replaced, not duplicates)
+        :param maximum_distance: the largest share of differing bits of near-duplicates (defaults to the configured fingerprint distance)
+        """
+        import numpy
+        from fingerprint import Fingerprint
+
+        maximum_distance = maximum_distance if maximum_distance is not None else Configuration().get('fingerprint_distance')
+        duplicates: [Optional[str]] = []
+        for fingerprint in fingerprints:
+            bands: [(int, int)] = Fingerprint.bands(bytes(fingerprint))
+            candidates: [tuple] = self.connection.execute("SELECT DISTINCT fingerprints.path, fingerprints.fingerprint FROM fingerprint_bands "
+                                                          "JOIN fingerprints ON fingerprints.path = fingerprint_bands.path JOIN sources ON sources.id = fingerprints.source_id "
+                                                          f"WHERE (fingerprint_bands.band, fingerprint_bands.hash) IN (VALUES {', '.join(['(?, ?)'] * len(bands))}) AND sources.uri != ?",
+                                                          [value for band in bands for value in band] + [uri]).fetchall()
+            duplicate: Optional[str] = None
+            if candidates:
+                distances = Fingerprint.distances(numpy.frombuffer(bytes(fingerprint), dtype=numpy.uint8)[numpy.newaxis, :],
+                                                  numpy.stack([numpy.frombuffer(candidate, dtype=numpy.uint8) for _, candidate in candidates]))[0]
+                for index in numpy.argsort(distances, kind='stable'):
+                    if maximum_distance < distances[index]:
+                        break
+                    if os.path.isfile(candidates[index][0]):
+                        duplicate = candidates[index][0]
+                        break
+            duplicates.append(duplicate)
+        return duplicates
+
+    def query(self, artist: str = None, title: str = None, source: str = None, tags: {} = None, begin: int = None, end: int = None, limit: int = None) -> [{}]:
+        """
+        Find clips by source metadata and time range
+        Args:
+        :param artist: the artist of the source ('%' and '_' are wildcards)
+        :param title:  the title of the source ('%' and '_' are wildcards)
+        :param source: the Uniform Resource Identifier of the source ('%' and '_' are wildcards)
+        :param tags:   tag values the source must have
+        :param begin:  the clips must end after this source time in miliseconds
+        :param end:    the clips must begin before this source time in miliseconds
+        :param limit:  the maximum number of clips to return
+        """
+        conditions: [str] = []
+        parameters: [] = []
+
+        if artist is not None:
+            conditions += ["sources.artist LIKE ?"]
+            parameters += [artist]
+        if title is not None:
+            conditions += ["sources.title LIKE ?"]
+            parameters += [title]
+        if source is not None:
+            conditions += ["sources.uri LIKE ?"]
+            parameters += [source]
+        for tag, value in (tags if tags is not None else {}).items():
+            conditions += ["EXISTS (SELECT 1 FROM tags WHERE tags.source_id = sources.id AND tags.tag = ? AND tags.value LIKE ?)"]
+            parameters += [tag, value]
+        if begin is not None:
+            conditions += ["clips.end_miliseconds > ?"]
+            parameters += [begin]
+        if end is not None:
+            conditions += ["clips.begin_miliseconds < ?"]
+            parameters += [end]
+
+        statement: str = "SELECT sources.uri, sources.artist, sources.title, clips.path, clips.begin_miliseconds, clips.end_miliseconds, clips.stages FROM clips JOIN sources ON sources.id = clips.source_id"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY sources.uri, clips.begin_miliseconds"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters += [limit]
+
+        columns: [str] = ['uri', 'artist', 'title', 'path', 'begin_miliseconds', 'end_miliseconds', 'stages']
+        return [dict(zip(columns, row)) for row in self.connection.execute(statement, parameters)]
@@ -1,9 +1,12 @@
 import json
 import sys
 from argparse import ArgumentParser
+from pathlib import Path
 
+from catalog import Catalog
 from configuration.configuration import Configuration
 from configuration.mutable import configuration_mutable
+from evaluation import Evaluation, Fixture
 from slicer import Slicer
 from utility import normalize_file_path
 
@@ -40,6 +43,69 @@ def generate_configuration_and_logic_template(file_path: str) -> None:
     print(f"Created {Configuration().get('application_name')} template configuration/logic file {file_path}")
 
 
+def query_catalog(filters: [str], work_root: str = None) -> None:
+    """
+    Print the cataloged clips that match the filters
+    From the command line use switches -Q or --query e.g., --query artist=Rick% begin=10000 end=30000 genre=Pop
+    Args:
+    :param filters:   key=value filters, the keys artist, title, source, begin, end, and limit are predefined, any other key is a tag name
+    :param work_root: the directory holding the catalog
+    """
+    if work_root is not None:
+        Configuration().set_mutable_configuration({'work_root': work_root})
+
+    arguments: {} = {'tags': {}}
+    for expression in filters:
+        key, _, value = expression.partition('=')
+        if key in ('artist', 'title', 'source'):
+            arguments[key] = value
+        elif key in ('begin', 'end', 'limit'):
+            arguments[key] = int(value)
+        else:
+            arguments['tags'][key.replace('_', ' ')] = value
+
+    catalog = Catalog()
+    clips: [{}] = catalog.query(**arguments)
+    catalog.close()
+
+    for clip in clips:
+        print(f"{clip['path']}\t{clip['begin_miliseconds']}-{clip['end_miliseconds']}ms\tstages:{clip['stages']}\t{clip['artist']}\t{clip['title']}\t{clip['uri']}")
+    print(f"{len(clips)} clips found in {catalog.file_path}")
+
+
+def evaluate_logic_files(file_paths: [str], annotations_file_path: str = None, work_root: str = None) -> None:
+    """
+    Measure the boundary precision and recall of configuration/logic files against their runtime, then print the fastest that meets the quality bar
+    From the command line use switches -E or --evaluate e.g., --evaluate fast.json accurate.json --annotations references.json
+    Args:
+    :param file_paths:            the configuration/logic files to evaluate
+    :param annotations_file_path: a JSON file of annotated recordings to evaluate on (defaults to the synthetic click, tone, and speech fixtures)
+    :param work_root:             the directory in which the evaluation report and plot are written
+    """
+    if work_root is not None:
+        Configuration().set_mutable_configuration({'work_root': work_root})
+
+    evaluation_root: str = Configuration().get('evaluation_root')
+    Path(evaluation_root).mkdir(parents=True, exist_ok=True)
+    Path(Configuration().get('temp_root')).mkdir(parents=True, exist_ok=True)  # the slicers' debug exports
+
+    evaluation = Evaluation(Fixture.annotated(annotations_file_path) if annotations_file_path else None)
+    results: [{}] = evaluation.run([normalize_file_path(file_path, "json") for file_path in file_paths])
+    report_file_path: str = f"{evaluation_root}\\{Configuration().get('application_name')}.evaluation.json"
+    plot_file_path: str = f"{evaluation_root}\\{Configuration().get('application_name')}.evaluation.png"
+    evaluation.report(report_file_path)
+    plotted: bool = evaluation.plot(plot_file_path)
+
+    for result in sorted(results, key=lambda result: result['seconds']):
+        print(f"{result['name']}\tprecision:{result['precision']:.3f}\trecall:{result['recall']:.3f}\tF:{result['f_measure']:.3f}\t{result['seconds']:.3f}s\t{result['real_time_factor']:.0f}x real time\t{result['file']}")
+    fastest: {} = evaluation.fastest()
+    if fastest is None:
+        print(f"No logic meets the quality bar (precision {Configuration().get('evaluation_minimum_precision')}, recall {Configuration().get('evaluation_minimum_recall')})")
+    else:
+        print(f"Fastest logic meeting the quality bar: {fastest['file']} ({fastest['seconds']:.3f}s)")
+    print(f"Evaluation written to {report_file_path}{f' and {plot_file_path}' if plotted else ''}")
+
+
 def load_command_line_arguments():
     parser = ArgumentParser(prog=Configuration().get('application_name'), description=Configuration().get('application_description'))
     parser.add_argument("-C", "--configuration", dest="configuration_and_logic_file", nargs="?", const=f"{Configuration().get('configuration_logic_file_path')}", help="configuration and clip logic file", metavar="xxx.json")
@@ -48,7 +114,18 @@ def load_command_line_arguments():
     parser.add_argument("-r", "--root", dest="work_root", help="directory from which to process", metavar="local file system path")
     parser.add_argument("-v", "--verbose", dest="verbose", action="store_false", default=False, help="send debug messages to stdout")
     parser.add_argument("-d", "--debug", dest="debug", action="store_true", default=True, help="send debug messages to the log file")
+    parser.add_argument("-i", "--incremental", dest="incremental", action="store_true", default=False, help="skip sources whose clips were exported by a prior run with the same source and logic")
+    parser.add_argument("-p", "--pipeline", dest="pipeline", action="store_true", default=False, help="process the sources in overlapping download, decode, preprocess, analyze, and export stages")
+    parser.add_argument("-s", "--schedule", dest="schedule", action="store_true", default=False, help="process as many sources at once as fit in the memory budget, the shortest first")
+    parser.add_argument("--coordinator", dest="coordinator", action="store_true", default=False, help="queue the URLs as jobs in the shared job queue for worker nodes, then report the queue")
+    parser.add_argument("--worker", dest="worker", action="store_true", default=False, help="process jobs leased from the shared job queue until it is drained")
+    parser.add_argument("--queue", dest="job_queue", help="the shared job queue (defaults to the work root job queue file)", metavar="xxx.sqlite or redis://host:port/db")
+    parser.add_argument("--shard", dest="shard", help="process only shard i of N of the URLs (a static hash partition)", metavar="i/N")
+    parser.add_argument("--daemon", dest="daemon", nargs="?", type=int, const=0, help="serve clipping jobs over a local HTTP API (on the configured port unless one is given)", metavar="port")
     parser.add_argument("-t", "--template", dest="template_file", nargs="?", const=f"{Configuration().get('configuration_logic_file_path')}", help="generate a default configuration and logic template file", metavar="xxx.json")
+    parser.add_argument("-Q", "--query", dest="query", nargs="*", help="list cataloged clips matching artist=, title=, source=, begin=, end=, limit=, or <tag>= filters ('%%' is a wildcard)", metavar="key=value")
+    parser.add_argument("-E", "--evaluate", dest="evaluate", nargs="+", help="measure the boundary precision and recall of configuration/logic files against their runtime", metavar="xxx.json")
+    parser.add_argument("--annotations", dest="annotations", help="annotated recordings to evaluate on (defaults to synthetic click, tone, and speech fixtures)", metavar="xxx.json")
     parser.add_argument("--version""", action="version", version=f"%(prog)s {Configuration().get('application_version')}")
 
     try:
@@ -57,16 +134,49 @@ def load_command_line_arguments():
         print(f"Command line parameter {exception}")
         sys.exit(-1)
 
-    return args['configuration_and_logic_file'], args['url_file'], args['url'], args['work_root'], args['verbose'], args['debug'], args['template_file']
+    return args['configuration_and_logic_file'], args['url_file'], args['url'], args['work_root'], args['verbose'], args['debug'], args['incremental'], args['pipeline'], args['schedule'], args['coordinator'], args['worker'], args['job_queue'], args['shard'], args['daemon'], args['template_file'], args['query'], args['evaluate'], args['annotations']
 
 
 def process_command_line_arguments():
-    configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, template_file = load_command_line_arguments()
+    configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, incremental, pipeline, schedule, coordinator, worker, job_queue, shard, daemon, template_file, query, evaluate, annotations = load_command_line_arguments()
 
-    print(configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, template_file)
+    print(configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, incremental, pipeline, schedule, coordinator, worker, job_queue, shard, daemon, template_file, query, evaluate, annotations)
 
     if template_file:
         generate_configuration_and_logic_template(template_file)
         sys.exit(0)
 
-    return configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug
+    if configuration_and_logic_file_path is not None and (query is not None or evaluate):  # the catalog and the evaluation use the configuration file's settings
+        Configuration().load_configuration_and_logic(configuration_and_logic_file_path, work_root, verbose, debug)
+
+    if query is not None:
+        query_catalog(query, work_root)
+        sys.exit(0)
+
+    if evaluate:
+        evaluate_logic_files(evaluate, annotations, work_root)
+        sys.exit(0)
+
+    return configuration_and_logic_file_path, url_file_path, url, work_root, verbose, debug, incremental, pipeline, schedule, coordinator, worker, job_queue, shard, daemon
+
+
+def load_urls(file_path: str) -> [str]:
+    """
+    Read the media file URLs to be processed from a JSON array file or a text file with one URL per line
+    Args:
+    :param file_path: the name (with or without the path) of the URL file
+    """
+    try:
+        with open(file_path, encoding='utf-8') as url_file:
+            content: str = url_file.read()
+    except IOError as exception:
+        print(f"Unable to open URL file {file_path}")
+        print(f"[ERROR]: {exception}")
+        raise exception
+
+    try:
+        urls = json.loads(content)
+    except ValueError:
+        urls = content.splitlines()
+
+    return [url.strip() for url in urls if url.strip() and not url.strip().startswith('#')]
@@ -2,7 +2,7 @@ import json
 
 from constants import configuration_constants
 from derived import configuration_derived
-from mutable import configuration_mutable, logic_mutable
+from mutable import configuration_mutable, logic_mutable, output_keys, slicing_keys
 from utility import normalize_file_path
 from utility.singleton import singleton
 
@@ -15,6 +15,8 @@ class Configuration(object):
         self.derived_configuration = configuration_derived
         self.set_derived_configuration()
         self.mutable_logic = logic_mutable
+        self.slicing_keys = slicing_keys
+        self.output_keys = output_keys
 
     def set_configuration_value(self, key: str, value: str) -> None:
         if key in self.derived_configuration:
@@ -37,9 +39,15 @@ class Configuration(object):
         self.set_configuration_value('configuration_logic_file_path', f"{work_root}\\{self.constant_configuration['configuration_logic_file_name']}")
         self.set_configuration_value('temp_root', f"{work_root}\\temp")
         self.set_configuration_value('cache_root', f"{work_root}\\cache")
+        self.set_configuration_value('analysis_cache_root', f"{work_root}\\cache\\analysis")
         self.set_configuration_value('export_root', f"{work_root}\\export")
         self.set_configuration_value('log_root', log_root)
         self.set_configuration_value('log_file_path', f"{log_root}\\{self.constant_configuration['application_name']}.{self.constant_configuration['log_file_type']}")
+        self.set_configuration_value('manifest_file_path', f"{work_root}\\{self.constant_configuration['manifest_file_name']}")
+        self.set_configuration_value('catalog_file_path', f"{work_root}\\{self.constant_configuration['catalog_file_name']}")
+        self.set_configuration_value('job_queue_file_path', f"{work_root}\\{self.constant_configuration['job_queue_file_name']}")
+        self.set_configuration_value('cost_model_file_path', f"{work_root}\\{self.constant_configuration['cost_model_file_name']}")
+        self.set_configuration_value('evaluation_root', f"{work_root}\\evaluation")
         print(self.derived_configuration)
 
     def set_mutable_configuration(self, configuration_and_logic: {}) -> None:
@@ -96,3 +104,9 @@ class Configuration(object):
             return self.mutable_logic
         else:
             raise KeyError(f"{key} not found in the configuration parameters")
+
+    def values(self, keys: [str]) -> {}:
+        """
+        The values of configuration keys, e.g., of the output keys that determine the exported clips
+        """
+        return dict((key, self.get(key)) for key in sorted(keys))
@@ -16,6 +16,11 @@ CONFIGURATION_LOGIC_FILE_PATH: Final = f"{Path(os.getcwd()).joinpath(CONFIGURATI
 LOG_FILE_TYPE: Final = "log"
 LOADER_BASE_FILE_NAME: Final = f"{APPLICATION_NAME}.media.download"
 METADATA_FILE_TYPE: Final = "info.json"
+CACHE_INDEX_FILE_NAME: Final = f"{APPLICATION_NAME}.cache.json"
+MANIFEST_FILE_NAME: Final = f"{APPLICATION_NAME}.manifest.json"
+CATALOG_FILE_NAME: Final = f"{APPLICATION_NAME}.catalog.sqlite"
+JOB_QUEUE_FILE_NAME: Final = f"{APPLICATION_NAME}.jobs.sqlite"
+COST_MODEL_FILE_NAME: Final = f"{APPLICATION_NAME}.costs.json"
 
 MINIMUM_RECORDING_SIZE_MILISECONDS: Final = int(1000)
 MINIMUM_CLIP_SIZE_MILISECONDS: Final = int(250)
@@ -32,6 +37,11 @@ configuration_constants: Final = {
     "log_file_type": LOG_FILE_TYPE,
     "loader_base_file_name": LOADER_BASE_FILE_NAME,
     "metadata_file_type": METADATA_FILE_TYPE,
+    "cache_index_file_name": CACHE_INDEX_FILE_NAME,
+    "manifest_file_name": MANIFEST_FILE_NAME,
+    "catalog_file_name": CATALOG_FILE_NAME,
+    "job_queue_file_name": JOB_QUEUE_FILE_NAME,
+    "cost_model_file_name": COST_MODEL_FILE_NAME,
     "minimum_recording_size_miliseconds": MINIMUM_RECORDING_SIZE_MILISECONDS,
     "minimum_clip_size_miliseconds": MINIMUM_CLIP_SIZE_MILISECONDS,
     "maximum_clip_size_miliseconds": MAXIMUM_CLIP_SIZE_MILISECONDS
@@ -3,7 +3,13 @@ configuration_derived = {  # schema definition
     "configuration_logic_file_path": "",
     "temp_root": "",
     "cache_root": "",
+    "analysis_cache_root": "",
     "export_root": "",
     "log_root": "",
-    "log_file_path": ""
+    "log_file_path": "",
+    "manifest_file_path": "",
+    "catalog_file_path": "",
+    "job_queue_file_path": "",
+    "cost_model_file_path": "",
+    "evaluation_root": ""
 }
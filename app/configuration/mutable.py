@@ -12,13 +12,53 @@ configuration_mutable = {
     "sample_width": 2,  # bytes, CD Quality
     "frame_rate": 44100,  # hz, CD quality
     "downloader_module": "aria2c",
+    "cache_maximum_bytes": 0,  # least recently used cache entries are evicted above this size, 0 for no limit
+    "cache_lock_stale_seconds": 3600,  # cache locks older than this were left by a crashed process
+    "out_of_core": False,  # decode sources to a memory mapped PCM file and process them a window at a time (for very long recordings)
+    "out_of_core_window_miliseconds": 600000,
+    "pipeline_workers": {"download": 2, "decode": 1, "preprocess": 1, "analyze": 2, "export": 1},  # workers of each pipeline stage (--pipeline)
+    "pipeline_queue_size": 2,  # recordings waiting between pipeline stages, a full queue holds back the stage before it
+    "scheduler_memory_budget_bytes": 0,  # memory the recordings processed at once (--schedule) may hold, 0 for three quarters of the available memory
+    "scheduler_memory_margin": 1.25,  # the estimated peak memory of a recording is multiplied by this safety margin
+    "scheduler_workers": 0,  # recordings processed at once at most, 0 for the number of processors
+    "scheduler_fetch_workers": 2,  # sources downloaded (or copied) and probed at once
+    "job_queue": "",  # the shared job queue of a distributed run, a SQLite file (defaults to the work root) or redis://host:port/db
+    "job_lease_seconds": 600,  # a job whose worker sends no heartbeat for this long is leased by another worker
+    "job_heartbeat_seconds": 60,
+    "job_maximum_attempts": 3,  # a job that fails (or whose lease expires) this many times is dead-lettered
+    "job_retry_delay_seconds": 30,  # a failed job is retried after this many seconds times its attempts
+    "daemon_host": "127.0.0.1",  # the daemon (--daemon) only listens on the local host by default
+    "daemon_port": 8765,
+    "daemon_workers": 2,  # jobs the daemon runs at once
+    "daemon_models": [],  # Spleeter training models the daemon loads at start up e.g., ["spleeter:2stems"]
+    "metrics_file": "",  # a Prometheus textfile (e.g., for the node exporter's textfile collector) rewritten every metrics interval, empty for none
+    "metrics_port": 0,  # the local port serving GET /metrics in the Prometheus text format, 0 for none
+    "metrics_host": "127.0.0.1",
+    "metrics_interval_seconds": 15,
+    "evaluation_repeats": 3,  # each fixture is sliced this many times by each logic under evaluation (--evaluate), the fastest run is its runtime
+    "evaluation_fixture_seconds": 30,  # the length of each synthetic click, tone, and speech fixture
+    "evaluation_seed": 0,  # the synthetic fixtures are the same for every evaluation with the same seed
+    "evaluation_minimum_precision": 0.5,  # the quality bar: the fastest logic meeting both minimums is reported
+    "evaluation_minimum_recall": 0.8,
+    "deduplicate_clips": True,  # drop clips whose fingerprint is a near-duplicate of a better ranked clip of the recording
+    "deduplicate_across_sources": True,  # also drop clips that are near-duplicates of the clips of other sources in the catalog's fingerprint index
+    "fingerprint_distance": 0.15,  # the largest share of differing fingerprint bits of near-duplicate clips
+    "slice_deadline_seconds": 0,  # an anytime slicing: the wall clock seconds slicing a recording may take, 0 for no limit
+    "slice_cpu_seconds": 0,  # the CPU seconds slicing a recording may take, 0 for no limit
+    "slice_reduced_frame_rate": 11025,  # hz, a stage that no longer fits the slicing budget analyzes the recording resampled to this rate
+    "analysis_cache": True,  # keep analysis results (beat tracks, onset envelopes, etc.) across runs
+    "stage_cache": True,  # keep each slicing stage's intervals across runs (with the analysis cache), only the stages a logic change affects run again
     "clips_per_stage": 10,
+    "chaos_seed": 0,  # the random slicer seed, runs with the same seed produce the same intervals
     "cluster_window_miliseconds": 75,
+    "agreement_overlap_ratio": 0.5,  # share of a clip that a stage's interval must overlap for the stage to agree with the clip
+    "chain_windows": 10,  # the best ranked intervals of its input stages that a chained stage refines, 0 for every interval (merged into their union)
     "detection_window_miliseconds": 10,
     "low_threshold": -20.0,
     "drift_decibels": 0.1,
     "clip_size_miliseconds": 9000,
     "beat_count": 4,
+    "beat_multiples": [1, 2, 4],  # beat slicer clips are this many times the beat count long e.g., 4, 8, and 16 beats
     "attack_miliseconds": 50,
     "decay_miliseconds": 50,
     "pad_duration_miliseconds": 250,
@@ -27,3 +67,17 @@ configuration_mutable = {
 }
 
 logic_mutable: [{}] = []
+
+# The configuration that determines the intervals the slicers produce (part of every stage cache key)
+slicing_keys: [str] = [
+    "channels", "sample_width", "frame_rate", "out_of_core", "out_of_core_window_miliseconds", "clips_per_stage", "chaos_seed", "detection_window_miliseconds",
+    "low_threshold", "drift_decibels", "clip_size_miliseconds", "beat_count", "beat_multiples", "attack_miliseconds", "decay_miliseconds",
+    "agreement_overlap_ratio", "chain_windows"
+]
+
+# The configuration that determines the exported clips (part of the manifest's logic hash): the slicing configuration, and how the clips
+# are selected, de-duplicated, faded, and encoded (where the application works, how it logs, and how it schedules work are not)
+output_keys: [str] = slicing_keys + [
+    "output_file_type", "cluster_window_miliseconds", "deduplicate_clips", "deduplicate_across_sources", "fingerprint_distance",
+    "slice_deadline_seconds", "slice_cpu_seconds", "slice_reduced_frame_rate", "pad_duration_miliseconds", "fade_in_miliseconds", "fade_out_miliseconds"
+]
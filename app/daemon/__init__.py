@@ -0,0 +1,3 @@
+"""Daemon module that serves clipping jobs over a local HTTP API from a warm, long running process"""
+
+from .daemon import Daemon, ServiceJob
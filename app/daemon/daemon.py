@@ -0,0 +1,247 @@
+"""
+Long running job service with a small local HTTP API, the libraries, models, and compiled kernels stay loaded between jobs
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from audioprocessor import AudioProcessor
+from configuration.configuration import Configuration
+from logger import Logger
+from metrics import Metrics
+
+
+class ServiceJob(object):
+    """
+    A source submitted to the daemon, its status, and (once exported) its clip manifest
+    """
+
+    def __init__(self, uri: str, logic: Optional[list], deadline: Optional[float] = None):
+        self.job_id: str = uuid.uuid4().hex
+        self.uri: str = uri
+        self.logic: Optional[list] = logic
+        self.deadline: Optional[float] = deadline
+        self.state: str = 'queued'
+        self.submitted: float = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        self.clips: [{}] = []
+        self.cut: [{}] = []  # the slicing stages reduced or cut to meet the deadline
+
+    def status(self) -> {}:
+        return {
+            'id': self.job_id,
+            'uri': self.uri,
+            'state': self.state,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'seconds': (self.finished if self.finished is not None else time.time()) - self.started if self.started is not None else None,
+            'clips': len(self.clips),
+            'deadline': self.deadline,
+            'cut': self.cut,
+            'error': self.error
+        }
+
+
+class Daemon(object):
+    """
+    Runs submitted jobs on an internal worker pool, in one process that was warmed up once
+
+    - POST /jobs {"uri": "...", "logic": [...], "deadline": 5}: submit a source (the logic is optional, the configured logic is used without it,
+      the deadline is the optional seconds its slicing may take, the stages that do not fit it are reduced or cut and listed in its status)
+    - GET /jobs/<id>: the status of a job
+    - GET /jobs/<id>/clips: the clip manifest of a finished job (clip file, interval, and slicing stages)
+    - GET /health: the worker pool, the job counts, and what is warm
+    - GET /metrics: the run metrics in the Prometheus text format
+    """
+
+    def __init__(self, processor: AudioProcessor, host: str = None, port: int = None, workers: int = None, history: int = None):
+        """
+        Args:
+        :param processor: the audio processor that prepared the working directories, jobs share its cache
+        :param host:      the interface to listen on (defaults to the configured daemon host, the local host)
+        :param port:      the port to listen on (defaults to the configured daemon port)
+        :param workers:   the number of jobs run at once (defaults to the configured daemon workers)
+        :param history:   the number of jobs whose status is kept, the oldest finished jobs are forgotten
+        """
+        self.processor: AudioProcessor = processor
+        self.host: str = host if host is not None else Configuration().get('daemon_host')
+        self.port: int = port if port is not None else Configuration().get('daemon_port')
+        self.workers: int = workers if workers is not None else Configuration().get('daemon_workers')
+        self.history: int = history if history is not None else 1000
+        self.pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self.jobs: OrderedDict = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+        self.warm: {} = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        Metrics.gauge('queue_depth', lambda: sum(1 for job in list(self.jobs.values()) if 'queued' == job.state), queue='daemon')
+
+    def warm_up(self, models: [str] = None) -> None:
+        """
+        Pay the cold start costs once: import the analysis libraries, compile their kernels by slicing a short synthetic recording
+        with every available slicer, and load the separators of the Spleeter training models
+        Args:
+        :param models: the Spleeter training models to load (defaults to the configured daemon models)
+        """
+        import numpy
+        import pydub
+        from cache import AnalysisCache
+        from features import Features
+        from registry import Registry
+        from slicer import Slicer
+
+        began: float = time.time()
+        models = models if models is not None else Configuration().get('daemon_models')
+        frame_rate: int = Configuration().get('frame_rate')
+        channels: int = Configuration().get('channels')
+
+        seconds = numpy.arange(4 * frame_rate) / frame_rate  # four seconds of a tone pulsed at 120 beats per minute
+        tone = 0.5 * numpy.sin(2 * numpy.pi * 440.0 * seconds) * (numpy.modf(seconds * 2)[0] < 0.25)
+        samples = numpy.repeat((tone * 32767).astype(numpy.int16)[:, numpy.newaxis], channels, axis=1)
+        recording = pydub.AudioSegment(data=samples.tobytes(), frame_rate=frame_rate, sample_width=2, channels=channels)
+
+        for name in Registry.names():
+            for mode in [None] + list(Registry.get(name).modes):
+                arguments: {} = {'clips': 2, 'clip_size': 1000} if mode is None else {'clips': 2, 'clip_size': 1000, 'mode': mode}
+                if Registry.get(name).missing(arguments) or 'stems' in Registry.get(name).mode(arguments)[0]:  # the separators are warmed up below
+                    continue
+                try:  # the analyses are computed (not read from the analysis cache) so that their kernels are compiled
+                    Slicer(AnalysisCache(enabled=False)).slice(recording, [{'method': name, 'weight': 1, 'arguments': arguments}])
+                except Exception as error:  # a cold kernel only costs the first job some time
+                    Logger.warning(f"Warm up of the slicer '{name}'{'' if mode is None else f' ({mode} mode)'} failed: {error}")
+                    continue
+                self.warm.setdefault('slicers', []).append(name if mode is None else f"{name}:{mode}")
+
+        for model in models:
+            try:
+                Features.separator(model)[0].separate(samples[:frame_rate].astype(numpy.float32) / 32768)
+            except Exception as error:
+                Logger.warning(f"Warm up of the Spleeter separator '{model}' failed: {error}")
+                continue
+            self.warm.setdefault('models', []).append(model)
+
+        self.warm['seconds'] = round(time.time() - began, 2)
+        Logger.debug(f"Daemon warmed up in {self.warm['seconds']} secs: {self.warm}")
+
+    def submit(self, uri: str, logic: Optional[list] = None, deadline: Optional[float] = None) -> ServiceJob:
+        job: ServiceJob = ServiceJob(uri, logic, deadline)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            finished: [str] = [job_id for job_id, kept in self.jobs.items() if kept.finished is not None]
+            for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+                del self.jobs[job_id]
+        self.pool.submit(self.run, job)
+        return job
+
+    def job(self, job_id: str) -> Optional[ServiceJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self, job: ServiceJob) -> None:
+        job.state = 'running'
+        job.started = time.time()
+        processor: AudioProcessor = AudioProcessor(cache=self.processor.cache)
+        try:
+            processor.load(job.uri).normalize().slice(job.logic, deadline=job.deadline)
+            job.cut = processor.slicer.cut
+            processor.fade().export()
+            job.clips = processor.cataloged
+            job.state = 'done'
+            Metrics.increment('sources_total', outcome='processed')
+        except Exception as error:
+            Logger.error(f"Unable to clip {job.uri}: {error}")
+            job.error = str(error)
+            job.state = 'failed'
+            Metrics.increment('sources_total', outcome='failed')
+        finally:
+            processor.catalog.close()
+            job.finished = time.time()
+
+    def health(self) -> {}:
+        with self.lock:
+            states: {} = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+        return {'workers': self.workers, 'jobs': states, 'warm': self.warm}
+
+    def handler(self):
+        daemon: Daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *arguments) -> None:
+                Logger.debug(f"Daemon request: {format % arguments}")
+
+            def reply(self, status: int, body) -> None:
+                content: bytes = json.dumps(body, default=lambda value: value.item() if hasattr(value, 'item') else str(value)).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self) -> None:
+                parts: [str] = [part for part in self.path.split('?')[0].split('/') if part]
+                if ['health'] == parts:
+                    return self.reply(200, daemon.health())
+                if ['metrics'] == parts:  # the Prometheus text format, rather than JSON
+                    content: bytes = Metrics.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                    return
+                if 2 <= len(parts) <= 3 and 'jobs' == parts[0] and (2 == len(parts) or 'clips' == parts[2]):
+                    job: Optional[ServiceJob] = daemon.job(parts[1])
+                    if job is None:
+                        return self.reply(404, {'error': f"No job {parts[1]}"})
+                    if 2 == len(parts):
+                        return self.reply(200, job.status())
+                    if 'done' != job.state:
+                        return self.reply(409, {'error': f"Job {job.job_id} is {job.state}", 'state': job.state})
+                    return self.reply(200, {'id': job.job_id, 'uri': job.uri, 'clips': job.clips})
+                return self.reply(404, {'error': f"No resource {self.path}"})
+
+            def do_POST(self) -> None:
+                if ['jobs'] != [part for part in self.path.split('?')[0].split('/') if part]:
+                    return self.reply(404, {'error': f"No resource {self.path}"})
+                try:
+                    request: {} = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    uri: str = request['uri']
+                    logic = request.get('logic')
+                    deadline = request.get('deadline')
+                    if not isinstance(uri, str) or (logic is not None and not isinstance(logic, list)):
+                        raise ValueError("'uri' must be a string and 'logic' a list of slicers")
+                    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or 0 >= deadline):
+                        raise ValueError("'deadline' must be a positive number of seconds")
+                except (ValueError, KeyError) as error:
+                    return self.reply(400, {'error': f"Invalid job request: {error}"})
+                job: ServiceJob = daemon.submit(uri, logic, deadline)
+                return self.reply(202, job.status())
+
+        return Handler
+
+    def serve(self) -> None:
+        """
+        Serve requests until interrupted
+        """
+        self.server = ThreadingHTTPServer((self.host, self.port), self.handler())
+        Logger.debug(f"Daemon listening on http://{self.host}:{self.server.server_port} with {self.workers} workers", separator=True)
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        if self.server is not None:
+            self.server.server_close()
+        self.pool.shutdown(wait=True)
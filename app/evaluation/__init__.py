@@ -0,0 +1,4 @@
+"""Evaluation module that measures the boundary precision and recall of slicing logic files against their runtime on annotated reference recordings"""
+
+from .evaluation import Evaluation
+from .fixtures import Fixture
@@ -0,0 +1,229 @@
+"""
+Accuracy versus speed evaluation of slicing logic files against reference recordings with ground truth boundaries
+"""
+import copy
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from cache import AnalysisCache
+from configuration.configuration import Configuration
+from fixtures import Fixture
+from logger import Logger
+from slicer import Slicer
+
+
+class Evaluation(object):
+    """
+    Slices every fixture with every logic file, and measures the boundary precision and recall of each logic against its runtime
+
+    - the boundaries of a logic are the begin and end edges of the sample clipping intervals its slicers produce, so the accuracy of the slicers
+      (and of their analysis parameters) is measured apart from the vote and the clip selection that follow them
+    - an estimated boundary within the cluster window (the logic's cluster_window_miliseconds) of a ground truth boundary is a hit, each ground truth
+      boundary is matched at most once, and estimated boundaries closer together than the cluster window count as one
+    - the runtime is the fastest of the repeated slicings of a fixture, with the analysis cache disabled so that every analysis is computed
+    """
+
+    # configuration that a logic file under evaluation does not override: where the evaluation works and how it logs
+    kept: [str] = ['work_root', 'log_debug', 'log_warning', 'log_error', 'log_to_console', 'log_file_separator']
+
+    def __init__(self, fixtures: [Fixture] = None, repeats: int = None):
+        """
+        Args:
+        :param fixtures: the reference recordings (defaults to the synthetic click, tone, and speech fixtures)
+        :param repeats:  the number of times each fixture is sliced by each logic (defaults to the configured evaluation repeats)
+        """
+        self.fixtures: [Fixture] = fixtures if fixtures is not None else Fixture.synthetic()
+        self.repeats: int = max(1, repeats if repeats is not None else Configuration().get('evaluation_repeats'))
+        self.results: [{}] = []
+
+    @staticmethod
+    def merge(boundaries: [float], tolerance: float) -> [float]:
+        """
+        Merge the boundaries closer together than the tolerance into their mean (e.g., a begin and an end boundary voted at the same cut)
+        """
+        merged: [[float]] = []
+        for boundary in sorted(boundaries):
+            if merged and boundary - merged[-1][-1] <= tolerance:
+                merged[-1].append(boundary)
+            else:
+                merged.append([boundary])
+        return [sum(group) / len(group) for group in merged]
+
+    @staticmethod
+    def score(estimated: [float], reference: [float], tolerance: float) -> (int, float, float, float):
+        """
+        The hits, precision, recall, and F-measure of estimated boundaries against ground truth boundaries
+        Note: both lists are sorted, so matching each boundary to the nearest unmatched boundary in order finds the most hits
+        Args:
+        :param estimated: the estimated boundaries in miliseconds
+        :param reference: the ground truth boundaries in miliseconds
+        :param tolerance: the largest distance in miliseconds between an estimated boundary and the ground truth boundary it hits
+        """
+        estimated, reference = sorted(estimated), sorted(reference)
+        hits: int = 0
+        index, reference_index = 0, 0
+        while index < len(estimated) and reference_index < len(reference):
+            if abs(estimated[index] - reference[reference_index]) <= tolerance:
+                hits += 1
+                index += 1
+                reference_index += 1
+            elif estimated[index] < reference[reference_index]:
+                index += 1
+            else:
+                reference_index += 1
+
+        precision: float = hits / len(estimated) if estimated else 0.0
+        recall: float = hits / len(reference) if reference else 0.0
+        return hits, precision, recall, 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    @staticmethod
+    def boundaries(slicer: Slicer) -> [float]:
+        """
+        The begin and end edges of the sample clipping intervals of a slicing in miliseconds
+        """
+        import numpy
+
+        samples_per_milisecond: float = slicer.recording.frame_rate / 1000
+        return (numpy.concatenate((slicer.sci.begin, slicer.sci.end)) / samples_per_milisecond).tolist()
+
+    def evaluate(self, file_path: str) -> {}:
+        """
+        Evaluate a configuration and logic file: its configuration (but for the work root and logging) applies while its logic slices each fixture
+        Args:
+        :param file_path: the configuration and logic file
+        """
+        with open(file_path, encoding='utf-8') as json_file:
+            loaded_configuration_and_logic: {} = json.load(json_file)
+
+        configuration: {} = dict((key, value) for key, value in loaded_configuration_and_logic.get('configuration', {}).items() if key not in Evaluation.kept)
+        logic: [{}] = loaded_configuration_and_logic['logic']
+        restored: {} = dict((key, Configuration().get(key)) for key in configuration if key in Configuration().mutable_configuration)
+
+        Logger.debug(f"Evaluating {file_path} on {len(self.fixtures)} fixtures", separator=True)
+        Configuration().set_mutable_configuration(configuration)
+        try:
+            frame_rate: int = Configuration().get('frame_rate')
+            channels: int = Configuration().get('channels')
+            tolerance: float = Configuration().get('cluster_window_miliseconds')
+
+            fixtures: [{}] = []
+            for fixture in self.fixtures:
+                recording = fixture.recording(frame_rate, channels)
+                seconds: Optional[float] = None
+                estimated: [float] = []
+                for _ in range(self.repeats):
+                    slicer: Slicer = Slicer(AnalysisCache(enabled=False))
+                    began: float = time.perf_counter()
+                    slicer.slice(recording, copy.deepcopy(logic))  # the slicers annotate their arguments
+                    estimated = Evaluation.merge(Evaluation.boundaries(slicer), tolerance)
+                    elapsed: float = time.perf_counter() - began
+                    seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+                hits, precision, recall, f_measure = Evaluation.score(estimated, fixture.boundaries, tolerance)
+                fixtures.append({'fixture': fixture.name, 'seconds': seconds, 'audio_seconds': len(recording) / 1000, 'estimated': len(estimated), 'reference': len(fixture.boundaries),
+                                 'hits': hits, 'precision': precision, 'recall': recall, 'f_measure': f_measure})
+                Logger.debug(f"{os.path.basename(file_path)} on '{fixture.name}': precision {precision:.3f}, recall {recall:.3f}, F-measure {f_measure:.3f} in {seconds:.3f} secs")
+        finally:
+            Configuration().set_mutable_configuration(restored)
+
+        # The totals pool the boundaries of all fixtures (a fixture with more boundaries counts for more)
+
+        hits = sum(result['hits'] for result in fixtures)
+        estimated_count: int = sum(result['estimated'] for result in fixtures)
+        reference_count: int = sum(result['reference'] for result in fixtures)
+        precision = hits / estimated_count if estimated_count else 0.0
+        recall = hits / reference_count if reference_count else 0.0
+        seconds = sum(result['seconds'] for result in fixtures)
+
+        result: {} = {
+            'name': Path(file_path).stem,
+            'file': file_path,
+            'tolerance_miliseconds': tolerance,
+            'frame_rate': frame_rate,
+            'seconds': seconds,
+            'real_time_factor': sum(result['audio_seconds'] for result in fixtures) / max(1e-9, seconds),
+            'precision': precision,
+            'recall': recall,
+            'f_measure': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'fixtures': fixtures
+        }
+        self.results.append(result)
+        return result
+
+    def run(self, file_paths: [str]) -> [{}]:
+        """
+        Evaluate each configuration and logic file, a file that cannot be evaluated is reported and skipped
+        """
+        for file_path in file_paths:
+            try:
+                self.evaluate(file_path)
+            except (IOError, ValueError, KeyError, RuntimeError) as error:
+                Logger.error(f"Unable to evaluate {file_path}: {error}")
+        return self.results
+
+    def fastest(self, minimum_precision: float = None, minimum_recall: float = None) -> Optional[dict]:
+        """
+        The fastest evaluated logic whose precision and recall meet the quality bar (None when none does)
+        Args:
+        :param minimum_precision: the lowest acceptable boundary precision (defaults to the configured evaluation minimum precision)
+        :param minimum_recall:    the lowest acceptable boundary recall (defaults to the configured evaluation minimum recall)
+        """
+        minimum_precision = minimum_precision if minimum_precision is not None else Configuration().get('evaluation_minimum_precision')
+        minimum_recall = minimum_recall if minimum_recall is not None else Configuration().get('evaluation_minimum_recall')
+        qualified: [{}] = [result for result in self.results if minimum_precision <= result['precision'] and minimum_recall <= result['recall']]
+        return min(qualified, key=lambda result: result['seconds']) if qualified else None
+
+    def report(self, file_path: str) -> None:
+        """
+        Write the results, the quality bar, and the fastest logic that meets it to a JSON file
+        """
+        fastest: Optional[dict] = self.fastest()
+        with open(file_path, 'w', encoding='utf-8') as json_file:
+            json.dump({
+                'minimum_precision': Configuration().get('evaluation_minimum_precision'),
+                'minimum_recall': Configuration().get('evaluation_minimum_recall'),
+                'fastest': fastest['file'] if fastest is not None else None,
+                'results': self.results
+            }, json_file, ensure_ascii=False, indent=4)
+
+    def plot(self, file_path: str) -> bool:
+        """
+        Plot the precision, recall, and F-measure of each logic against its runtime (log scale), with the quality bar and the fastest logic meeting it
+        Note: returns False (and plots nothing) when matplotlib is not installed
+        """
+        try:
+            import matplotlib
+            matplotlib.use('Agg')  # no display is needed to write the image
+            import matplotlib.pyplot as pyplot
+        except ImportError:
+            Logger.warning("matplotlib is not installed, the evaluation is not plotted")
+            return False
+        if not self.results:
+            return False
+
+        fastest: Optional[dict] = self.fastest()
+        figure, axes = pyplot.subplots(figsize=(10, 6))
+        seconds: [float] = [max(1e-3, result['seconds']) for result in self.results]
+        for key, marker, label in (('precision', 'o', 'Precision'), ('recall', 's', 'Recall'), ('f_measure', '^', 'F-measure')):
+            axes.scatter(seconds, [result[key] for result in self.results], marker=marker, label=label)
+        for result, runtime in zip(self.results, seconds):
+            axes.annotate(result['name'], (runtime, result['f_measure']), textcoords='offset points', xytext=(4, 4), fontsize=8,
+                          fontweight='bold' if result is fastest else 'normal')
+        axes.axhline(Configuration().get('evaluation_minimum_precision'), linestyle='--', linewidth=0.8, color='tab:blue', label='Minimum precision')
+        axes.axhline(Configuration().get('evaluation_minimum_recall'), linestyle='--', linewidth=0.8, color='tab:orange', label='Minimum recall')
+        if fastest is not None:
+            axes.axvline(max(1e-3, fastest['seconds']), linestyle=':', color='tab:green', label=f"Fastest meeting the bar: {fastest['name']}")
+        axes.set_xscale('log')
+        axes.set_ylim(-0.05, 1.05)
+        axes.set_xlabel(f"Slicing seconds ({len(self.fixtures)} fixtures, fastest of {self.repeats} runs)")
+        axes.set_ylabel('Boundary score')
+        axes.set_title('Boundary accuracy versus runtime')
+        axes.grid(True, which='both', alpha=0.3)
+        axes.legend(fontsize=8, loc='upper left', bbox_to_anchor=(1.01, 1.0))
+        figure.tight_layout()
+        figure.savefig(file_path, dpi=120)
+        pyplot.close(figure)
+        return True
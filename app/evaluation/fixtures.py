@@ -0,0 +1,197 @@
+"""
+Reference recordings with annotated ground truth boundaries: synthetic click, tone, and speech fixtures, and annotated recordings
+"""
+import json
+from typing import Callable, Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+
+
+class Fixture(object):
+    """
+    A reference recording and the miliseconds of its ground truth boundaries (where a clip should begin or end)
+
+    - a synthetic fixture is synthesized at the frame rate and channels of the logic under evaluation, so the analysis rate is part of what is measured
+    - an annotated recording is decoded once and resampled to the frame rate and channels of the logic under evaluation
+    """
+    import pydub
+    from numpy import ndarray
+
+    def __init__(self, name: str, boundaries: [float], synthesize: Callable = None, file_path: str = None):
+        """
+        Args:
+        :param name:       the name of the fixture in the evaluation report
+        :param boundaries: the ground truth boundaries in miliseconds
+        :param synthesize: synthesizes the (mono, -1.0 to 1.0) samples of a synthetic fixture given a frame rate
+        :param file_path:  the media file of an annotated recording
+        """
+        self.name: str = name
+        self.boundaries: [float] = sorted(float(boundary) for boundary in boundaries)
+        self.synthesize: Optional[Callable] = synthesize
+        self.file_path: Optional[str] = file_path
+        self.recordings: {} = {}  # by (frame rate, channels)
+
+    def recording(self, frame_rate: int, channels: int) -> pydub.AudioSegment:
+        """
+        The recording of the fixture at a frame rate and number of channels (16 bit samples)
+        """
+        import numpy
+        import pydub
+
+        if (frame_rate, channels) in self.recordings:
+            return self.recordings[(frame_rate, channels)]
+
+        if self.synthesize is not None:
+            samples = numpy.clip(self.synthesize(frame_rate), -1.0, 1.0)
+            samples = numpy.repeat((samples * 32767).astype(numpy.int16)[:, numpy.newaxis], channels, axis=1)
+            recording = pydub.AudioSegment(data=samples.tobytes(), frame_rate=frame_rate, sample_width=2, channels=channels)
+        else:
+            recording = pydub.AudioSegment.from_file(self.file_path).set_frame_rate(frame_rate).set_channels(channels).set_sample_width(2)
+
+        self.recordings[(frame_rate, channels)] = recording
+        return recording
+
+    @staticmethod
+    def synthetic(seconds: float = None, seed: int = None) -> ['Fixture']:
+        """
+        The click, tone, and speech fixtures (each is drawn from its own seeded generator, so every logic is evaluated on the same audio)
+        Args:
+        :param seconds: the length of each fixture (defaults to the configured evaluation fixture length)
+        :param seed:    the seed of the fixture generators (defaults to the configured evaluation seed)
+        """
+        seconds = seconds if seconds is not None else Configuration().get('evaluation_fixture_seconds')
+        seed = seed if seed is not None else Configuration().get('evaluation_seed')
+        return [Fixture.clicks(seconds, seed), Fixture.tones(seconds, seed + 1), Fixture.speech(seconds, seed + 2)]
+
+    @staticmethod
+    def events(generator, seconds: float, lengths: (float, float), gaps: (float, float)) -> [(float, float)]:
+        """
+        The (begin, end) seconds of events of random lengths separated by random gaps, from half a second in to half a second before the end
+        """
+        events: [(float, float)] = []
+        time: float = 0.5
+        while True:
+            length: float = float(generator.uniform(*lengths))
+            if seconds - 0.5 < time + length:
+                return events
+            events.append((time, time + length))
+            time += length + float(generator.uniform(*gaps))
+
+    @staticmethod
+    def noise(generator, frames: int) -> ndarray:
+        """
+        A noise floor at -60 dB, so that no fixture is digital silence between its events
+        """
+        return 0.001 * generator.standard_normal(frames)
+
+    @staticmethod
+    def clicks(seconds: float, seed: int) -> 'Fixture':
+        """
+        Short decaying noise bursts at irregular intervals, a boundary at each click
+        """
+        import numpy
+
+        times: [float] = [begin for begin, _ in Fixture.events(numpy.random.default_rng(seed), seconds, (0.005, 0.005), (0.4, 2.5))]
+
+        def synthesize(frame_rate: int):
+            generator = numpy.random.default_rng(seed)
+            samples = Fixture.noise(generator, int(seconds * frame_rate))
+            click_frames: int = int(0.03 * frame_rate)
+            click = generator.uniform(-0.8, 0.8, click_frames) * numpy.exp(-numpy.arange(click_frames) / (0.005 * frame_rate))
+            for time in times:
+                begin: int = int(time * frame_rate)
+                samples[begin:begin + click_frames] += click
+            return samples
+
+        return Fixture('clicks', [1000 * time for time in times], synthesize)
+
+    @staticmethod
+    def tones(seconds: float, seed: int) -> 'Fixture':
+        """
+        Steady tones of random pitch, some separated by silence and some changing pitch without a gap, a boundary where each tone begins or ends
+        """
+        import numpy
+
+        generator = numpy.random.default_rng(seed)
+        tones: [(float, float, float)] = []  # begin, end, and pitch
+        for begin, end in Fixture.events(generator, seconds, (1.0, 4.0), (0.3, 1.5)):
+            if 2.0 < end - begin and 0.5 > generator.uniform():  # a pitch change half way through the tone
+                middle: float = (begin + end) / 2
+                tones += [(begin, middle, float(generator.uniform(110, 880))), (middle, end, float(generator.uniform(110, 880)))]
+            else:
+                tones += [(begin, end, float(generator.uniform(110, 880)))]
+
+        def synthesize(frame_rate: int):
+            samples = Fixture.noise(numpy.random.default_rng(seed), int(seconds * frame_rate))
+            ramp: int = int(0.01 * frame_rate)  # a 10 ms raised cosine attack and release
+            for begin, end, pitch in tones:
+                frames = numpy.arange(int(begin * frame_rate), int(end * frame_rate))
+                shape = numpy.ones(len(frames))
+                shape[:ramp] = 0.5 - 0.5 * numpy.cos(numpy.pi * numpy.arange(ramp) / ramp)
+                shape[-ramp:] = shape[:ramp][::-1]
+                samples[frames] += 0.5 * shape * numpy.sin(2 * numpy.pi * pitch * frames / frame_rate)
+            return samples
+
+        return Fixture('tones', sorted(set([1000 * begin for begin, _, _ in tones] + [1000 * end for _, end, _ in tones])), synthesize)
+
+    @staticmethod
+    def speech(seconds: float, seed: int) -> 'Fixture':
+        """
+        Speech-like utterances (voiced syllables of a gliding pitch shaped by vowel formants, with fricative consonants) separated by pauses,
+        a boundary where each utterance begins or ends
+        """
+        import numpy
+
+        vowels: [(float, float, float)] = [(730, 1090, 2440), (270, 2290, 3010), (300, 870, 2240), (530, 1840, 2480), (570, 840, 2410)]  # formants of a, i, u, e, o
+
+        generator = numpy.random.default_rng(seed)
+        utterances: [(float, float)] = Fixture.events(generator, seconds, (1.0, 4.0), (0.4, 1.5))
+        syllables: [(float, float, float, int, bool)] = []  # begin, end, pitch, vowel, and whether a fricative leads the syllable
+        for begin, end in utterances:
+            time: float = begin
+            while time < end - 0.1:
+                length: float = min(end - time, float(generator.uniform(0.12, 0.3)))
+                syllables.append((time, time + length, float(generator.uniform(100, 220)), int(generator.integers(len(vowels))), bool(0.3 > generator.uniform())))
+                time += length
+
+        def synthesize(frame_rate: int):
+            noise = numpy.random.default_rng(seed)
+            samples = Fixture.noise(noise, int(seconds * frame_rate))
+            for begin, end, pitch, vowel, fricative in syllables:
+                frames = numpy.arange(int(begin * frame_rate), int(end * frame_rate))
+                elapsed = (frames - frames[0]) / frame_rate
+                glide = pitch * (1.0 + 0.1 * numpy.sin(2 * numpy.pi * elapsed / max(1e-3, end - begin)))  # intonation within the syllable
+                phase = 2 * numpy.pi * numpy.cumsum(glide) / frame_rate
+                voiced = numpy.zeros(len(frames))
+                for harmonic in range(1, int(min(frame_rate / 2, 4000) // pitch) + 1):  # harmonics weighted by their distance to the formants
+                    weight = sum(numpy.exp(-0.5 * ((harmonic * pitch - formant) / 120.0) ** 2) for formant in vowels[vowel]) / harmonic ** 0.5
+                    voiced += weight * numpy.sin(harmonic * phase)
+                voiced *= numpy.sin(numpy.pi * elapsed / max(1e-3, end - begin)) ** 0.5  # each syllable swells and fades
+                samples[frames] += 0.3 * voiced / max(1e-9, float(numpy.abs(voiced).max()))
+                if fricative:  # a brief burst of noise, differenced so that it is mostly high frequency
+                    burst: int = min(len(frames), int(0.05 * frame_rate))
+                    samples[frames[:burst]] += 0.05 * numpy.diff(noise.standard_normal(burst + 1))
+            return samples
+
+        return Fixture('speech', sorted([1000 * begin for begin, _ in utterances] + [1000 * end for _, end in utterances]), synthesize)
+
+    @staticmethod
+    def annotated(file_path: str) -> ['Fixture']:
+        """
+        The annotated recordings listed in a JSON file, e.g., [{"name": "interview", "file": "interview.wav", "boundaries": [1250, 8300, 8900]}]
+        Args:
+        :param file_path: the JSON file of annotated recordings (the boundaries are in miliseconds)
+        """
+        try:
+            with open(file_path, encoding='utf-8') as json_file:
+                annotations: [{}] = json.load(json_file)
+        except (IOError, ValueError) as error:
+            Logger.error(f"Unable to read the annotated recordings {file_path} [{error}]")
+            raise
+
+        fixtures: ['Fixture'] = []
+        for annotation in annotations:
+            media_file_path: str = annotation['file'][len('file://'):] if annotation['file'].startswith('file://') else annotation['file']
+            fixtures.append(Fixture(annotation.get('name', media_file_path), annotation['boundaries'], file_path=media_file_path))
+        return fixtures
@@ -0,0 +1,4 @@
+"""Job queue module that distributes source jobs to the worker nodes of a run through a shared SQLite file or a Redis compatible server"""
+
+from .jobqueue import JobQueue, QueuedJob, SQLiteJobQueue, parse_shard, shard, states
+from .worker import Worker
@@ -0,0 +1,229 @@
+"""
+Shared queue of source jobs from which the worker nodes of a distributed run lease their work
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+
+schema: [str] = [
+    "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, lease INTEGER NOT NULL DEFAULT 0, worker TEXT, available REAL NOT NULL, expires REAL, logic_hash TEXT, error TEXT, result TEXT, updated REAL)",
+    "CREATE INDEX IF NOT EXISTS jobs_state_available ON jobs (state, available)",
+    "CREATE INDEX IF NOT EXISTS jobs_state_expires ON jobs (state, expires)"
+]
+
+states: [str] = ['queued', 'leased', 'done', 'dead']
+
+
+def shard(urls: [str], index: int, count: int) -> [str]:
+    """
+    The URLs of one shard of a static hash partition, so that nodes given the same URL list process disjoint sources
+    Args:
+    :param urls:  the Uniform Resource Identifiers of the sources
+    :param index: the zero based index of the shard
+    :param count: the number of shards
+    """
+    return [url for url in urls if int(hashlib.md5(url.encode('utf-8')).hexdigest(), 16) % count == index]
+
+
+def parse_shard(text: str) -> (int, int):
+    """
+    Parse a shard given as 'i/N' e.g., '0/4' is the first of four shards
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard '{text}' is not of the form i/N e.g., 0/4")
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index {index} is not between 0 and {count - 1}")
+    return index, count
+
+
+class QueuedJob(object):
+    """
+    A source job leased by a worker, the lease number identifies this lease of the job (a job whose lease expired is leased again with a new number)
+    """
+
+    def __init__(self, job_id, url: str, lease: int, attempts: int, worker: str):
+        self.job_id = job_id
+        self.url: str = url
+        self.lease: int = lease
+        self.attempts: int = attempts
+        self.worker: str = worker
+
+
+class JobQueue(object):
+    """
+    A queue of source jobs with leases, heartbeats, retries, and dead-lettering
+
+    - a worker leases a job for a time, and extends the lease with heartbeats while it works on it
+    - a job whose lease expires (its worker died) is queued again, as is a failed job until it has been attempted the maximum number of times
+    - a job attempted the maximum number of times is dead-lettered, with its last error, for an operator to look at
+    - a completed job holds the export manifest the worker published (the exported clips of the source)
+    """
+
+    @staticmethod
+    def open(location: str = None) -> 'JobQueue':
+        """
+        The job queue at a location: redis://host:port/db for a Redis compatible server, otherwise a SQLite file on a shared file system
+        Args:
+        :param location: the location of the queue (defaults to the configured job queue, or the work root job queue file)
+        """
+        location = location if location else Configuration().get('job_queue')
+        if location and location.startswith(('redis://', 'rediss://', 'unix://')):
+            from redisqueue import RedisJobQueue
+            return RedisJobQueue(location)
+        return SQLiteJobQueue(location if location else Configuration().get('job_queue_file_path'))
+
+    def enqueue(self, urls: [str], logic_hash: str) -> int:
+        """
+        Queue the jobs of sources not already queued, returns the number of jobs queued
+        Note: a done or dead job is queued again when the logic it was processed with has changed
+        """
+        raise NotImplementedError
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[QueuedJob]:
+        """
+        Lease the next available job (expired leases are reclaimed first), None when no job is available
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job: QueuedJob, lease_seconds: float) -> bool:
+        """
+        Extend the lease of a job, False when the lease was lost (it expired and the job was reclaimed)
+        """
+        raise NotImplementedError
+
+    def complete(self, job: QueuedJob, result: {}) -> bool:
+        """
+        Mark a job done and publish its export manifest, False when the lease was lost
+        """
+        raise NotImplementedError
+
+    def fail(self, job: QueuedJob, error: str, maximum_attempts: int, retry_delay_seconds: float) -> bool:
+        """
+        Queue a failed job again after a delay that grows with its attempts, or dead-letter it, False when the lease was lost
+        """
+        raise NotImplementedError
+
+    def counts(self) -> {}:
+        """
+        The number of jobs in each state
+        """
+        raise NotImplementedError
+
+    def dead(self) -> [{}]:
+        """
+        The dead-lettered jobs, their attempts and last errors
+        """
+        raise NotImplementedError
+
+    def results(self) -> {}:
+        """
+        The export manifests published by the workers, by source URL
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    A job queue in a SQLite file, every node opens the same file on a shared file system
+    Note: the rollback journal is kept (not write ahead logging, which needs shared memory and so a single host)
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+        :param file_path: the SQLite database file
+        """
+        self.file_path: str = file_path
+        self.connection: sqlite3.Connection = sqlite3.connect(self.file_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock: threading.Lock = threading.Lock()  # the heartbeat thread of a worker shares the connection
+        for statement in schema:
+            self.connection.execute(statement)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        A write transaction, taken before reading so that two nodes cannot lease the same job
+        """
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def enqueue(self, urls: [str], logic_hash: str) -> int:
+        now: float = time.time()
+        with self.transaction() as connection:
+            before: int = connection.total_changes
+            connection.executemany("INSERT INTO jobs (url, state, available, logic_hash, updated) VALUES (?, 'queued', ?, ?, ?) "
+                                   "ON CONFLICT(url) DO UPDATE SET state='queued', attempts=0, available=excluded.available, logic_hash=excluded.logic_hash, error=NULL, result=NULL, updated=excluded.updated "
+                                   "WHERE jobs.state IN ('done', 'dead') AND jobs.logic_hash IS NOT excluded.logic_hash",
+                                   ((url, now, logic_hash, now) for url in urls))
+            return connection.total_changes - before
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[QueuedJob]:
+        now: float = time.time()
+        maximum_attempts: int = Configuration().get('job_maximum_attempts')
+        with self.transaction() as connection:
+            connection.execute("UPDATE jobs SET state='dead', error='lease expired on its last attempt', updated=? WHERE state='leased' AND expires < ? AND attempts >= ?", (now, now, maximum_attempts))
+            connection.execute("UPDATE jobs SET state='queued', available=?, updated=? WHERE state='leased' AND expires < ?", (now, now, now))
+            row = connection.execute("SELECT id, url FROM jobs WHERE state='queued' AND available <= ? ORDER BY available, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE jobs SET state='leased', lease=lease+1, attempts=attempts+1, worker=?, expires=?, updated=? WHERE id=?", (worker, now + lease_seconds, now, row[0]))
+            lease, attempts = connection.execute("SELECT lease, attempts FROM jobs WHERE id=?", (row[0],)).fetchone()
+        return QueuedJob(row[0], row[1], lease, attempts, worker)
+
+    def heartbeat(self, job: QueuedJob, lease_seconds: float) -> bool:
+        now: float = time.time()
+        with self.transaction() as connection:
+            return 1 == connection.execute("UPDATE jobs SET expires=?, updated=? WHERE id=? AND state='leased' AND lease=?", (now + lease_seconds, now, job.job_id, job.lease)).rowcount
+
+    def complete(self, job: QueuedJob, result: {}) -> bool:
+        now: float = time.time()
+        with self.transaction() as connection:
+            return 1 == connection.execute("UPDATE jobs SET state='done', result=?, error=NULL, expires=NULL, updated=? WHERE id=? AND state='leased' AND lease=?", (json.dumps(result), now, job.job_id, job.lease)).rowcount
+
+    def fail(self, job: QueuedJob, error: str, maximum_attempts: int, retry_delay_seconds: float) -> bool:
+        now: float = time.time()
+        with self.transaction() as connection:
+            return 1 == connection.execute("UPDATE jobs SET state=CASE WHEN attempts >= ? THEN 'dead' ELSE 'queued' END, available=?, error=?, expires=NULL, updated=? WHERE id=? AND state='leased' AND lease=?",
+                                           (maximum_attempts, now + retry_delay_seconds * job.attempts, error, now, job.job_id, job.lease)).rowcount
+
+    def counts(self) -> {}:
+        with self.lock:
+            counted: {} = dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return dict((state, counted.get(state, 0)) for state in states)
+
+    def dead(self) -> [{}]:
+        with self.lock:
+            rows = self.connection.execute("SELECT url, attempts, worker, error FROM jobs WHERE state='dead' ORDER BY updated").fetchall()
+        return [{'url': url, 'attempts': attempts, 'worker': worker, 'error': error} for url, attempts, worker, error in rows]
+
+    def results(self) -> {}:
+        with self.lock:
+            rows = self.connection.execute("SELECT url, result FROM jobs WHERE state='done'").fetchall()
+        results: {} = {}
+        for url, result in rows:
+            try:
+                results[url] = json.loads(result) if result else {}
+            except ValueError:
+                Logger.warning(f"Export manifest of {url} in the job queue {self.file_path} is unreadable")
+        return results
@@ -0,0 +1,171 @@
+"""
+Job queue adapter for a Redis compatible server (the redis package is only needed when a redis:// queue is used)
+"""
+import json
+import time
+from typing import Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+
+from jobqueue import JobQueue, QueuedJob, states
+
+# Every script runs atomically on the server, so two nodes cannot lease the same job
+# KEYS: the queued (by available time), leased (by lease expiry), and dead sets; ARGV[1]: the job hash key prefix
+
+enqueue_script: str = """
+local id = redis.call('HGET', ARGV[1] .. 'ids', ARGV[2])
+if id then
+    local job = ARGV[1] .. id
+    local state = redis.call('HGET', job, 'state')
+    if (state ~= 'done' and state ~= 'dead') or redis.call('HGET', job, 'logic_hash') == ARGV[3] then
+        return 0
+    end
+    redis.call('SREM', KEYS[3], id)
+    redis.call('HDEL', job, 'error', 'result')
+    redis.call('HSET', job, 'state', 'queued', 'attempts', 0, 'logic_hash', ARGV[3], 'updated', ARGV[4])
+else
+    id = tostring(redis.call('INCR', ARGV[1] .. 'next'))
+    redis.call('HSET', ARGV[1] .. 'ids', ARGV[2], id)
+    redis.call('HSET', ARGV[1] .. id, 'url', ARGV[2], 'state', 'queued', 'attempts', 0, 'lease', 0, 'logic_hash', ARGV[3], 'updated', ARGV[4])
+end
+redis.call('ZADD', KEYS[1], ARGV[4], id)
+return 1
+"""
+
+lease_script: str = """
+local now = tonumber(ARGV[2])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[2])) do
+    local job = ARGV[1] .. id
+    redis.call('ZREM', KEYS[2], id)
+    if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(ARGV[5]) then
+        redis.call('HSET', job, 'state', 'dead', 'error', 'lease expired on its last attempt', 'updated', ARGV[2])
+        redis.call('SADD', KEYS[3], id)
+    else
+        redis.call('HSET', job, 'state', 'queued', 'updated', ARGV[2])
+        redis.call('ZADD', KEYS[1], now, id)
+    end
+end
+local ready = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2], 'LIMIT', 0, 1)
+if 0 == #ready then
+    return false
+end
+local id = ready[1]
+local job = ARGV[1] .. id
+redis.call('ZREM', KEYS[1], id)
+local lease = redis.call('HINCRBY', job, 'lease', 1)
+local attempts = redis.call('HINCRBY', job, 'attempts', 1)
+redis.call('HSET', job, 'state', 'leased', 'worker', ARGV[3], 'updated', ARGV[2])
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[4]), id)
+return {id, redis.call('HGET', job, 'url'), lease, attempts}
+"""
+
+heartbeat_script: str = """
+local job = ARGV[1] .. ARGV[2]
+if redis.call('HGET', job, 'state') ~= 'leased' or redis.call('HGET', job, 'lease') ~= ARGV[3] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[2])
+redis.call('HSET', job, 'updated', ARGV[5])
+return 1
+"""
+
+complete_script: str = """
+local job = ARGV[1] .. ARGV[2]
+if redis.call('HGET', job, 'state') ~= 'leased' or redis.call('HGET', job, 'lease') ~= ARGV[3] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HDEL', job, 'error')
+redis.call('HSET', job, 'state', 'done', 'result', ARGV[4], 'updated', ARGV[5])
+return 1
+"""
+
+fail_script: str = """
+local job = ARGV[1] .. ARGV[2]
+if redis.call('HGET', job, 'state') ~= 'leased' or redis.call('HGET', job, 'lease') ~= ARGV[3] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(ARGV[5]) then
+    redis.call('HSET', job, 'state', 'dead', 'error', ARGV[4], 'updated', ARGV[6])
+    redis.call('SADD', KEYS[3], ARGV[2])
+else
+    redis.call('HSET', job, 'state', 'queued', 'error', ARGV[4], 'updated', ARGV[6])
+    redis.call('ZADD', KEYS[1], ARGV[7], ARGV[2])
+end
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    A job queue held by a Redis compatible server: a hash per job, sorted sets of the queued and leased jobs, and a set of the dead jobs
+    """
+
+    def __init__(self, location: str, prefix: str = None):
+        """
+        Args:
+        :param location: the server URL e.g., redis://localhost:6379/0
+        :param prefix:   the prefix of the keys of the queue (defaults to the application name)
+        """
+        import redis
+
+        self.location: str = location
+        self.client = redis.Redis.from_url(location, decode_responses=True)
+        self.prefix: str = f"{prefix if prefix is not None else Configuration().get('application_name')}:jobs:"
+        self.keys: [str] = [f"{self.prefix}queued", f"{self.prefix}leased", f"{self.prefix}dead"]
+        self.scripts: {} = dict((name, self.client.register_script(script)) for name, script in
+                                (('enqueue', enqueue_script), ('lease', lease_script), ('heartbeat', heartbeat_script), ('complete', complete_script), ('fail', fail_script)))
+
+    def close(self) -> None:
+        self.client.close()
+
+    def enqueue(self, urls: [str], logic_hash: str) -> int:
+        now: float = time.time()
+        return sum(int(self.scripts['enqueue'](keys=self.keys, args=[self.prefix, url, logic_hash, now])) for url in urls)
+
+    def lease(self, worker: str, lease_seconds: float) -> Optional[QueuedJob]:
+        leased = self.scripts['lease'](keys=self.keys, args=[self.prefix, time.time(), worker, lease_seconds, Configuration().get('job_maximum_attempts')])
+        if not leased:
+            return None
+        job_id, url, lease, attempts = leased
+        return QueuedJob(job_id, url, int(lease), int(attempts), worker)
+
+    def heartbeat(self, job: QueuedJob, lease_seconds: float) -> bool:
+        now: float = time.time()
+        return 1 == int(self.scripts['heartbeat'](keys=self.keys, args=[self.prefix, job.job_id, job.lease, now + lease_seconds, now]))
+
+    def complete(self, job: QueuedJob, result: {}) -> bool:
+        return 1 == int(self.scripts['complete'](keys=self.keys, args=[self.prefix, job.job_id, job.lease, json.dumps(result), time.time()]))
+
+    def fail(self, job: QueuedJob, error: str, maximum_attempts: int, retry_delay_seconds: float) -> bool:
+        now: float = time.time()
+        return 1 == int(self.scripts['fail'](keys=self.keys, args=[self.prefix, job.job_id, job.lease, error, maximum_attempts, now, now + retry_delay_seconds * job.attempts]))
+
+    def jobs(self) -> [{}]:
+        ids: [str] = list(self.client.hvals(f"{self.prefix}ids"))
+        pipeline = self.client.pipeline(transaction=False)
+        for job_id in ids:
+            pipeline.hgetall(f"{self.prefix}{job_id}")
+        return pipeline.execute()
+
+    def counts(self) -> {}:
+        counted: {} = dict((state, 0) for state in states)
+        for job in self.jobs():
+            counted[job.get('state')] = counted.get(job.get('state'), 0) + 1
+        return counted
+
+    def dead(self) -> [{}]:
+        jobs: [{}] = [self.client.hgetall(f"{self.prefix}{job_id}") for job_id in self.client.smembers(self.keys[2])]
+        return [{'url': job.get('url'), 'attempts': int(job.get('attempts', 0)), 'worker': job.get('worker'), 'error': job.get('error')} for job in sorted(jobs, key=lambda job: float(job.get('updated', 0)))]
+
+    def results(self) -> {}:
+        results: {} = {}
+        for job in self.jobs():
+            if 'done' == job.get('state'):
+                try:
+                    results[job['url']] = json.loads(job.get('result') or '{}')
+                except ValueError:
+                    Logger.warning(f"Export manifest of {job['url']} in the job queue {self.location} is unreadable")
+        return results
@@ -0,0 +1,128 @@
+"""
+Worker node of a distributed run, leases source jobs from the shared job queue until it is drained
+"""
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+from audioprocessor import AudioProcessor
+from configuration.configuration import Configuration
+from logger import Logger
+from manifest import Manifest
+from metrics import Metrics
+
+from jobqueue import JobQueue, QueuedJob
+
+
+class Worker(object):
+    """
+    Processes the jobs it leases from a job queue, publishing the export manifest of each source to the queue
+
+    - a heartbeat thread extends the lease while a source is processed, a worker that dies stops the heartbeats and its job is leased by another worker
+    - a failed source is retried (by any worker) until the job has been attempted the maximum number of times, then it is dead-lettered
+    """
+
+    def __init__(self, jobs: JobQueue, processor: AudioProcessor, manifest: Manifest = None, logic_hash: str = None, name: str = None):
+        """
+        Args:
+        :param jobs:       the shared job queue
+        :param processor:  the audio processor of this node
+        :param manifest:   the run manifest of this node, sources it already exported with the same logic are not processed again
+        :param logic_hash: the hash of the current configuration and logic
+        :param name:       the name of the worker in the job queue (defaults to the host name and process id)
+        """
+        self.jobs: JobQueue = jobs
+        self.processor: AudioProcessor = processor
+        self.manifest: Optional[Manifest] = manifest
+        self.logic_hash: str = logic_hash if logic_hash is not None else Manifest.logic_hash()
+        self.name: str = name if name is not None else f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds: float = Configuration().get('job_lease_seconds')
+        self.heartbeat_seconds: float = Configuration().get('job_heartbeat_seconds')
+        Metrics.gauge('queue_depth', lambda: self.jobs.counts()['queued'], queue='jobs')
+
+    def run(self, follow: bool = False, poll_seconds: float = 5.0) -> (int, int):
+        """
+        Lease and process jobs until the queue has no job available, returns the numbers of sources processed and failed
+        Args:
+        :param follow:       keep waiting for jobs when the queue is drained (until interrupted)
+        :param poll_seconds: the time between polls of a drained queue
+        """
+        processed: int = 0
+        failed: int = 0
+        while True:
+            job: Optional[QueuedJob] = self.jobs.lease(self.name, self.lease_seconds)
+            if job is None:
+                if not follow:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            if self.work(job):
+                processed += 1
+            else:
+                failed += 1
+
+        Logger.debug(f"Worker {self.name} processed {processed} sources, {failed} failed: {self.jobs.counts()}", separator=True)
+        return processed, failed
+
+    def work(self, job: QueuedJob) -> bool:
+        """
+        Process the source of a leased job while a heartbeat thread keeps the lease
+        """
+        Logger.debug(f"Worker {self.name} leased {job.url} (attempt {job.attempts})", separator=True)
+        stop: threading.Event = threading.Event()
+        lost: threading.Event = threading.Event()
+
+        def heartbeat() -> None:
+            while not stop.wait(self.heartbeat_seconds):
+                if not self.jobs.heartbeat(job, self.lease_seconds):
+                    Logger.warning(f"Worker {self.name} lost the lease of {job.url}, another worker may be processing it")
+                    lost.set()
+                    return
+
+        beating: threading.Thread = threading.Thread(target=heartbeat, name=f"heartbeat-{job.job_id}", daemon=True)
+        beating.start()
+        try:
+            exported, source_hash = self.process(job.url)
+        except Exception as error:
+            stop.set()
+            beating.join()
+            Logger.error(f"Unable to clip {job.url}: {error} [attempt {job.attempts} of {Configuration().get('job_maximum_attempts')}]")
+            self.jobs.fail(job, str(error), Configuration().get('job_maximum_attempts'), Configuration().get('job_retry_delay_seconds'))
+            Metrics.increment('sources_total', outcome='failed')
+            return False
+
+        stop.set()
+        beating.join()
+        if not self.jobs.complete(job, {'clips': exported, 'source_hash': source_hash, 'logic_hash': self.logic_hash, 'worker': self.name}):
+            Logger.warning(f"Worker {self.name} exported {job.url} after its lease was lost{' (the heartbeats failed)' if lost.is_set() else ''}, the export manifest was not published")
+        return True
+
+    def process(self, url: str) -> ([str], str):
+        """
+        Clip a source unless the run manifest of this node shows that its clips are up to date, returns the exported clips and the source hash
+        """
+        source_hash: str = Manifest.source_hash(url)
+
+        if self.manifest is not None:
+            if self.manifest.is_current(url, source_hash, self.logic_hash):
+                Logger.debug(f"Skipping {url}, its {len(self.manifest.clips(url))} clips are up to date", separator=True)
+                Metrics.increment('sources_total', outcome='skipped')
+                return self.manifest.clips(url), source_hash
+            for clip in self.manifest.clips(url):  # clips exported with an earlier source or logic are stale
+                if os.path.isfile(clip):
+                    os.remove(clip)
+
+        try:
+            self.processor.load(url).normalize().slice().fade().export()
+        except Exception as error:
+            if self.manifest is not None:
+                self.manifest.fail(url, source_hash, self.logic_hash, str(error))
+            raise
+
+        if self.manifest is not None:
+            self.manifest.complete(url, source_hash, self.logic_hash, self.processor.exported)
+        Metrics.increment('sources_total', outcome='processed')
+        return self.processor.exported, source_hash
@@ -5,42 +5,51 @@ import hashlib
 import os
 import shutil
 import time
+from typing import Callable, Optional
 from urllib.parse import urlparse
 
+from cache import Cache
 from configuration.configuration import Configuration
 from logger import Logger
+from metrics import Metrics
+from pcm import PCMRecording
 from tagger import Tagger
 
 
 class Loader(object):
-    def __init__(self, tagger: Tagger = None):
+    def __init__(self, tagger: Tagger = None, cache: Cache = None):
         """
         Propvides the ability to load (download or copy) and convert source media (audio or video) files as audio files
         Args:
         :param tagger: the tags for the audio file
+        :param cache:  the index of the cache directory into which media files are loaded
         """
         if tagger is None:
             Logger.error(f"A Tagger object was not provided when instantiating the Downloader class")
             raise ValueError("A Tagger object must be provided when instantiating the Downloader class, for metadata handling")
 
         self.tagger: Tagger = tagger
+        self.cache: Cache = cache if cache is not None else Cache()
+        self.out_of_core: Optional[bool] = None  # decode to a memory mapped PCM file (defaults to the configured mode), e.g., set by the scheduler for a recording that does not fit its memory budget
+
+    def chunked(self) -> bool:
+        """
+        Are recordings decoded to a memory mapped PCM file and processed a window at a time
+        """
+        return self.out_of_core if self.out_of_core is not None else Configuration().get('out_of_core')
 
     import pydub
 
-    def copy(self, uri: str, path_file_base: str, audio_file_name: str) -> pydub.AudioSegment:
+    def copy_media(self, uri: str, path_file_base: str) -> str:
         """
-        Copy a media (video or audio) file from the local file system
+        Copy a media (video or audio) file from the local file system into the cache entry, unless it is already cached
         Args:
-        :param uri:             the local file system path of the media file to be copied as a Uniform Resource Identifier
-        :param path_file_base:  the base path and file for the media file to be loaded to which file extensions will be appended as required (media file vs metadata file)
-        :param audio_file_name: the name of the copy/converted audio file
+        :param uri:            the local file system path of the media file to be copied as a Uniform Resource Identifier
+        :param path_file_base: the base path and file for the media file to be loaded to which the media file extension is appended
         """
-        import pydub
-
         parsed_url = urlparse(uri)
         source_file_name = parsed_url.netloc + parsed_url.path if parsed_url.netloc else parsed_url.path.strip('/')  # This might be Windows only logic
         intermediate_file_name = f"{path_file_base}{os.path.splitext(parsed_url.path)[1]}"
-        metadata_file_name = f"{path_file_base}.{Configuration().get('metadata_file_type')}"
 
         if os.path.isfile(intermediate_file_name):
             Logger.debug(f"File {intermediate_file_name} is cached on the local file system")
@@ -50,32 +59,57 @@ class Loader(object):
             Logger.debug(f"To:   {intermediate_file_name}")
 
             try:
-                shutil.copyfile(source_file_name, intermediate_file_name)
+                with Cache.atomic(intermediate_file_name) as part_file_name:
+                    shutil.copyfile(source_file_name, part_file_name)
+                Metrics.increment('downloaded_bytes_total', os.path.getsize(intermediate_file_name))
             except OSError or FileNotFoundError as error:
                 Logger.error(f"Could not copy {source_file_name} from local file system to cache directory {Configuration().get('cache_root')}")
                 Logger.error(f"The 'download' URI was {uri}")
                 Logger.error(f"The system error was: {error}")
                 raise error
 
-        self.tagger.synchronize_metadata(intermediate_file_name, metadata_file_name)
+        return intermediate_file_name
+
+    def copy(self, uri: str, path_file_base: str, audio_file_name: str) -> pydub.AudioSegment:
+        """
+        Copy a media (video or audio) file from the local file system
+        Args:
+        :param uri:             the local file system path of the media file to be copied as a Uniform Resource Identifier
+        :param path_file_base:  the base path and file for the media file to be loaded to which file extensions will be appended as required (media file vs metadata file)
+        :param audio_file_name: the name of the copy/converted audio file
+        """
+        import pydub
+
+        intermediate_file_name: str = self.copy_media(uri, path_file_base)
+        metadata_file_name = f"{path_file_base}.{Configuration().get('metadata_file_type')}"
+
+        if self.chunked():  # decoded straight to a memory mapped PCM file, the audio is never held in memory
+            recording: PCMRecording = PCMRecording.decode(intermediate_file_name, Loader.pcm_file_name(path_file_base))
+            self.tagger.synchronize_metadata(intermediate_file_name, metadata_file_name, recording=recording)
+            return recording
 
         Logger.debug(f"Creating {Configuration().get('output_file_type')} audio file from copied file", separator=True)
         recording: pydub.AudioSegment = pydub.AudioSegment.from_file(intermediate_file_name).set_frame_rate(Configuration().get('frame_rate')).set_channels(Configuration().get('channels')).set_sample_width(Configuration().get('sample_width'))
-        recording.export(audio_file_name, format=Configuration().get('output_file_type')).close()
+        with Cache.atomic(audio_file_name) as part_file_name:
+            recording.export(part_file_name, format=Configuration().get('output_file_type')).close()
         Logger.debug(f"Audio file created {audio_file_name}")
 
-        self.tagger.synchronize_metadata(audio_file_name, metadata_file_name)
+        self.tagger.synchronize_metadata(audio_file_name, metadata_file_name, recording=recording, source_filename=intermediate_file_name)
 
         return recording
 
-    def download(self, uri: str, path_file_base: str, audio_file: str):
+    def download_media(self, uri: str, path_file_base: str, audio_file: str) -> str:
         """
-        Download a media (video or audio) file from a URL
+        Download a media (video or audio) file from a URL into the cache entry and extract its audio, unless the audio file is already cached
         Args:
         :param uri:            the network Uniform Resource Identifier of the media file to be downloaded
         :param path_file_base: the base path and file for the media file to be loaded to which file extensions will be appended as required (media file vs metadata file)
         :param audio_file:     the name of the downloaded audio file
         """
+        if os.path.isfile(audio_file):
+            Logger.debug(f"File {audio_file} is cached on the local file system")
+            return audio_file
+
         downloader_module = Configuration().get('downloader_module')
         Logger.debug(f"Download started [{downloader_module if downloader_module is not None else 'default YouTube Download'}]", separator=True)
 
@@ -121,34 +155,88 @@ class Loader(object):
                 Logger.error(message=str(error))
                 raise error
 
-        metadata_file_name: str = f"{path_file_base}.{Configuration().get('metadata_file_type')}"
-        self.tagger.synchronize_metadata(audio_file, metadata_file_name)
+        if os.path.isfile(audio_file):
+            Metrics.increment('downloaded_bytes_total', os.path.getsize(audio_file))
+        return audio_file
 
+    def download(self, uri: str, path_file_base: str, audio_file: str):
+        """
+        Download a media (video or audio) file from a URL
+        Args:
+        :param uri:            the network Uniform Resource Identifier of the media file to be downloaded
+        :param path_file_base: the base path and file for the media file to be loaded to which file extensions will be appended as required (media file vs metadata file)
+        :param audio_file:     the name of the downloaded audio file
+        """
         import pydub
 
-        return pydub.AudioSegment.from_file(audio_file)
+        self.download_media(uri, path_file_base, audio_file)
+
+        recording: pydub.AudioSegment = PCMRecording.decode(audio_file, Loader.pcm_file_name(path_file_base)) if self.chunked() else pydub.AudioSegment.from_file(audio_file)
+
+        metadata_file_name: str = f"{path_file_base}.{Configuration().get('metadata_file_type')}"
+        self.tagger.synchronize_metadata(audio_file, metadata_file_name, recording=recording)
 
-    def load(self, uri: str) -> tuple[pydub.AudioSegment, str]:
+        return recording
+
+    @staticmethod
+    def pcm_file_name(path_file_base: str) -> str:
+        """
+        The memory mapped PCM file of a cache entry, named by its sample format so that a change of format is decoded anew
+        """
+        return f"{path_file_base}.{Configuration().get('frame_rate')}.{Configuration().get('channels')}.{Configuration().get('sample_width')}.pcm"
+
+    @staticmethod
+    def key(uri: str) -> str:
+        """
+        The cache entry key (and file name base) of a URI
+        """
+        return hashlib.md5(uri.encode('utf-8')).hexdigest().upper()
+
+    def fetch(self, uri: str) -> str:
+        """
+        Download (or copy) a media (video or audio) file into the cache without decoding it, a later load of the URI decodes the cached file
+        Args:
+        :param uri: the Uniform Resource Identifier of the media file to be fetched
+        """
+        Logger.debug(f"Fetching media file from {uri}", separator=True)
+        filename: str = Loader.key(uri)
+
+        with Metrics.timer('stage_seconds', stage='fetch'), self.cache.entry(filename, uri) as path_file_base:
+            try:
+                if uri.startswith("file://"):
+                    return self.copy_media(uri, path_file_base)
+                return self.download_media(uri, path_file_base, f"{path_file_base}.{Configuration().get('output_file_type')}")
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Fetching media file from URL: {uri} failed")
+
+    def load(self, uri: str, within: Callable = None) -> tuple[pydub.AudioSegment, str]:
         """
         Download (or copy) a media (video or audio) file from a URL (or the local file system)
         Args:
-        :param uri: the Uniform Resource Identifier of the media file to be loaded
+        :param uri:    the Uniform Resource Identifier of the media file to be loaded
+        :param within: called with the recording and its audio file while the cache entry is still locked (e.g., to read or write other files
+                       of the entry before it can be evicted)
         """
         Logger.debug(f"Loading media file from {uri}", separator=True)
         start_time: float = time.time()
-        filename: str = f"{hashlib.md5(uri.encode('utf-8')).hexdigest().upper()}"
-        path_file_base: str = f"{Configuration().get('cache_root')}\\{filename}"
-        audio_file: str = f"{path_file_base}.{Configuration().get('output_file_type')}"
+        filename: str = Loader.key(uri)
+
+        with self.cache.entry(filename, uri) as path_file_base:  # other processes loading the same URI wait here rather than read half written files
+            audio_file: str = f"{path_file_base}.{Configuration().get('output_file_type')}"
 
-        try:
-            import pydub
-            recording: pydub.AudioSegment = self.copy(uri, path_file_base, audio_file) if uri.startswith("file://") else self.download(uri, path_file_base, audio_file)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Loading media file from URL: {uri} failed")
+            try:
+                import pydub
+                recording: pydub.AudioSegment = self.copy(uri, path_file_base, audio_file) if uri.startswith("file://") else self.download(uri, path_file_base, audio_file)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Loading media file from URL: {uri} failed")
+            if within is not None:
+                within(recording, audio_file)
 
         self.tagger.set('filename', filename)
 
         Logger.debug(f"Audio file {audio_file} generated")
         Logger.debug(f"Media file load and conversion finished [{time.time() - start_time} secs]")
+        Metrics.observe('stage_seconds', time.time() - start_time, stage='load')
+        Metrics.increment('decoded_bytes_total', int(recording.frame_count()) * recording.channels * recording.sample_width)
 
         return recording, audio_file
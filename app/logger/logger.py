@@ -109,8 +109,8 @@ class Logger(object):
         if message is not None:
             Logger.debug(message)
 
-        number_of_samples: int = len(recording.get_array_of_samples())
-        number_of_samples_per_channel: int = number_of_samples // recording.channels
+        number_of_samples_per_channel: int = int(recording.frame_count())  # no copy of the samples (the recording may be memory mapped)
+        number_of_samples: int = number_of_samples_per_channel * recording.channels
         duration: float = number_of_samples_per_channel / recording.frame_rate
 
         Logger.debug(f"Frame rate: {recording.frame_rate}")
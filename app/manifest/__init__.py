@@ -0,0 +1,3 @@
+"""Manifest module that records what each batch run exported for each source so unchanged sources can be skipped"""
+
+from .manifest import Manifest
@@ -0,0 +1,137 @@
+"""
+Run manifest of the sources processed by batch runs
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from cache import Cache, FileLock
+from configuration.configuration import Configuration
+from logger import Logger
+
+
+class Manifest(object):
+    """
+    Records, for each source URI, the source hash, the logic/configuration hash, and the exported clip files
+
+    A source whose entry completed with the same source and logic hashes, and whose clip files all still exist, is up to date
+    """
+
+    def __init__(self, file_path: str = None):
+        """
+        Args:
+        :param file_path: the JSON manifest file (defaults to the configured manifest file path)
+        """
+        self.file_path: str = file_path if file_path is not None else Configuration().get('manifest_file_path')
+        self.entries: {} = self.load()
+        self.changed: {str} = set()  # the URIs recorded since the last save
+
+    def load(self) -> {}:
+        try:
+            with open(self.file_path, encoding='utf-8') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as error:
+            Logger.warning(f"Manifest {self.file_path} is unreadable, every source will be processed [{error}]")
+            return {}
+
+    def save(self) -> None:
+        """
+        Merge the entries recorded since the last save into the manifest file (other processes may be recording other sources)
+        Note: only the changed entries are merged, the entries loaded earlier may be older than the ones other processes have recorded since
+        """
+        with FileLock(f"{self.file_path}.lock"):
+            entries: {} = self.load()
+            entries.update({uri: self.entries[uri] for uri in self.changed})
+            with Cache.atomic(self.file_path) as part_file_path:
+                with open(part_file_path, 'w', encoding='utf-8') as json_file:
+                    json.dump(entries, json_file, ensure_ascii=False, indent=4)
+            self.entries = entries
+            self.changed.clear()
+
+    @staticmethod
+    def logic_hash(logic: [{}] = None) -> str:
+        """
+        Hash the configuration values and slicer logic that determine the exported clips (the configured output keys, so that e.g.,
+        a changed work root, port, or worker count does not make every source stale)
+        Args:
+        :param logic: the slicer logic (defaults to the loaded logic)
+        """
+        configuration: {} = Configuration().values(Configuration().output_keys)
+        logic = logic if logic is not None else Configuration().get('logic')
+        serialized: str = json.dumps({'configuration': configuration, 'logic': logic}, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def source_hash(uri: str) -> str:
+        """
+        Hash the content of a local file system source, remote sources are identified by their URI
+        Args:
+        :param uri: the Uniform Resource Identifier of the source
+        """
+        if not uri.startswith("file://"):
+            return hashlib.md5(uri.encode('utf-8')).hexdigest()
+
+        parsed_url = urlparse(uri)
+        source_file_name = parsed_url.netloc + parsed_url.path if parsed_url.netloc else parsed_url.path.strip('/')  # This might be Windows only logic
+        digest = hashlib.md5()
+        try:
+            with open(source_file_name, 'rb') as source_file:
+                for block in iter(lambda: source_file.read(1 << 20), b''):
+                    digest.update(block)
+        except IOError as error:
+            Logger.warning(f"Source {uri} could not be hashed [{error}]")
+            return ''
+        return digest.hexdigest()
+
+    def is_current(self, uri: str, source_hash: str, logic_hash: str) -> bool:
+        """
+        Has the source already been exported with the same content and logic (and are its clips still there)
+        Args:
+        :param uri:         the Uniform Resource Identifier of the source
+        :param source_hash: the current hash of the source
+        :param logic_hash:  the current hash of the configuration and logic
+        """
+        entry: {} = self.entries.get(uri)
+        if entry is None or 'complete' != entry.get('status'):
+            return False
+        if '' == source_hash or source_hash != entry.get('source_hash') or logic_hash != entry.get('logic_hash'):
+            return False
+        return all(Path(clip).is_file() for clip in entry.get('clips', []))
+
+    def clips(self, uri: str) -> [str]:
+        """
+        The clip files previously exported for a source
+        Args:
+        :param uri: the Uniform Resource Identifier of the source
+        """
+        return self.entries.get(uri, {}).get('clips', [])
+
+    def complete(self, uri: str, source_hash: str, logic_hash: str, clips: [str]) -> None:
+        """
+        Record a successfully processed source
+        Args:
+        :param uri:         the Uniform Resource Identifier of the source
+        :param source_hash: the hash of the source that was processed
+        :param logic_hash:  the hash of the configuration and logic used
+        :param clips:       the exported clip files
+        """
+        self.entries[uri] = {'status': 'complete', 'source_hash': source_hash, 'logic_hash': logic_hash, 'clips': clips, 'updated': time.time()}
+        self.changed.add(uri)
+        self.save()
+
+    def fail(self, uri: str, source_hash: str, logic_hash: str, error: str) -> None:
+        """
+        Record a source that could not be processed (it is redone by the next run)
+        Args:
+        :param uri:         the Uniform Resource Identifier of the source
+        :param source_hash: the hash of the source that was processed
+        :param logic_hash:  the hash of the configuration and logic used
+        :param error:       a description of the failure
+        """
+        self.entries[uri] = {'status': 'failed', 'source_hash': source_hash, 'logic_hash': logic_hash, 'clips': [], 'error': error, 'updated': time.time()}
+        self.changed.add(uri)
+        self.save()
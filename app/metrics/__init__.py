@@ -0,0 +1,3 @@
+"""Metrics module that exports live run counters, histograms, and gauges in the Prometheus text format"""
+
+from .metrics import Metrics
@@ -0,0 +1,228 @@
+"""
+Live run metrics in the Prometheus text exposition format, written to a textfile and/or served on a local HTTP endpoint
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+
+from configuration.configuration import Configuration
+from logger import Logger
+
+
+class Metrics(object):
+    """
+    The counters, histograms, and gauges of this process, named after the application e.g., bytter_sources_total
+
+    - sources_total{outcome}:              the sources processed, failed, or skipped (up to date)
+    - stage_seconds{stage}:                the latency of the fetch, load, slice, and export stages of a source
+    - analysis_seconds{method}:            the latency of each slicer's analysis
+    - clips_exported_total:                the clips exported (rate() gives the clips exported per second)
+    - clips_exported_per_second:           the clips exported per second since the process started
+    - clips_deduplicated_total{scope}:     the clips not exported as near-duplicates of a clip of the recording or of the catalog
+    - slicing_stages_cut_total{action}:    the slicing stages reduced or cut to keep an anytime slicing within its budget
+    - downloaded_bytes_total:              the bytes of media files downloaded (or copied) into the cache
+    - decoded_bytes_total:                 the bytes of PCM audio decoded from media files
+    - cache_requests_total{cache, result}: the media and analysis cache lookups that hit or missed
+    - cache_hit_ratio{cache}:              the share of the cache lookups that hit
+    - queue_depth{queue}:                  the items waiting in the pipeline stage, scheduler, daemon, and job queues
+    - start_time_seconds:                  when the process started (Unix time)
+    """
+
+    declared: {} = {
+        'sources_total': ('counter', 'Sources processed, failed, or skipped'),
+        'stage_seconds': ('histogram', 'Seconds taken by a processing stage of a source'),
+        'analysis_seconds': ('histogram', 'Seconds taken by the analysis of a slicer'),
+        'clips_exported_total': ('counter', 'Clips exported'),
+        'clips_exported_per_second': ('gauge', 'Clips exported per second since the process started'),
+        'clips_deduplicated_total': ('counter', 'Clips dropped as near-duplicates, by scope'),
+        'slicing_stages_cut_total': ('counter', 'Slicing stages reduced or cut by an anytime slicing budget, by action'),
+        'downloaded_bytes_total': ('counter', 'Bytes of media files downloaded or copied into the cache'),
+        'decoded_bytes_total': ('counter', 'Bytes of PCM audio decoded from media files'),
+        'cache_requests_total': ('counter', 'Cache lookups, by cache and result'),
+        'cache_hit_ratio': ('gauge', 'Share of the cache lookups that hit'),
+        'queue_depth': ('gauge', 'Items waiting in a queue'),
+        'start_time_seconds': ('gauge', 'Start time of the process since the Unix epoch')
+    }
+
+    buckets: [float] = [0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0]  # seconds
+
+    lock: threading.Lock = threading.Lock()
+    counters: {} = {}  # by (name, labels)
+    histograms: {} = {}  # by (name, labels): the count of each bucket, then the sum and the count
+    gauges: {} = {}  # by (name, labels): a value or a function returning one, read when the metrics are rendered
+    started: float = time.time()
+    server: Optional[ThreadingHTTPServer] = None
+    writer: Optional[threading.Thread] = None
+
+    @staticmethod
+    def increment(name: str, value: float = 1.0, **labels) -> None:
+        """
+        Add to a counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with Metrics.lock:
+            Metrics.counters[key] = Metrics.counters.get(key, 0.0) + value
+
+    @staticmethod
+    def observe(name: str, value: float, **labels) -> None:
+        """
+        Record a value in a histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with Metrics.lock:
+            histogram: [float] = Metrics.histograms.setdefault(key, [0.0] * (len(Metrics.buckets) + 2))
+            for index, bound in enumerate(Metrics.buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    @contextmanager
+    def timer(name: str, **labels):
+        """
+        Record the seconds a block takes in a histogram (also when it raises)
+        """
+        began: float = time.monotonic()
+        try:
+            yield
+        finally:
+            Metrics.observe(name, time.monotonic() - began, **labels)
+
+    @staticmethod
+    def gauge(name: str, value: Union[float, Callable[[], float]], **labels) -> None:
+        """
+        Set a gauge, to a value or to a function that is called whenever the metrics are rendered e.g., the size of a queue
+        """
+        with Metrics.lock:
+            Metrics.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @staticmethod
+    def render() -> str:
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        prefix: str = f"{Configuration().get('application_name')}_"
+        uptime: float = max(1e-9, time.time() - Metrics.started)
+
+        with Metrics.lock:
+            counters: {} = dict(Metrics.counters)
+            histograms: {} = dict((key, list(histogram)) for key, histogram in Metrics.histograms.items())
+            gauges: {} = dict(Metrics.gauges)
+
+        gauges[('start_time_seconds', ())] = Metrics.started
+        gauges[('clips_exported_per_second', ())] = counters.get(('clips_exported_total', ()), 0.0) / uptime
+        for cache in sorted(set(dict(labels).get('cache') for name, labels in counters if 'cache_requests_total' == name)):
+            hits: float = counters.get(('cache_requests_total', (('cache', cache), ('result', 'hit'))), 0.0)
+            misses: float = counters.get(('cache_requests_total', (('cache', cache), ('result', 'miss'))), 0.0)
+            gauges[('cache_hit_ratio', (('cache', cache),))] = hits / (hits + misses) if hits + misses else 0.0
+
+        def labelled(labels: tuple, *extra: (str, str)) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+        def number(value: float) -> str:
+            return repr(float(value)) if value == value else 'NaN'
+
+        lines: [str] = []
+        for name, (kind, description) in Metrics.declared.items():
+            if 'counter' == kind:
+                samples = [(labels, value) for (metric, labels), value in counters.items() if metric == name]
+            elif 'gauge' == kind:
+                samples = []
+                for (metric, labels), value in gauges.items():
+                    if metric != name:
+                        continue
+                    try:
+                        samples.append((labels, value() if callable(value) else value))
+                    except Exception as error:  # e.g., a job queue that cannot be read at the moment
+                        Logger.warning(f"Metric {prefix}{name}{labelled(labels)} could not be read [{error}]")
+            else:
+                samples = [(labels, histogram) for (metric, labels), histogram in histograms.items() if metric == name]
+            if not samples:
+                continue
+
+            lines += [f"# HELP {prefix}{name} {description}", f"# TYPE {prefix}{name} {kind}"]
+            for labels, value in sorted(samples, key=lambda sample: sample[0]):
+                if 'histogram' != kind:
+                    lines.append(f"{prefix}{name}{labelled(labels)} {number(value)}")
+                    continue
+                for bound, count in zip(Metrics.buckets, value):
+                    lines.append(f"{prefix}{name}_bucket{labelled(labels, ('le', repr(bound)))} {number(count)}")
+                lines.append(f"{prefix}{name}_bucket{labelled(labels, ('le', '+Inf'))} {number(value[-1])}")
+                lines.append(f"{prefix}{name}_sum{labelled(labels)} {number(value[-2])}")
+                lines.append(f"{prefix}{name}_count{labelled(labels)} {number(value[-1])}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def write(file_path: str = None) -> None:
+        """
+        Replace the metrics textfile (atomically, as the node exporter's textfile collector requires)
+        Args:
+        :param file_path: the textfile (defaults to the configured metrics file)
+        """
+        from cache import Cache
+
+        file_path = file_path if file_path is not None else Configuration().get('metrics_file')
+        try:
+            with Cache.atomic(file_path) as part_file_path:
+                with open(part_file_path, 'w', encoding='utf-8') as metrics_file:
+                    metrics_file.write(Metrics.render())
+        except OSError as error:
+            Logger.warning(f"Unable to write the metrics file {file_path} [{error}]")
+
+    @staticmethod
+    def handler():
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *arguments) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if '/metrics' != self.path.split('?')[0]:
+                    self.send_error(404)
+                    return
+                content: bytes = Metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+    @staticmethod
+    def start(file_path: str = None, port: int = None, host: str = None, interval_seconds: float = None) -> None:
+        """
+        Start exporting the metrics: a thread rewrites the textfile every interval (and once more at exit), and/or a thread serves GET /metrics
+        Args:
+        :param file_path:        the textfile (defaults to the configured metrics file, not written when empty)
+        :param port:             the port of the HTTP endpoint (defaults to the configured metrics port, not served when 0)
+        :param host:             the interface to listen on (defaults to the configured metrics host, the local host)
+        :param interval_seconds: the time between writes of the textfile (defaults to the configured metrics interval)
+        """
+        file_path = file_path if file_path is not None else Configuration().get('metrics_file')
+        port = port if port is not None else Configuration().get('metrics_port')
+        host = host if host is not None else Configuration().get('metrics_host')
+        interval_seconds = interval_seconds if interval_seconds is not None else Configuration().get('metrics_interval_seconds')
+
+        if file_path and Metrics.writer is None:
+            def write() -> None:
+                while True:
+                    Metrics.write(file_path)
+                    time.sleep(interval_seconds)
+
+            Metrics.writer = threading.Thread(target=write, name='metrics-writer', daemon=True)
+            Metrics.writer.start()
+            atexit.register(Metrics.write, file_path)  # the final counts of a batch run
+            Logger.debug(f"Writing metrics to {file_path} every {interval_seconds} secs")
+
+        if port and Metrics.server is None:
+            Metrics.server = ThreadingHTTPServer((host, port), Metrics.handler())
+            threading.Thread(target=Metrics.server.serve_forever, name='metrics-server', daemon=True).start()
+            Logger.debug(f"Serving metrics on http://{host}:{Metrics.server.server_port}/metrics")
@@ -0,0 +1,3 @@
+"""Pipeline module that processes a batch of sources in stages connected by bounded queues"""
+
+from .pipeline import Pipeline, Stage
@@ -0,0 +1,268 @@
+"""
+Staged pipeline that processes many recordings at once
+"""
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from audioprocessor import AudioProcessor
+from configuration.configuration import Configuration
+from logger import Logger
+from manifest import Manifest
+from metrics import Metrics
+
+
+class Job(object):
+    """
+    A source making its way through the pipeline, with the audio processor that holds its recording
+    """
+
+    def __init__(self, url: str, source_hash: str, processor: AudioProcessor):
+        self.url: str = url
+        self.source_hash: str = source_hash
+        self.processor: Optional[AudioProcessor] = processor
+        self.enqueued: float = time.monotonic()
+
+
+class Stage(object):
+    """
+    A pool of workers that take jobs from a bounded queue, do one step of the processing, and pass each job to the next stage
+
+    - a worker blocks passing a job on while the next stage's queue is full, so a stage that falls behind holds back the stages upstream of it (backpressure)
+    - the queue depth, the time jobs waited in the queue, and the time workers were busy or held back are kept for reporting
+    """
+
+    def __init__(self, name: str, work: Callable[[Job], None], workers: int = 1, capacity: int = 1):
+        """
+        Args:
+        :param name:     the name of the stage e.g., 'analyze'
+        :param work:     the step of the processing done for each job
+        :param workers:  the number of jobs the stage works on at once
+        :param capacity: the number of jobs the queue of the stage holds before the stage upstream of it is held back
+        """
+        self.name: str = name
+        self.work: Callable[[Job], None] = work
+        self.workers: int = max(1, workers)
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, capacity))
+        self.downstream: Optional[Stage] = None
+        self.finish: Optional[Callable[[Job, Optional[Exception]], None]] = None
+        self.threads: [threading.Thread] = []
+        self.lock: threading.Lock = threading.Lock()
+
+        self.processed: int = 0
+        self.failed: int = 0
+        self.deepest: int = 0
+        self.waited: float = 0.0
+        self.longest_wait: float = 0.0
+        self.busy: float = 0.0
+        self.blocked: float = 0.0
+
+    def start(self, downstream: Optional['Stage'], finish: Callable[[Job, Optional[Exception]], None]) -> None:
+        """
+        Args:
+        :param downstream: the stage that takes the jobs this stage is done with (None for the last stage)
+        :param finish:     called with each job that leaves the pipeline, and the error that ended it early
+        """
+        self.downstream = downstream
+        self.finish = finish
+        self.threads = [threading.Thread(target=self.run, name=f"{self.name}-{index}", daemon=True) for index in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, job: Job) -> float:
+        """
+        Queue a job, waiting while the queue is full
+        Returns the seconds spent waiting for room in the queue
+        """
+        began: float = time.monotonic()
+        job.enqueued = began
+        self.queue.put(job)
+        with self.lock:
+            self.deepest = max(self.deepest, self.queue.qsize())
+        return time.monotonic() - began
+
+    def stop(self) -> None:
+        """
+        Let the workers finish the queued jobs, then end them
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def run(self) -> None:
+        while True:
+            job: Optional[Job] = self.queue.get()
+            if job is None:
+                return
+
+            began: float = time.monotonic()
+            waited: float = began - job.enqueued
+            Logger.debug(f"Stage '{self.name}' took {job.url} after {waited:.2f} secs in its queue (depth {self.queue.qsize()})")
+
+            try:
+                self.work(job)
+            except Exception as error:
+                with self.lock:
+                    self.failed += 1
+                    self.waited += waited
+                    self.longest_wait = max(self.longest_wait, waited)
+                    self.busy += time.monotonic() - began
+                self.finish(job, error)
+                continue
+
+            busy: float = time.monotonic() - began
+            blocked: float = self.downstream.put(job) if self.downstream is not None else 0.0
+
+            with self.lock:
+                self.processed += 1
+                self.waited += waited
+                self.longest_wait = max(self.longest_wait, waited)
+                self.busy += busy
+                self.blocked += blocked
+
+            if self.downstream is None:
+                self.finish(job, None)
+
+    def status(self) -> {}:
+        with self.lock:
+            taken: int = self.processed + self.failed
+            return {
+                'stage': self.name,
+                'workers': self.workers,
+                'depth': self.queue.qsize(),
+                'deepest': self.deepest,
+                'processed': self.processed,
+                'failed': self.failed,
+                'mean wait seconds': self.waited / taken if taken else 0.0,
+                'longest wait seconds': self.longest_wait,
+                'busy seconds': self.busy,
+                'blocked seconds': self.blocked
+            }
+
+
+class Pipeline(object):
+    """
+    Processes a batch of sources in stages connected by bounded queues, so that downloading, analysis, and exporting overlap
+
+    - download:   fetch the media file into the cache (network bound)
+    - decode:     decode the cached media file (converter bound)
+    - preprocess: trim and normalize the recording
+    - analyze:    slice the recording into clips and fade them (CPU bound)
+    - export:     write and catalog the clips (disk bound)
+
+    Each source gets its own audio processor (the working directories and the cache are shared), and the bounded queues limit
+    how many recordings are held in memory at once
+    Note: the workers are threads, the analysis libraries release the interpreter lock in their numerical code
+    """
+
+    stages: [str] = ['download', 'decode', 'preprocess', 'analyze', 'export']
+
+    def __init__(self, processor: AudioProcessor, manifest: Manifest = None, logic_hash: str = None, workers: {} = None, capacity: int = None):
+        """
+        Args:
+        :param processor:  the audio processor whose cache the sources share (it prepared the working directories)
+        :param manifest:   the run manifest, sources that are up to date are skipped and every outcome is recorded (not recorded when not provided)
+        :param logic_hash: the hash of the current configuration and logic
+        :param workers:    the number of workers of each stage, by stage name (defaults to the configured pipeline workers)
+        :param capacity:   the capacity of the queue of each stage (defaults to the configured pipeline queue size)
+        """
+        self.processor: AudioProcessor = processor
+        self.manifest: Optional[Manifest] = manifest
+        self.logic_hash: str = logic_hash if logic_hash is not None else Manifest.logic_hash()
+        workers = dict(Configuration().get('pipeline_workers'), **(workers if workers is not None else {}))
+        capacity = capacity if capacity is not None else Configuration().get('pipeline_queue_size')
+
+        self.pipeline: [Stage] = [Stage(name, getattr(self, name), workers[name] if name in workers else 1, capacity) for name in Pipeline.stages]
+        for stage in self.pipeline:
+            Metrics.gauge('queue_depth', stage.queue.qsize, queue=f"pipeline {stage.name}")
+        self.lock: threading.Lock = threading.Lock()
+        self.failures: int = 0
+
+    @staticmethod
+    def download(job: Job) -> None:
+        job.processor.loader.fetch(job.url)
+
+    @staticmethod
+    def decode(job: Job) -> None:
+        job.processor.decode(job.url)
+
+    @staticmethod
+    def preprocess(job: Job) -> None:
+        job.processor.trim().store().normalize()
+
+    @staticmethod
+    def analyze(job: Job) -> None:
+        job.processor.slice().fade()
+
+    @staticmethod
+    def export(job: Job) -> None:
+        job.processor.export()
+
+    def finish(self, job: Job, error: Optional[Exception]) -> None:
+        """
+        Record the outcome of a job and release its recording
+        """
+        with self.lock:
+            Metrics.increment('sources_total', outcome='processed' if error is None else 'failed')
+            if error is None:
+                if self.manifest is not None:
+                    self.manifest.complete(job.url, job.source_hash, self.logic_hash, job.processor.exported)
+            else:
+                self.failures += 1
+                if isinstance(error, FileNotFoundError):
+                    Logger.error(f"Unable to access {job.url} [Processing with next URL]")
+                else:
+                    Logger.error(f"Unable to clip {job.url}: {error} [Processing with next URL]")
+                if self.manifest is not None:
+                    self.manifest.fail(job.url, job.source_hash, self.logic_hash, str(error))
+        job.processor.catalog.close()
+        job.processor = None
+
+    def run(self, urls: [str]) -> int:
+        """
+        Process the sources, returns the number of sources that failed
+        Args:
+        :param urls: the Uniform Resource Identifiers of the sources
+        """
+        started: float = time.monotonic()
+        self.failures = 0
+
+        for stage, downstream in zip(self.pipeline, self.pipeline[1:] + [None]):
+            stage.start(downstream, self.finish)
+
+        for url in urls:
+            source_hash: str = Manifest.source_hash(url)
+            if self.manifest is not None:
+                with self.lock:  # the export workers record outcomes in the manifest meanwhile
+                    current: bool = self.manifest.is_current(url, source_hash, self.logic_hash)
+                    stale: [str] = self.manifest.clips(url)
+                if current:
+                    Logger.debug(f"Skipping {url}, its {len(stale)} clips are up to date", separator=True)
+                    Metrics.increment('sources_total', outcome='skipped')
+                    continue
+                for clip in stale:  # clips exported with an earlier source or logic are stale
+                    if os.path.isfile(clip):
+                        os.remove(clip)
+            self.pipeline[0].put(Job(url, source_hash, AudioProcessor(cache=self.processor.cache)))  # waits while the download queue is full
+
+        for stage in self.pipeline:  # each stage ends once the stages upstream of it have ended and it has emptied its queue
+            stage.stop()
+
+        self.report(time.monotonic() - started)
+        return self.failures
+
+    def status(self) -> [{}]:
+        """
+        The queue depth, waiting, and working statistics of every stage
+        """
+        return [stage.status() for stage in self.pipeline]
+
+    def report(self, elapsed: float) -> None:
+        Logger.debug(f"Pipeline finished in {elapsed:.2f} secs, {self.failures} sources failed", separator=True)
+        for status in self.status():
+            Logger.debug(f"Stage '{status['stage']}' [{status['workers']} workers]: {status['processed']} processed, {status['failed']} failed, "
+                         f"deepest queue {status['deepest']}, mean wait {status['mean wait seconds']:.2f} secs, longest wait {status['longest wait seconds']:.2f} secs, "
+                         f"busy {status['busy seconds']:.2f} secs, held back {status['blocked seconds']:.2f} secs")
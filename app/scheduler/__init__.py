@@ -0,0 +1,4 @@
+"""Scheduler module that processes as many sources at once as a memory budget allows, from per-stage cost estimates learned from measured runs"""
+
+from .costmodel import CostModel, Meter
+from .scheduler import ScheduledJob, Scheduler
@@ -0,0 +1,247 @@
+"""
+Peak memory and CPU time estimates of the processing stages of a recording, learned from measured runs
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from cache import Cache, FileLock
+from configuration.configuration import Configuration
+from logger import Logger
+
+
+def resident_bytes() -> int:
+    """
+    The resident memory of this process (0 when it cannot be read)
+    """
+    try:
+        import psutil
+        return int(psutil.Process().memory_info().rss)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, ValueError, AttributeError):
+        return 0
+
+
+def available_bytes() -> int:
+    """
+    The physical memory available to new allocations (0 when it cannot be read)
+    """
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, AttributeError, OSError):
+        return 0
+
+
+class CostModel(object):
+    """
+    Estimates the peak memory (above the memory held when the stage began) and the CPU seconds of a processing stage from the duration of the recording
+
+    - the stages are 'decode', 'preprocess', and 'export' (suffixed ':out_of_core' for a memory mapped recording), and the analysis of each slicer
+      as 'analyze:<method>' (suffixed ':<mode>' or ':<model>' for a slicer given a mode or a training model)
+    - each stage's cost is proportional to the duration, the cost per second fitted (least squares) over the recordings the stage was measured with
+      and two prior observations derived from the sample format and the analysis features of the slicer, so the measurements outweigh the priors as runs accumulate
+    - the measurements of every run are merged into the cost model file of the work root
+    """
+
+    prior_durations: [float] = [60.0, 600.0]  # seconds of audio at which the prior observations are placed
+
+    # bytes held per second of audio for each analysis feature, in units of frames (mono float32 samples, STFT magnitudes, separated float32 stems)
+    feature_bytes_per_frame: {} = {'mono': 8, 'stft': 16, 'onset': 1, 'stems': 48, 'envelope': 0}
+    feature_seconds_per_second: {} = {'mono': 0.005, 'stft': 0.02, 'onset': 0.03, 'stems': 0.5, 'envelope': 0.001}
+
+    def __init__(self, file_path: str = None):
+        """
+        Args:
+        :param file_path: the JSON cost model file (defaults to the configured cost model file path)
+        """
+        self.file_path: str = file_path if file_path is not None else Configuration().get('cost_model_file_path')
+        self.lock: threading.Lock = threading.Lock()
+        self.stages: {} = self.load()
+        self.pending: {} = {}  # this run's measurements, merged into the file on save
+
+    def load(self) -> {}:
+        try:
+            with open(self.file_path, encoding='utf-8') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as error:
+            Logger.warning(f"Cost model {self.file_path} is unreadable, the prior estimates are used [{error}]")
+            return {}
+
+    def save(self) -> None:
+        """
+        Merge this run's measurements into the cost model file (other processes may be measuring other recordings)
+        """
+        with self.lock:
+            pending: {} = self.pending
+            self.pending = {}
+        if not pending:
+            return
+        with FileLock(f"{self.file_path}.lock"):
+            stages: {} = self.load()
+            for key, sums in pending.items():
+                merged: {} = stages.setdefault(key, {})
+                for name, value in sums.items():
+                    merged[name] = merged.get(name, 0.0) + value
+            with Cache.atomic(self.file_path) as part_file_path:
+                with open(part_file_path, 'w', encoding='utf-8') as json_file:
+                    json.dump(stages, json_file, ensure_ascii=False, indent=4)
+        with self.lock:
+            for key, sums in self.pending.items():  # measured while the file was written
+                merged = stages.setdefault(key, {})
+                for name, value in sums.items():
+                    merged[name] = merged.get(name, 0.0) + value
+            self.stages = stages
+
+    @staticmethod
+    def analysis_key(method: str, arguments: {}) -> str:
+        """
+        The cost model stage of a slicer, distinguished by its mode or its training model when it is given one
+        """
+        variant = (arguments.get('mode') or arguments.get('model')) if isinstance(arguments, dict) else None
+        return f"analyze:{method}" if variant is None else f"analyze:{method}:{variant}"
+
+    def observe(self, key: str, duration: float, peak_bytes: Optional[int], cpu_seconds: float) -> None:
+        """
+        Record a measured stage
+        Args:
+        :param key:         the cost model stage
+        :param duration:    the seconds of audio processed
+        :param peak_bytes:  the peak memory above the memory held when the stage began (None when it could not be measured)
+        :param cpu_seconds: the CPU seconds of the stage
+        """
+        with self.lock:
+            for sums in (self.stages.setdefault(key, {}), self.pending.setdefault(key, {})):
+                for name, y in (('seconds', cpu_seconds), ('bytes', peak_bytes)):
+                    if y is None:
+                        continue
+                    for term, value in (('n', 1.0), ('xx', duration * duration), ('xy', duration * y)):
+                        sums[f"{name}.{term}"] = sums.get(f"{name}.{term}", 0.0) + value
+
+    def prior(self, key: str) -> (float, float):
+        """
+        The prior (bytes, CPU seconds) per second of audio of a stage
+        """
+        from registry import Registry
+
+        frame_rate: int = Configuration().get('frame_rate')
+        pcm: int = frame_rate * Configuration().get('channels') * Configuration().get('sample_width')
+        stage, _, rest = key.partition(':')
+        if 'analyze' == stage:
+            method, _, variant = rest.partition(':')
+            plugin = Registry.get(method)
+            features: [str] = plugin.mode({'mode': variant})[0] if plugin is not None else ['mono']
+            return (pcm + sum(self.feature_bytes_per_frame.get(feature, 0) * frame_rate for feature in features),
+                    0.01 + sum(self.feature_seconds_per_second.get(feature, 0.0) for feature in features))
+        if rest:  # out of core, the samples are streamed through a memory mapped file
+            return 0.0, {'decode': 0.03, 'preprocess': 0.01, 'export': 0.01}.get(stage, 0.01)
+        return {'decode': 3 * pcm, 'preprocess': 3 * pcm, 'export': pcm}.get(stage, pcm), {'decode': 0.03, 'preprocess': 0.01, 'export': 0.01}.get(stage, 0.01)
+
+    def estimate(self, key: str, duration: float) -> (int, float):
+        """
+        The estimated peak memory bytes and CPU seconds of a stage for a recording
+        Args:
+        :param key:      the cost model stage
+        :param duration: the seconds of audio to be processed
+        """
+        prior: (float, float) = self.prior(key)
+        with self.lock:
+            sums: {} = dict(self.stages.get(key, {}))
+
+        estimates: [float] = []
+        for index, name in enumerate(('bytes', 'seconds')):
+            xx: float = sums.get(f"{name}.xx", 0.0) + sum(prior_duration ** 2 for prior_duration in self.prior_durations)
+            xy: float = sums.get(f"{name}.xy", 0.0) + sum(prior[index] * prior_duration ** 2 for prior_duration in self.prior_durations)
+            estimates.append(max(0.0, xy / xx * duration))
+        return int(estimates[0]), estimates[1]
+
+    def measurements(self, key: str) -> int:
+        """
+        The number of times the CPU seconds of a stage were measured
+        """
+        with self.lock:
+            return int(self.stages.get(key, {}).get('seconds.n', 0))
+
+
+class Meter(object):
+    """
+    Measures the stages of recordings into a cost model: the CPU seconds of the thread that runs a stage, and the peak resident memory
+    of the process above the memory held when the stage began, sampled by a background thread
+
+    Note: the stages of recordings processed at once share the growth of the process memory in proportion to their estimated peak memory
+          (a stage measured alone is attributed all of it)
+    """
+
+    def __init__(self, costs: CostModel, interval_seconds: float = 0.05):
+        """
+        Args:
+        :param costs:            the cost model into which measurements are recorded
+        :param interval_seconds: the time between samples of the resident memory
+        """
+        self.costs: CostModel = costs
+        self.interval_seconds: float = interval_seconds
+        self.lock: threading.Lock = threading.Lock()
+        self.active: {} = {}  # each stage being measured: [resident bytes when it began, estimated peak bytes, peak attributed bytes]
+        self.sampler: Optional[threading.Thread] = None
+
+    def attribute(self, resident: int) -> None:
+        """
+        Share the growth of the process memory among the stages being measured (the caller holds the lock)
+        """
+        weights: int = sum(measurement[1] for measurement in self.active.values())
+        for measurement in self.active.values():
+            measurement[2] = max(measurement[2], (resident - measurement[0]) * measurement[1] // weights)
+
+    def sample(self) -> None:
+        while True:
+            time.sleep(self.interval_seconds)
+            resident: int = resident_bytes()
+            with self.lock:
+                if not self.active:
+                    self.sampler = None
+                    return
+                self.attribute(resident)
+
+    @contextmanager
+    def measure(self, key: str, duration: float):
+        """
+        Measure a stage
+        Args:
+        :param key:      the cost model stage
+        :param duration: the seconds of audio processed by the stage
+        """
+        token: object = object()
+        began: int = resident_bytes()
+        cpu: float = time.thread_time()
+        with self.lock:
+            self.active[token] = [began, max(1, self.costs.estimate(key, duration)[0]), 0]
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample, name='meter', daemon=True)
+                self.sampler.start()
+        try:
+            yield
+        finally:
+            resident: int = resident_bytes()
+            with self.lock:
+                self.attribute(resident)
+                peak: int = self.active.pop(token)[2]
+            self.costs.observe(key, duration, peak if 0 < began else None, time.thread_time() - cpu)
+
+    def analysis(self, method: str, arguments: {}, duration: float):
+        """
+        Measure the analysis of a slicer
+        """
+        return self.measure(CostModel.analysis_key(method, arguments), duration)
@@ -0,0 +1,282 @@
+"""
+Memory budget aware scheduler that processes as many recordings at once as fit in a memory budget, the shortest first
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from audioprocessor import AudioProcessor
+from configuration.configuration import Configuration
+from logger import Logger
+from manifest import Manifest
+from metrics import Metrics
+
+from costmodel import CostModel, Meter, available_bytes
+
+
+class ScheduledJob(object):
+    """
+    A fetched source, with the estimated peak memory and CPU seconds of processing it
+    """
+
+    def __init__(self, url: str, source_hash: str, processor: AudioProcessor, duration: float):
+        self.url: str = url
+        self.source_hash: str = source_hash
+        self.processor: Optional[AudioProcessor] = processor
+        self.duration: float = duration
+        self.chunked: bool = False
+        self.memory: int = 0
+        self.seconds: float = 0.0
+        self.started: Optional[float] = None
+
+
+class Scheduler(object):
+    """
+    Admits recordings for processing while their estimated peak memory fits in what is left of the memory budget
+
+    - the sources are fetched (downloaded or copied into the cache) and their durations probed, without decoding them
+    - the peak memory and CPU seconds of each recording are estimated from the cost model, by its duration, stage, and slicers
+    - of the waiting recordings, the one with the fewest estimated CPU seconds that fits is started first, up to the maximum number of workers
+    - a recording that does not fit in the whole budget is processed out of core (a window at a time), one that still does not fit is processed alone
+    - every stage is measured, so the estimates of later runs improve
+    """
+
+    def __init__(self, processor: AudioProcessor, manifest: Manifest = None, logic_hash: str = None, budget: int = None, workers: int = None, costs: CostModel = None):
+        """
+        Args:
+        :param processor:  the audio processor whose cache the recordings share (it prepared the working directories)
+        :param manifest:   the run manifest, sources that are up to date are skipped and every outcome is recorded (not recorded when not provided)
+        :param logic_hash: the hash of the current configuration and logic
+        :param budget:     the bytes of memory the recordings being processed may hold at once (defaults to the configured budget, or three quarters of the available memory)
+        :param workers:    the maximum number of recordings processed at once (defaults to the configured workers, or the number of processors)
+        :param costs:      the cost model (defaults to the cost model file of the work root)
+        """
+        self.processor: AudioProcessor = processor
+        self.manifest: Optional[Manifest] = manifest
+        self.logic_hash: str = logic_hash if logic_hash is not None else Manifest.logic_hash()
+        self.budget: int = budget if budget else Configuration().get('scheduler_memory_budget_bytes') or 3 * available_bytes() // 4 or 4 * 1024 ** 3
+        self.workers: int = workers if workers else Configuration().get('scheduler_workers') or os.cpu_count() or 1
+        self.margin: float = Configuration().get('scheduler_memory_margin')
+        self.costs: CostModel = costs if costs is not None else CostModel()
+        self.meter: Meter = Meter(self.costs)
+
+        self.condition: threading.Condition = threading.Condition()
+        self.waiting: [ScheduledJob] = []
+        self.running: [ScheduledJob] = []
+        self.reserved: int = 0
+        self.fetching: int = 0
+        self.failures: int = 0
+        self.deepest: int = 0
+        self.alone: int = 0
+        self.chunked: int = 0
+        Metrics.gauge('queue_depth', lambda: len(self.waiting), queue='scheduler waiting')
+        Metrics.gauge('queue_depth', lambda: self.fetching, queue='scheduler fetching')
+
+    @staticmethod
+    def probe(media_file: str) -> float:
+        """
+        The duration in seconds of a media file, read from its container by the converter's prober (not decoded)
+        """
+        import wave
+        from pydub.utils import mediainfo
+
+        try:
+            with wave.open(media_file, 'rb') as wave_file:  # no converter process for a wave file
+                return wave_file.getnframes() / wave_file.getframerate()
+        except (wave.Error, EOFError):
+            pass
+        try:
+            return float(mediainfo(media_file)['duration'])
+        except Exception as error:  # no prober, or a container without a duration
+            Logger.warning(f"Unable to probe the duration of {media_file}, estimated from its size [{error}]")
+            return os.path.getsize(media_file) / 16000  # 128 kbit/s
+
+    @staticmethod
+    def stages(logic: [{}]) -> [(str, {})]:
+        """
+        The slicer methods and arguments of the active stages of a slicing logic
+        """
+        return [(slicer['method'], slicer.get('arguments', {})) for slicer in logic
+                if 'method' in slicer and not ('active' in slicer and not slicer['active']) and not ('weight' in slicer and 0 == int(slicer['weight']))]
+
+    def estimate(self, duration: float, logic: [{}], chunked: bool) -> (int, float):
+        """
+        The estimated peak memory bytes and CPU seconds of processing a recording
+        Args:
+        :param duration: the seconds of audio of the recording
+        :param logic:    the slicing logic
+        :param chunked:  is the recording processed out of core, a window at a time
+        """
+        suffix: str = ':out_of_core' if chunked else ''
+        windows: int = 1
+        analyzed: float = duration
+        if chunked:  # each window (overlapping the next by the maximum clip size) is analyzed as a recording
+            overlap: float = Configuration().get('maximum_clip_size_miliseconds') / 1000
+            analyzed = min(duration, max(2 * overlap, Configuration().get('out_of_core_window_miliseconds') / 1000))
+            windows = max(1, math.ceil((duration - overlap) / (analyzed - overlap))) if duration > analyzed else 1
+        held: int = 0 if chunked else int(duration * Configuration().get('frame_rate') * Configuration().get('channels') * Configuration().get('sample_width'))
+
+        decode, decode_seconds = self.costs.estimate(f"decode{suffix}", duration)
+        preprocess, preprocess_seconds = self.costs.estimate(f"preprocess{suffix}", duration)
+        export, export_seconds = self.costs.estimate(f"export{suffix}", duration)
+        analyses: [(int, float)] = [self.costs.estimate(CostModel.analysis_key(method, arguments), analyzed) for method, arguments in Scheduler.stages(logic)]
+
+        memory: int = max(decode, held + preprocess, held + sum(analysis[0] for analysis in analyses), held + export)  # the shared analysis features are kept until the last stage
+        seconds: float = decode_seconds + preprocess_seconds + windows * sum(analysis[1] for analysis in analyses) + export_seconds
+        return int(memory * self.margin), seconds
+
+    def plan(self, job: ScheduledJob, logic: [{}]) -> None:
+        """
+        Estimate the cost of a job, processing it out of core when it would not fit in the memory budget
+        """
+        job.chunked = bool(Configuration().get('out_of_core'))
+        job.memory, job.seconds = self.estimate(job.duration, logic, job.chunked)
+        if job.memory > self.budget and not job.chunked:
+            job.chunked = True
+            job.memory, job.seconds = self.estimate(job.duration, logic, True)
+            Logger.debug(f"{job.url} ({job.duration:.0f} secs) would not fit in the memory budget, it is processed out of core")
+        job.processor.loader.out_of_core = job.chunked
+
+    def fetch(self, url: str, source_hash: str, logic: [{}]) -> None:
+        """
+        Fetch a source into the cache, probe its duration, and queue it for admission
+        """
+        job: ScheduledJob = ScheduledJob(url, source_hash, AudioProcessor(cache=self.processor.cache), 0.0)
+        try:
+            media_file: Optional[str] = job.processor.loader.fetch(url)
+            if media_file is None or not os.path.isfile(media_file):
+                raise FileNotFoundError(f"Fetching media file from URL: {url} failed")
+            job.duration = Scheduler.probe(media_file)
+            self.plan(job, logic)
+        except Exception as error:
+            self.finish(job, error)
+            with self.condition:
+                self.fetching -= 1
+                self.condition.notify_all()
+            return
+
+        Logger.debug(f"Scheduling {url}: {job.duration:.0f} secs, estimated {job.memory / 1024 ** 2:,.0f} MB and {job.seconds:.1f} CPU secs{' (out of core)' if job.chunked else ''}")
+        with self.condition:  # queued as it stops being fetched, so the scheduler never sees neither
+            self.fetching -= 1
+            self.waiting.append(job)
+            self.deepest = max(self.deepest, len(self.waiting))
+            self.condition.notify_all()
+
+    def admissible(self) -> Optional[ScheduledJob]:
+        """
+        The waiting job to start next: the shortest that fits in what is left of the budget, or the shortest when nothing is running
+        """
+        if not self.waiting or len(self.running) >= self.workers:
+            return None
+        shortest: [ScheduledJob] = sorted(self.waiting, key=lambda job: job.seconds)
+        for job in shortest:
+            if self.reserved + job.memory <= self.budget:
+                return job
+        if not self.running:
+            self.alone += 1
+            Logger.warning(f"{shortest[0].url} is estimated to need {shortest[0].memory / 1024 ** 2:,.0f} MB, more than the memory budget of {self.budget / 1024 ** 2:,.0f} MB, it is processed alone")
+            return shortest[0]
+        return None
+
+    def work(self, job: ScheduledJob) -> None:
+        """
+        Process an admitted recording, measuring each of its stages
+        """
+        suffix: str = ':out_of_core' if job.chunked else ''
+        error: Optional[Exception] = None
+        try:
+            with self.meter.measure(f"decode{suffix}", job.duration):
+                job.processor.decode(job.url)
+            job.duration = job.processor.recording.duration_seconds  # the decoded duration, rather than the probed one
+            with self.meter.measure(f"preprocess{suffix}", job.duration):
+                job.processor.trim().store().normalize()
+            job.processor.slice(meter=self.meter).fade()
+            with self.meter.measure(f"export{suffix}", job.duration):
+                job.processor.export()
+        except Exception as exception:
+            error = exception
+        self.finish(job, error)
+
+    def finish(self, job: ScheduledJob, error: Optional[Exception]) -> None:
+        """
+        Record the outcome of a job, release its recording and its share of the memory budget
+        """
+        with self.condition:
+            Metrics.increment('sources_total', outcome='processed' if error is None else 'failed')
+            if error is None:
+                if self.manifest is not None:
+                    self.manifest.complete(job.url, job.source_hash, self.logic_hash, job.processor.exported)
+                Logger.debug(f"Processed {job.url} in {time.monotonic() - job.started:.2f} secs (estimated {job.seconds:.1f} CPU secs)")
+            else:
+                self.failures += 1
+                if isinstance(error, FileNotFoundError):
+                    Logger.error(f"Unable to access {job.url} [Processing with next URL]")
+                else:
+                    Logger.error(f"Unable to clip {job.url}: {error} [Processing with next URL]")
+                if self.manifest is not None:
+                    self.manifest.fail(job.url, job.source_hash, self.logic_hash, str(error))
+            if job in self.running:
+                self.running.remove(job)
+                self.reserved -= job.memory
+            self.condition.notify_all()
+        job.processor.catalog.close()
+        job.processor = None
+
+    def run(self, urls: [str], logic: [{}] = None) -> int:
+        """
+        Process the sources, returns the number of sources that failed
+        Args:
+        :param urls:  the Uniform Resource Identifiers of the sources
+        :param logic: the slicing logic (defaults to the configured logic)
+        """
+        started: float = time.monotonic()
+        logic = logic if logic is not None else Configuration().get('logic')
+        self.failures = 0
+        Logger.debug(f"Scheduling {len(urls)} sources in a memory budget of {self.budget / 1024 ** 2:,.0f} MB with at most {self.workers} at once", separator=True)
+
+        fetchers: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=Configuration().get('scheduler_fetch_workers'), thread_name_prefix='fetch')
+        for url in urls:
+            source_hash: str = Manifest.source_hash(url)
+            if self.manifest is not None:
+                with self.condition:  # the workers record outcomes in the manifest meanwhile
+                    current: bool = self.manifest.is_current(url, source_hash, self.logic_hash)
+                    stale: [str] = self.manifest.clips(url)
+                if current:
+                    Logger.debug(f"Skipping {url}, its {len(stale)} clips are up to date", separator=True)
+                    Metrics.increment('sources_total', outcome='skipped')
+                    continue
+                for clip in stale:  # clips exported with an earlier source or logic are stale
+                    if os.path.isfile(clip):
+                        os.remove(clip)
+            with self.condition:
+                self.fetching += 1
+            fetchers.submit(self.fetch, url, source_hash, logic)
+
+        threads: [threading.Thread] = []
+        with self.condition:
+            while self.fetching or self.waiting or self.running:
+                job: Optional[ScheduledJob] = self.admissible()
+                if job is None:
+                    self.condition.wait()
+                    continue
+                self.waiting.remove(job)
+                self.running.append(job)
+                self.reserved += job.memory
+                self.chunked += int(job.chunked)
+                job.started = time.monotonic()
+                Logger.debug(f"Admitted {job.url}: {len(self.running)} running, {self.reserved / 1024 ** 2:,.0f} of {self.budget / 1024 ** 2:,.0f} MB reserved, {len(self.waiting)} waiting")
+                thread: threading.Thread = threading.Thread(target=self.work, args=(job,), name=f"job-{len(threads)}", daemon=True)
+                threads.append(thread)
+                thread.start()
+
+        fetchers.shutdown(wait=True)
+        for thread in threads:
+            thread.join()
+        self.costs.save()
+
+        Logger.debug(f"Scheduler finished in {time.monotonic() - started:.2f} secs, {self.failures} sources failed, {self.chunked} processed out of core, "
+                     f"{self.alone} processed alone over the budget, longest wait list {self.deepest}", separator=True)
+        return self.failures
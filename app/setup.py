@@ -11,5 +11,5 @@ setup(
     description=APPLICATION_DESCRIPTION,
     license="MIT",
     package_dir={"": "app"},
-    packages=["loader", "logger", "slicer", "tagger", "tester", "audioprocessor"]
+    packages=["loader", "logger", "slicer", "tagger", "tester", "audioprocessor", "cache", "manifest", "catalog", "pipeline", "scheduler", "jobqueue", "daemon", "metrics", "evaluation"]
 )
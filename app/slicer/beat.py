@@ -1,10 +1,8 @@
-from typing import List
-
 from arguments import parse_common_arguments, to_miliseconds
 from configuration.configuration import Configuration
+from features import Features
 from logger import Logger
-from normalizer import Normalizer
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class BeatSlicer(object):
@@ -13,58 +11,56 @@ class BeatSlicer(object):
     """
     import pydub
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment):
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None):
         """
         Creates a list of potential clip begin and end sample indexes using "musical" beat boundaries
+        Note: intervals are made from every run of consecutive beats whose length is one of the multiples of the requested beat count
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording
         """
         import librosa
+        import numpy
         from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
-        beats_per_clip: int = arguments['beats'] if 'beats' in arguments else Configuration().get('default_beat_count')
-        attack: int = to_miliseconds(arguments['attack'], len(recording)) if 'attack' in arguments else Configuration().get('default_attack_miliseconds')
-        decay: int = to_miliseconds(arguments['decay'], len(recording)) if 'decay' in arguments else Configuration().get('default_decay_miliseconds')
+        beats_per_clip: int = arguments['beats'] if 'beats' in arguments else Configuration().get('beat_count')
+        multiples: [int] = arguments['multiples'] if 'multiples' in arguments else Configuration().get('beat_multiples')
+        attack: int = to_miliseconds(arguments['attack'], len(recording)) if 'attack' in arguments else Configuration().get('attack_miliseconds')
+        decay: int = to_miliseconds(arguments['decay'], len(recording)) if 'decay' in arguments else Configuration().get('decay_miliseconds')
 
         sample_rate = segment.frame_rate
         attack_samples: int = (sample_rate // 1000) * attack
         decay_samples: int = (sample_rate // 1000) * decay
 
         maximum_clip_samples = sample_rate * (Configuration().get('maximum_clip_size_miliseconds') // 1000)
-        samples = Normalizer.monaural_normalization(segment)
+        analysis: Features = (features if features is not None else Features(recording)).of(segment, segment_offset_index)
+        samples = analysis.mono()
         total_samples: int = len(samples)
 
-        beat_indexes: ndarray = librosa.frames_to_samples(librosa.beat.beat_track(y=samples, sr=segment.frame_rate)[1])
-        beat_intervals = len(beat_indexes) - beats_per_clip
-
-        Logger.debug(f"Slicing stage[{stage}], Beat Slicer: {clips} clips", separator=True)
+        beat_indexes: ndarray = librosa.frames_to_samples(analysis.beats()[1]).astype(numpy.int64)
+        beat_counts: [int] = sorted({beats_per_clip * multiple for multiple in ([multiples] if isinstance(multiples, int) else multiples) if 0 < beats_per_clip * multiple <= len(beat_indexes)})
 
-        Logger.debug(f"Decay (trailing pad) Samples: {attack_samples}")
-        Logger.debug(f"Attack (leading pad) Samples: {decay_samples}")
+        Logger.debug(f"Slicing stage[{stage}], Beat Slicer: {len(beat_indexes)} beats in clips of {beat_counts} beats", separator=True)
 
-        Logger.debug(f"Requested Clipping Intervals: {clips}")
-        Logger.debug(f"Found Beat Intervals: {beat_intervals}")
+        Logger.debug(f"Attack (leading pad) Samples: {attack_samples}")
+        Logger.debug(f"Decay (trailing pad) Samples: {decay_samples}")
 
         Logger.debug(f"Segment Samples: {total_samples}")
 
-        skip_count: int = 0
-        beat_index: int = 0
-
-        for clip_index in range(min(clips, len(beat_indexes) - beats_per_clip)):
-            begin: int = segment_offset_index + beat_indexes[beat_index] - attack_samples
-            end: int = segment_offset_index + beat_indexes[beat_index + beats_per_clip - 1] + decay_samples
-            if 0 > begin or maximum_clip_samples < end - begin or total_samples < end:
-                skip_count += 1
-                continue
-            sci = SampleClippingInterval(begin=begin, end=end)
-            self.sci.append(sci)
-            Logger.debug(f"Interval[{clip_index - skip_count}]: {sci.begin} {sci.end}")
-            beat_index += 1
+        # Every window of beat_count consecutive beats, for each beat count, runs from its first beat (less the attack) to its last beat (plus the decay)
+
+        begins: ndarray = numpy.concatenate([beat_indexes[:len(beat_indexes) - beat_count + 1] for beat_count in beat_counts] or [numpy.zeros(0, dtype=numpy.int64)]) - attack_samples
+        ends: ndarray = numpy.concatenate([beat_indexes[beat_count - 1:] for beat_count in beat_counts] or [numpy.zeros(0, dtype=numpy.int64)]) + decay_samples
+        valid: ndarray = (0 <= begins) & (ends - begins <= maximum_clip_samples) & (ends <= total_samples)
+
+        Logger.debug(f"Beat Windows: {len(begins)}, Valid: {int(valid.sum())}")
+
+        self.sci.append(segment_offset_index + begins[valid], segment_offset_index + ends[valid], weight, stage)
 
     def get(self):
         return self.sci
@@ -0,0 +1,145 @@
+"""
+Slicing budget module
+"""
+import time
+from typing import Optional
+
+from configuration.configuration import Configuration
+from logger import Logger
+from metrics import Metrics
+
+
+class Budget(object):
+    """
+    The wall clock and CPU time budget of an anytime slicing: the stages run cheapest per vote first, and a stage whose estimated cost
+    no longer fits the remaining budget runs at a reduced resolution, or is cut, so that a recording is sliced within a predictable time
+
+    - a stage's estimated cost is the CPU seconds the cost model predicts for its analysis of the recording, its value is its weight
+    - a stage's reduced resolution is the cheaper mode its slicer declares (e.g., the fast vocal mode), or else its analysis of the recording
+      resampled to the reduced frame rate (a chained stage has no reduced resolution)
+    - a stage that runs to completion is measured into the cost model (unless a scheduler's meter measures it), so the estimates improve
+    """
+
+    def __init__(self, seconds: float = None, cpu_seconds: float = None, duration: float = 0.0, costs=None, observe: bool = True):
+        """
+        Args:
+        :param seconds:     the wall clock seconds the slicing may take (0 for no limit)
+        :param cpu_seconds: the CPU seconds the slicing may take (0 for no limit)
+        :param duration:    the seconds of audio being sliced
+        :param costs:       the cost model of the stage estimates (defaults to the cost model of the work root)
+        :param observe:     measure the stages that run to completion into the cost model
+        """
+        from costmodel import CostModel
+
+        self.seconds: float = seconds if seconds is not None else Configuration().get('slice_deadline_seconds')
+        self.cpu_seconds: float = cpu_seconds if cpu_seconds is not None else Configuration().get('slice_cpu_seconds')
+        self.duration: float = duration
+        self.costs: CostModel = costs if costs is not None else CostModel()
+        self.observe: bool = observe
+        self.began: float = time.monotonic()
+        self.cpu_began: float = time.thread_time()
+        self.report: [{}] = []  # the stages and what was done with each: 'ran', 'reduced', or 'cut'
+
+    @staticmethod
+    def limited(seconds: float = None, cpu_seconds: float = None) -> bool:
+        """
+        Whether a budget applies (with the configured limits when none are given)
+        """
+        return bool(seconds if seconds is not None else Configuration().get('slice_deadline_seconds')) or bool(cpu_seconds if cpu_seconds is not None else Configuration().get('slice_cpu_seconds'))
+
+    def remaining(self) -> float:
+        """
+        The seconds left of the tighter of the wall clock and CPU budgets
+        """
+        remaining: [float] = []
+        if self.seconds:
+            remaining.append(self.seconds - (time.monotonic() - self.began))
+        if self.cpu_seconds:
+            remaining.append(self.cpu_seconds - (time.thread_time() - self.cpu_began))
+        return min(remaining) if remaining else float('inf')
+
+    def left(self) -> (float, float):
+        """
+        The seconds left of the wall clock and of the CPU budgets (0 for a budget without a limit), e.g., to pass on to a part of the slicing
+        """
+        return (max(1e-3, self.seconds - (time.monotonic() - self.began)) if self.seconds else 0,
+                max(1e-3, self.cpu_seconds - (time.thread_time() - self.cpu_began)) if self.cpu_seconds else 0)
+
+    def estimate(self, method_name: str, arguments: {}, frame_rate: int = None, reduced_frame_rate: int = None) -> float:
+        """
+        The estimated CPU seconds of a stage's analysis of the recording (at the reduced frame rate when one is given)
+        """
+        from costmodel import CostModel
+
+        seconds: float = self.costs.estimate(CostModel.analysis_key(method_name, arguments), self.duration)[1]
+        return seconds * reduced_frame_rate / frame_rate if reduced_frame_rate and frame_rate else seconds
+
+    def order(self, stages: [(int, {}, str, object, {})]) -> [(int, {}, str, object, {})]:
+        """
+        Order the (stage, slicer, method name, plugin, arguments) stages cheapest per vote first, a chained stage after the stages it refines
+        """
+        indexes: {int} = set(stage for stage, _, _, _, _ in stages)
+        value: {} = dict((stage, self.estimate(method_name, arguments) / max(1e-6, float(arguments.get('weight', 1)))) for stage, _, method_name, _, arguments in stages)
+        ordered: [(int, {}, str, object, {})] = []
+        pending: [(int, {}, str, object, {})] = list(stages)
+        done: {int} = set()
+        while pending:
+            ready = [entry for entry in pending if 'input' not in entry[1] or all(index in done or index not in indexes for index in (entry[1]['input'] if isinstance(entry[1]['input'], list) else [entry[1]['input']]))]
+            chosen = min(ready, key=lambda entry: (value[entry[0]], entry[0])) if ready else pending[0]  # a stage chained to a later stage keeps its place
+            ordered.append(chosen)
+            pending.remove(chosen)
+            done.add(chosen[0])
+        Logger.debug(f"Anytime slicing order (cheapest per vote first): {[stage for stage, _, _, _, _ in ordered]}, {self.remaining():.2f} secs budget")
+        return ordered
+
+    def admit(self, stage: int, slicer: {}, method_name: str, plugin, arguments: {}, frame_rate: int) -> (str, {}, Optional[int]):
+        """
+        Decide how a stage runs within the remaining budget: returns 'ran', 'reduced', or 'cut', the arguments to run it with,
+        and the frame rate to resample the recording to (None to analyze the recording as it is)
+        """
+        remaining: float = self.remaining()
+        estimated: float = self.estimate(method_name, arguments)
+        if estimated <= remaining:
+            self.report.append({'stage': stage, 'method': method_name, 'action': 'ran', 'estimated_seconds': round(estimated, 3)})
+            return 'ran', arguments, None
+
+        if 'input' not in slicer:
+            if plugin.reduced and not plugin.missing(dict(arguments, **plugin.reduced)):
+                reduced_arguments: {} = dict(arguments, **plugin.reduced)
+                reduced_estimate: float = self.estimate(method_name, reduced_arguments)
+                if reduced_estimate <= remaining:
+                    self.report.append({'stage': stage, 'method': method_name, 'action': 'reduced', 'mode': plugin.reduced, 'estimated_seconds': round(reduced_estimate, 3)})
+                    return 'reduced', reduced_arguments, None
+            reduced_frame_rate: int = Configuration().get('slice_reduced_frame_rate')
+            if reduced_frame_rate and reduced_frame_rate < frame_rate:
+                reduced_estimate = self.estimate(method_name, arguments, frame_rate, reduced_frame_rate)
+                if reduced_estimate <= remaining:
+                    self.report.append({'stage': stage, 'method': method_name, 'action': 'reduced', 'frame_rate': reduced_frame_rate, 'estimated_seconds': round(reduced_estimate, 3)})
+                    return 'reduced', arguments, reduced_frame_rate
+
+        self.report.append({'stage': stage, 'method': method_name, 'action': 'cut', 'estimated_seconds': round(estimated, 3)})
+        return 'cut', arguments, None
+
+    def measured(self, method_name: str, arguments: {}, cpu_seconds: float) -> None:
+        """
+        Record the CPU seconds of a stage that ran to completion at full resolution in the cost model
+        """
+        from costmodel import CostModel
+
+        if self.observe:
+            self.costs.observe(CostModel.analysis_key(method_name, arguments), self.duration, None, cpu_seconds)
+
+    def close(self) -> [{}]:
+        """
+        Log the stages that were reduced or cut, save the measured stages to the cost model, and return the stages that were reduced or cut
+        """
+        cut: [{}] = [entry for entry in self.report if 'ran' != entry['action']]
+        for entry in cut:
+            Metrics.increment('slicing_stages_cut_total', action=entry['action'])
+        if cut:
+            limits: str = ' and '.join(limit for limit in (f"{self.seconds} secs" if self.seconds else '', f"{self.cpu_seconds} CPU secs" if self.cpu_seconds else '') if limit)
+            Logger.warning(f"Anytime slicing within {limits}: {', '.join(f'''stage {entry['stage']} [{entry['method']}] {entry['action']}''' for entry in cut)}")
+        Logger.debug(f"Anytime slicing took {time.monotonic() - self.began:.2f} secs ({time.thread_time() - self.cpu_began:.2f} CPU secs)")
+        if self.observe:
+            self.costs.save()
+        return cut
@@ -1,9 +1,7 @@
-from typing import List
-
 from arguments import parse_common_arguments
 from configuration.configuration import Configuration
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class ChaosSlicer(object):
@@ -12,36 +10,56 @@ class ChaosSlicer(object):
     """
     import pydub
 
+    distributions: [str] = ['uniform', 'normal', 'exponential']
+
     def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
         """
-        Creates a list of potential clip begin and end sample indexes using a random number generator
+        Creates a list of potential clip begin and end sample indexes using a seeded random number generator (the same seed gives the same intervals)
+        Note: every interval starts at a uniformly random sample, its length is drawn from the 'distribution' between the minimum clip size and the clip size
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
         """
-        import random
+        import numpy
+        from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
+        seed: int = arguments['seed'] if 'seed' in arguments else Configuration().get('chaos_seed')
+        distribution: str = arguments['distribution'] if 'distribution' in arguments else 'uniform'
+
+        if distribution not in ChaosSlicer.distributions:
+            Logger.warning(f"Invalid length distribution '{distribution}' provided, the available distributions are: {ChaosSlicer.distributions} [Fixup: using 'uniform']")
+            distribution = 'uniform'
 
         total_samples: int = int(segment.frame_count())
-        sample_window: int = segment.frame_rate * min(clip_size, Configuration().get('maximum_clip_size_miliseconds'))
+        samples_per_milisecond: int = segment.frame_rate // 1000
+        sample_window: int = min(total_samples, samples_per_milisecond * min(clip_size, Configuration().get('maximum_clip_size_miliseconds')))
+        minimum_samples: int = min(sample_window, samples_per_milisecond * Configuration().get('minimum_clip_size_miliseconds'))
 
-        Logger.debug(f"Slicing stage[{stage}], Chaos Slicer: {clips} clips", separator=True)
+        Logger.debug(f"Slicing stage[{stage}], Chaos Slicer: {clips} clips (seed {seed}, {distribution} lengths)", separator=True)
 
-        Logger.debug(f"Segment Sample Window: {sample_window}")
+        Logger.debug(f"Segment Sample Window: {minimum_samples} to {sample_window}")
         Logger.debug(f"Segment Samples: {total_samples}")
 
-        for clip_index in range(clips):
-            sample_index_a = random.randint(0, total_samples)
-            sample_window_left_size = min(sample_window, sample_index_a)
-            sample_window_right_size = min(sample_window, total_samples - sample_index_a)
-            sample_index_b = random.randint(sample_index_a - sample_window_left_size, sample_index_a + sample_window_right_size)
-            sci = SampleClippingInterval(begin=segment_offset_index + sample_index_a, end=segment_offset_index + sample_index_b)
-            self.sci.append(sci)
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
+        if 0 >= sample_window or 0 >= clips:
+            return
+
+        generator = numpy.random.default_rng([int(seed), stage])  # a stream per stage, so stages with the same seed are not correlated
+
+        if 'normal' == distribution:
+            lengths: ndarray = generator.normal((minimum_samples + sample_window) / 2, (sample_window - minimum_samples) / 6, clips)
+        elif 'exponential' == distribution:
+            lengths: ndarray = minimum_samples + generator.exponential((sample_window - minimum_samples) / 3, clips)
+        else:
+            lengths: ndarray = generator.uniform(minimum_samples, sample_window, clips)
+        lengths = numpy.clip(lengths, minimum_samples, sample_window).astype(numpy.int64)
+
+        begins: ndarray = (generator.random(clips) * (total_samples - lengths + 1)).astype(numpy.int64)  # bounded: every interval ends within the segment
+
+        self.sci.append(segment_offset_index + begins, segment_offset_index + begins + lengths, weight, stage)
 
     def get(self):
         return self.sci
@@ -7,7 +7,7 @@ class Clip(object):
     """
     import pydub
 
-    def __init__(self, recording: pydub.AudioSegment, sci: SampleClippingInterval):
+    def __init__(self, recording: pydub.AudioSegment, sci: SampleClippingInterval, stages: [int] = None):
         """
         A sample index range within a source audio recording from which a clip can be produced
         Note: when reversed, begin and end will be swapped
@@ -15,12 +15,15 @@ class Clip(object):
         Args:
         :param recording: the source recording from which the clip is being made
         :param sci:       the sample clipping (begin/end index pair) interval from the source recording
+        :param stages:    the slicing stages that voted for the clip boundaries (provenance)
         """
         frame_rate = recording.frame_rate
         begin, end = sci.get()
         self.begin = {'index': begin, 'time': begin / frame_rate}
         self.end = {'index': end, 'time': end / frame_rate}
         self.segment = recording.get_sample_slice(start_sample=begin, end_sample=end)
+        self.stages = stages if stages is not None else []
+        self.fingerprint = None  # the packed fingerprint bytes, set when the clips are de-duplicated
 
     def get(self):
         """
@@ -30,6 +33,7 @@ class Clip(object):
             'samples': self.segment,
             'source': {
                 'begin': self.begin,
-                'end': self.end
+                'end': self.end,
+                'stages': self.stages
             }
         }
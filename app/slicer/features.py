@@ -0,0 +1,253 @@
+"""
+Shared analysis features module
+"""
+import hashlib
+import threading
+from typing import Optional
+
+from cache import AnalysisCache
+from envelope import Envelope
+from logger import Logger
+
+
+class Features(object):
+    """
+    The analysis features of a recording, computed on first use and shared by every slicing stage that declares them
+
+    - 'mono':  the monaural samples scaled between -1.0 and 1.0
+    - 'stft':  the short time Fourier transform magnitudes of the monaural samples
+    - 'onset': the onset strength envelope of the monaural samples
+    - 'stems': the instruments separated by a Spleeter training model
+    - 'envelope': the multi-resolution (min, max, RMS) envelope of the samples (the recording's own when the audio processor measured it)
+
+    The (costly) librosa analyses, e.g., the onset envelope and the beat track, are read from the persistent analysis cache when it holds them
+    """
+    import pydub
+    from numpy import ndarray
+
+    separators: {} = {}  # the loaded Spleeter separators by training model, kept warm for every later recording of the process
+    separators_lock: threading.Lock = threading.Lock()
+
+    stft_window: int = 2048  # the librosa defaults, samples per short time Fourier transform frame
+    stft_hop: int = 512
+
+    names: [str] = ['mono', 'stft', 'onset', 'stems', 'envelope']
+    requires: {} = {'mono': [], 'stft': ['mono'], 'onset': ['mono'], 'stems': [], 'envelope': []}  # the features each feature is computed from
+
+    def __init__(self, recording: pydub.AudioSegment, cache: AnalysisCache = None, envelope: Envelope = None):
+        """
+        Args:
+        :param recording: the recording to be analyzed
+        :param cache:     the persistent analysis cache (analyses are not persisted when not provided)
+        :param envelope:  the already measured envelope of the recording (measured on first use when not provided)
+        """
+        import pydub
+
+        self.recording: pydub.AudioSegment = recording
+        self.cache: Optional[AnalysisCache] = cache
+        self.computed: {} = {} if envelope is None else {'envelope': envelope}
+        self.hash: Optional[str] = None
+
+    @staticmethod
+    def order(names: [str]) -> [str]:
+        """
+        The features, and the features they are computed from, in the order they are to be computed
+        Args:
+        :param names: the names of the requested features
+        """
+        ordered: [str] = []
+
+        def visit(name: str) -> None:
+            if name in ordered:
+                return
+            if name not in Features.requires:
+                Logger.warning(f"Unknown analysis feature '{name}', the available features are: {Features.names}")
+                return
+            for required in Features.requires[name]:
+                visit(required)
+            ordered.append(name)
+
+        for name in names:
+            visit(name)
+        return ordered
+
+    def compute(self, names: [str]) -> None:
+        """
+        Compute features ahead of the stages that use them
+        Args:
+        :param names: the names of the features to be computed
+        """
+        for name in Features.order(names):
+            if 'stems' != name:  # the stems depend upon the training model a stage requests
+                getattr(self, name)()
+
+    def of(self, segment: pydub.AudioSegment, offset: int):
+        """
+        The features of a segment of the recording: these shared features when the segment spans the whole recording, otherwise the segment's own
+        Note: a whole recording segment can be a few samples longer than the recording, its last (partial) milisecond is padded with silence
+        Args:
+        :param segment: the segment of the recording a slicer analyzes
+        :param offset:  the index of the first sample of the segment in the recording
+        """
+        return self if 0 == offset and len(segment) == len(self.recording) else Features(segment, self.cache)
+
+    def memoize(self, key, compute):
+        if key not in self.computed:
+            Logger.debug(f"Computing the '{key if isinstance(key, str) else key[0]}' analysis feature")
+            self.computed[key] = compute()
+        return self.computed[key]
+
+    def audio_hash(self) -> str:
+        """
+        The hash of the decoded samples and their format
+        """
+        if self.hash is None:
+            digest = hashlib.md5(f"{self.recording.frame_rate} {self.recording.channels} {self.recording.sample_width} ".encode('utf-8'))
+            digest.update(self.recording.raw_data)
+            self.hash = digest.hexdigest()
+        return self.hash
+
+    def persisted(self, feature: str, parameters: {}, compute):
+        """
+        An analysis result read from the persistent analysis cache, computed (and stored) when it is not cached
+        """
+        if self.cache is None:
+            return compute()
+        return self.cache.fetch(self.audio_hash(), self.recording.frame_rate, feature, parameters, compute)
+
+    def mono(self) -> ndarray:
+        from normalizer import Normalizer
+
+        return self.memoize('mono', lambda: Normalizer.monaural_normalization(self.recording))
+
+    def stft(self) -> ndarray:
+        import librosa
+        import numpy
+
+        return self.memoize('stft', lambda: numpy.abs(librosa.stft(self.mono(), n_fft=Features.stft_window, hop_length=Features.stft_hop)))
+
+    def chroma(self) -> ndarray:
+        """
+        The (12, frames) energy of each pitch class in each short time Fourier transform frame
+        """
+        import librosa
+        import numpy
+        from numpy import ndarray
+
+        def compute() -> ndarray:
+            bins = librosa.filters.chroma(sr=self.recording.frame_rate, n_fft=Features.stft_window).astype(numpy.float32)
+            return bins @ numpy.square(self.stft(), dtype=numpy.float32)
+
+        return self.memoize('chroma', compute)
+
+    def vocal_activity(self, low_frequency: float, high_frequency: float, minimum_pitch: float, maximum_pitch: float, harmonics: int = 8) -> ndarray:
+        """
+        A vocal activity score (0.0 to 1.0) for every short time Fourier transform frame, from the frame's magnitudes in one vectorized pass
+
+        - band:        the share of the frame energy in the vocal formant band
+        - tonality:    one less the spectral flatness of the formant band (noise is flat, voiced sounds are peaked)
+        - harmonicity: how far the energy at the harmonics of the strongest fundamental in the vocal pitch range exceeds the energy between them
+        Frames more than 50 dB below the loudest frame score 0.0
+        Args:
+        :param low_frequency:     the lowest frequency of the vocal formant band (hz)
+        :param high_frequency:    the highest frequency of the vocal formant band (hz)
+        :param minimum_pitch:     the lowest fundamental frequency of a voice (hz)
+        :param maximum_pitch:     the highest fundamental frequency of a voice (hz)
+        :param harmonics:         the number of harmonics of a fundamental that are summed
+        """
+        import numpy
+        from numpy import ndarray
+
+        def score() -> ndarray:
+            magnitudes: ndarray = self.stft()
+            power: ndarray = numpy.square(magnitudes, dtype=numpy.float32)
+            bins: int = magnitudes.shape[0]
+            hertz_per_bin: float = self.recording.frame_rate / Features.stft_window
+            low: int = max(1, int(low_frequency / hertz_per_bin))
+            high: int = min(bins, int(high_frequency / hertz_per_bin) + 1)
+            tiny: float = numpy.finfo(numpy.float32).tiny
+
+            total: ndarray = power.sum(axis=0) + tiny
+            in_band: ndarray = power[low:high]
+            band: ndarray = in_band.sum(axis=0) / total
+            flatness: ndarray = numpy.exp(numpy.log(in_band + tiny).mean(axis=0)) / (in_band.mean(axis=0) + tiny)
+
+            # subharmonic summation over fundamentals half a bin apart, the harmonic energy is compared with the mean energy up to the last harmonic
+            fundamentals: ndarray = numpy.arange(max(1.0, minimum_pitch / hertz_per_bin), maximum_pitch / hertz_per_bin, 0.5)
+            fundamentals = fundamentals[fundamentals * harmonics < bins - 1]
+            indexes: ndarray = numpy.rint(fundamentals[:, numpy.newaxis] * numpy.arange(1, harmonics + 1)).astype(numpy.int64)  # (fundamentals, harmonics)
+            ratio: ndarray = numpy.ones(power.shape[1], dtype=numpy.float32)
+            for begin in range(0, power.shape[1] if len(fundamentals) else 0, 4096):  # (fundamentals, harmonics, frames) blocks of a few megabytes
+                block: ndarray = power[:, begin:begin + 4096]
+                spread: ndarray = numpy.cumsum(block, axis=0)[indexes[:, -1]] / (indexes[:, -1] + 1)[:, numpy.newaxis] + tiny
+                ratio[begin:begin + 4096] = (block[indexes].mean(axis=1) / spread).max(axis=0)
+            harmonicity: ndarray = 1.0 - 1.0 / numpy.maximum(1.0, ratio)
+
+            audible: ndarray = total > total.max(initial=0.0) * 1e-5
+            return numpy.where(audible, (band + (1.0 - flatness) + harmonicity) / 3, 0.0)
+
+        return self.memoize(('vocal activity', low_frequency, high_frequency, minimum_pitch, maximum_pitch, harmonics), score)
+
+    def onset(self) -> ndarray:
+        import librosa
+
+        return self.memoize('onset', lambda: self.persisted('onset_strength', {}, lambda: librosa.onset.onset_strength(y=self.mono(), sr=self.recording.frame_rate)))
+
+    def beats(self) -> (ndarray, ndarray):
+        """
+        The estimated tempo and the frame indexes of the beats
+        """
+        import librosa
+
+        return self.memoize('beats', lambda: self.persisted('beat_track', {}, lambda: librosa.beat.beat_track(y=self.mono(), sr=self.recording.frame_rate)))
+
+    def tempo(self) -> ndarray:
+        """
+        The tempo estimated for every onset envelope frame
+        """
+        import librosa
+
+        return self.memoize('tempo', lambda: self.persisted('tempo', {'aggregate': None}, lambda: librosa.beat.tempo(onset_envelope=self.onset(), sr=self.recording.frame_rate, aggregate=None)))
+
+    def pitch(self, minimum_frequency: float, maximum_frequency: float, frame_length: int) -> ndarray:
+        """
+        The fundamental frequency (yin) of every frame
+        """
+        import librosa
+
+        parameters: {} = {'fmin': minimum_frequency, 'fmax': maximum_frequency, 'frame_length': frame_length}
+        return self.memoize(('pitch', minimum_frequency, maximum_frequency, frame_length), lambda: self.persisted('yin', parameters, lambda: librosa.yin(y=self.mono(), sr=self.recording.frame_rate, **parameters)))
+
+    def envelope(self) -> Envelope:
+        return self.memoize('envelope', lambda: Envelope.build(self.recording))
+
+    @staticmethod
+    def separator(model: str):
+        """
+        The separator of a Spleeter training model (and the lock that serializes its use), loaded on first use and then shared
+        Args:
+        :param model: the Spleeter training model e.g., 'spleeter:2stems'
+        """
+        with Features.separators_lock:
+            if model not in Features.separators:
+                from spleeter.separator import Separator
+
+                Logger.debug(f"Loading the Spleeter separator '{model}'")
+                Features.separators[model] = (Separator(model, multiprocess=False), threading.Lock())
+            return Features.separators[model]
+
+    def stems(self, model: str) -> {}:
+        """
+        The instrument waveforms separated from the recording, keyed by instrument name (e.g., 'vocals')
+        Args:
+        :param model: the Spleeter training model e.g., 'spleeter:2stems'
+        """
+        import numpy
+
+        def separate() -> {}:
+            samples = numpy.reshape(self.recording.get_array_of_samples(), (-1, self.recording.channels))
+            separator, lock = Features.separator(model)
+            with lock:  # a separator's model graph is not safe to run from two threads at once
+                return separator.separate(samples)
+
+        return self.memoize(('stems', model), separate)
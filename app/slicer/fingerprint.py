@@ -0,0 +1,107 @@
+"""
+Clip fingerprint module
+"""
+from configuration.configuration import Configuration
+from features import Features
+
+
+class Fingerprint(object):
+    """
+    Compact fingerprints of clips from binarized chroma, so that near-identical clips (overlapping candidates, repeated choruses, the same song
+    uploaded twice) can be found by the Hamming distance of their fingerprints
+
+    - a clip's chroma is averaged over a fixed number of time blocks, so clips of the same audio have the same fingerprint wherever they begin
+    - each bit records whether a pitch class is above the mean of its block, so the fingerprint ignores the loudness of the clip
+    - the fingerprints of a recording's clips are computed in one batch from the chroma of the shared short time Fourier transform
+    - a fingerprint is split into bands (locality sensitive hashes), near-duplicates very likely share at least one band exactly
+    """
+    from numpy import ndarray
+
+    blocks: int = 16  # time blocks per fingerprint, of 12 pitch class bits each (192 bits, 24 bytes)
+    band_bits: int = 12  # bits per locality sensitive hash band (16 bands)
+    bytes_per_batch: int = 1 << 24  # bytes of pairwise differences compared at once by distinct()
+
+    @staticmethod
+    def of(chroma: ndarray, intervals: [(int, int)], hop: int = None) -> ndarray:
+        """
+        The (clips, 24) packed fingerprints of the clips of a recording
+        Args:
+        :param chroma:    the (12, frames) chroma of the recording
+        :param intervals: the (begin, end) sample indexes of the clips
+        :param hop:       the samples per chroma frame (defaults to the short time Fourier transform hop)
+        """
+        import numpy
+
+        hop = hop if hop is not None else Features.stft_hop
+        if 0 == len(intervals):
+            return numpy.zeros((0, Fingerprint.blocks * 12 // 8), dtype=numpy.uint8)
+
+        frames: int = chroma.shape[1]
+        bounds = numpy.asarray(intervals, dtype=numpy.int64) // hop
+        begins = numpy.clip(bounds[:, 0], 0, frames - 1)
+        ends = numpy.clip(numpy.maximum(bounds[:, 1], begins + 1), 1, frames)
+
+        # The mean chroma of each block of each clip, from prefix sums over the frames (every block holds at least one frame)
+
+        prefix = numpy.concatenate((numpy.zeros((12, 1), dtype=numpy.float64), numpy.cumsum(chroma, axis=1, dtype=numpy.float64)), axis=1)
+        edges = begins[:, numpy.newaxis] + (ends - begins)[:, numpy.newaxis] * numpy.arange(Fingerprint.blocks + 1) // Fingerprint.blocks
+        lows = numpy.minimum(edges[:, :-1], frames - 1)
+        highs = numpy.maximum(edges[:, 1:], lows + 1)
+        means = (prefix[:, highs] - prefix[:, lows]) / (highs - lows)  # (12, clips, blocks)
+
+        bits = means > means.mean(axis=0, keepdims=True)
+        return numpy.packbits(bits.transpose(1, 2, 0).reshape(len(intervals), -1), axis=1)
+
+    @staticmethod
+    def distances(fingerprints: ndarray, others: ndarray) -> ndarray:
+        """
+        The (fingerprints, others) Hamming distances, as the share of the bits that differ
+        Note: the bits that differ are counted a byte at a time (a table lookup of each byte's set bits), the bits are not unpacked
+        """
+        import numpy
+
+        set_bits = numpy.unpackbits(numpy.arange(256, dtype=numpy.uint8)[:, numpy.newaxis], axis=1).sum(axis=1, dtype=numpy.uint16)
+        differing = set_bits[numpy.bitwise_xor(fingerprints[:, numpy.newaxis, :], others[numpy.newaxis, :, :])].sum(axis=2)
+        return differing / max(1, 8 * fingerprints.shape[1])
+
+    @staticmethod
+    def distinct(fingerprints: ndarray, maximum_distance: float = None) -> ndarray:
+        """
+        The mask of the fingerprints to keep: a fingerprint within the maximum distance of an earlier kept fingerprint is a near-duplicate
+        Note: the fingerprints are in rank order (best first), so the best of a group of near-duplicates is kept
+        Note: the fingerprints are compared with the earlier ones a batch of rows at a time, the memory used does not grow with the square of their number
+        Args:
+        :param fingerprints:     the packed fingerprints
+        :param maximum_distance: the largest share of differing bits of near-duplicates (defaults to the configured fingerprint distance)
+        """
+        import numpy
+
+        maximum_distance = maximum_distance if maximum_distance is not None else Configuration().get('fingerprint_distance')
+        count: int = len(fingerprints)
+        keep = numpy.ones(count, dtype=bool)
+        rows: int = max(1, Fingerprint.bytes_per_batch // max(1, count * fingerprints.shape[1]))
+        for first in range(1, count, rows):
+            last: int = min(first + rows, count)
+            near = Fingerprint.distances(fingerprints[first:last], fingerprints[:last]) <= maximum_distance
+            for index in range(first, last):
+                keep[index] = not near[index - first, :index][keep[:index]].any()
+        return keep
+
+    @staticmethod
+    def bands(fingerprint: bytes) -> [(int, int)]:
+        """
+        The (band, hash) locality sensitive hashes of a fingerprint, the values of its successive runs of band bits
+        """
+        value: int = int.from_bytes(fingerprint, 'big')
+        count: int = 8 * len(fingerprint) // Fingerprint.band_bits
+        mask: int = (1 << Fingerprint.band_bits) - 1
+        return [(band, (value >> (band * Fingerprint.band_bits)) & mask) for band in range(count)]
+
+    @staticmethod
+    def missing() -> [str]:
+        """
+        The dependencies of the fingerprints that are not installed (found without importing them)
+        """
+        import importlib.util
+
+        return [dependency for dependency in ['librosa'] if importlib.util.find_spec(dependency) is None]
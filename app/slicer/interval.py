@@ -1,9 +1,7 @@
-from typing import List
-
 from arguments import parse_common_arguments
 from configuration.configuration import Configuration
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class SimpleIntervalSlicer(object):
@@ -22,7 +20,10 @@ class SimpleIntervalSlicer(object):
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
         """
-        self.sci: List[SampleClippingInterval] = []
+        import numpy
+        from numpy import ndarray
+
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
@@ -52,17 +53,17 @@ class SimpleIntervalSlicer(object):
         Logger.debug(f"Clips + Skips Samples: {clips * samples_per_clip + skips * samples_per_skip}")
         Logger.debug(f"Segment Samples: {total_samples}")
 
-        begin_index = segment_offset_index
-
-        for clip_index in range(clips):
-            end_index = begin_index + samples_per_clip
-            if total_samples < end_index:
-                Logger.warning(f"The sample index {end_index} tried to pass the end of the recording at {total_samples} samples")
-                break
-            sci = SampleClippingInterval(begin=begin_index, end=end_index)
-            self.sci += weight * [sci]
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
-            begin_index += samples_per_iteration
+        begin_indexes: ndarray = (segment_offset_index + numpy.arange(clips) * samples_per_iteration).astype(numpy.int64)
+        end_indexes: ndarray = begin_indexes + samples_per_clip
+        within: ndarray = numpy.logical_and.accumulate(end_indexes <= total_samples)  # stop at the first interval that passes the end of the recording
+
+        if not within.all():
+            Logger.warning(f"The sample index {end_indexes[~within][0]} tried to pass the end of the recording at {total_samples} samples")
+
+        self.sci.append(begin_indexes[within], end_indexes[within], weight, stage)  # the weight is stored with the intervals as their vote value
+
+        for clip_index, (begin_index, end_index) in enumerate(zip(begin_indexes[within], end_indexes[within])):
+            Logger.debug(f"Interval[{clip_index}]: {begin_index} {end_index}")
 
     def get(self):
         return self.sci
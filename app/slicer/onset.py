@@ -1,8 +1,7 @@
-from typing import List
-
 from arguments import parse_common_arguments
+from features import Features
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class OnsetSlicer(object):
@@ -12,18 +11,19 @@ class OnsetSlicer(object):
     """
     import pydub
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None) -> None:
         """
         Creates a list of potential clip begin and end sample indexes using (major sound change) onset detection
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording
         """
         import librosa
         from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
@@ -36,13 +36,12 @@ class OnsetSlicer(object):
         # https://librosa.org/doc/main/generated/librosa.to_mono.html
         # https://librosa.org/doc/main/generated/librosa.onset.onset_detect.html
 
-        onsets: ndarray = librosa.onset.onset_detect(y=librosa.to_mono(y=recording.get_array_of_samples()), sr=recording.frame_rate)
+        onsets: ndarray = librosa.onset.onset_detect(onset_envelope=(features if features is not None else Features(recording)).onset(), sr=recording.frame_rate)
 
         clips = 0  # TODO turn the onset array into sample clipping intervals
         for clip_index in range(clips):
-            sci = SampleClippingInterval(begin=0, end=0)
-            self.sci.append(sci)
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
+            self.sci.append(begin=0, end=0, weight=weight, stage=stage)
+            Logger.debug(f"Interval[{clip_index}]: {0} {0}")
 
     def get(self):
         return self.sci
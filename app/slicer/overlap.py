@@ -0,0 +1,85 @@
+"""
+Interval overlap index module
+"""
+from logger import Logger
+from sci import SampleClippingIntervals
+
+
+class OverlapIndex(object):
+    """
+    The sample clipping intervals of every stage, grouped by stage and sorted by begin index, for batch agreement queries
+
+    - the intervals of a stage that can overlap a query interval by the share it needs are a contiguous run of the stage's sorted begins,
+      found by two binary searches, so a query compares only those intervals and no pairwise comparison of all intervals is needed
+    - a batch of query intervals is answered a stage at a time, with one vectorized binary search per stage for the whole batch
+    """
+    from numpy import ndarray
+
+    pairs_per_batch: int = 1 << 22  # interval pairs compared at once by a batch agreement query
+
+    def __init__(self, sci: SampleClippingIntervals):
+        """
+        Args:
+        :param sci: the sample clipping intervals of all stages (intervals with a negative stage are not indexed)
+        """
+        import numpy
+
+        indexed = sci.select(0 <= sci.stage)
+        order = numpy.lexsort((indexed.begin, indexed.stage))
+
+        self.begins: ndarray = indexed.begin[order]
+        self.ends: ndarray = indexed.end[order]
+        self.weights: ndarray = indexed.weight[order]
+        self.stages: ndarray = indexed.stage[order]
+        stage_numbers, firsts = numpy.unique(self.stages, return_index=True)
+        self.bounds: [(int, int)] = list(zip(firsts.tolist(), firsts[1:].tolist() + [len(self.stages)]))  # the (first, last) array indexes of each stage
+        self.stage_count: int = len(stage_numbers)
+
+        Logger.debug(f"Overlap index: {len(self.begins)} intervals from {self.stage_count} stages")
+
+    def __len__(self) -> int:
+        return len(self.begins)
+
+    def agreements(self, begins: ndarray, ends: ndarray, ratio: float = 0.5) -> (ndarray, ndarray):
+        """
+        The agreeing stage counts and total weights of a batch of sample intervals, computed a stage at a time without a per interval query
+        Note: an interval of a stage can only agree with a sample interval if it begins after the sample interval's begin less the stage's longest
+              interval, and before the sample interval's end less the overlap it needs, so each sample interval is only compared with the stage's
+              intervals between those two begins (found by a binary search of the sorted begins)
+        Args:
+        :param begins: the indexes of the first samples of the intervals
+        :param ends:   the indexes of the last samples of the intervals
+        :param ratio:  the least share of an interval (0.0 to 1.0) that an interval must overlap to agree with it
+        """
+        import numpy
+
+        begins = numpy.asarray(begins, dtype=numpy.int64)
+        ends = numpy.asarray(ends, dtype=numpy.int64)
+        stages = numpy.zeros(len(begins), dtype=numpy.int64)
+        weights = numpy.zeros(len(begins), dtype=numpy.float64)
+        if 0 == len(self.begins) or 0 == len(begins):
+            return stages, weights
+
+        required = ratio * (ends - begins)
+        for first_member, last_member in self.bounds:
+            stage_begins, stage_ends, stage_weights = self.begins[first_member:last_member], self.ends[first_member:last_member], self.weights[first_member:last_member]
+            longest: int = int((stage_ends - stage_begins).max())
+            low = numpy.searchsorted(stage_begins, begins - longest, side='left')
+            counts = numpy.maximum(0, numpy.searchsorted(stage_begins, ends - required, side='right') - low)
+
+            # The (sample interval, stage interval) pairs are compared in batches of a bounded size
+
+            totals = numpy.cumsum(counts)
+            splits = numpy.searchsorted(totals, numpy.arange(OverlapIndex.pairs_per_batch, int(totals[-1]), OverlapIndex.pairs_per_batch), side='right')
+            for first, last in zip([0] + splits.tolist(), splits.tolist() + [len(begins)]):
+                batch = counts[first:last]
+                total: int = int(batch.sum())
+                if 0 == total:
+                    continue
+                positions = numpy.repeat(numpy.arange(first, last), batch)
+                indexes = numpy.arange(total) - numpy.repeat(numpy.cumsum(batch) - batch, batch) + numpy.repeat(low[first:last], batch)
+                overlaps = numpy.minimum(stage_ends[indexes], ends[positions]) - numpy.maximum(stage_begins[indexes], begins[positions])
+                agreeing = (0 < overlaps) & (overlaps >= required[positions])
+                stages[first:last] += 0 < numpy.bincount(positions[agreeing] - first, minlength=last - first)
+                weights[first:last] += numpy.bincount(positions[agreeing] - first, weights=stage_weights[indexes[agreeing]], minlength=last - first)
+        return stages, weights
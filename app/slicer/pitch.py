@@ -1,8 +1,7 @@
-from typing import List
-
 from arguments import parse_common_arguments, to_hertz
+from features import Features
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class PitchSlicer(object):
@@ -12,18 +11,18 @@ class PitchSlicer(object):
     """
     import pydub
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None) -> None:
         """
         Creates a list of potential clip begin and end sample indexes using tempo (beats per minute) change detection
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording
         """
-        import librosa
         from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
@@ -40,7 +39,7 @@ class PitchSlicer(object):
         # https://librosa.org/doc/main/generated/librosa.to_mono.html
         # https://librosa.org/doc/main/generated/librosa.yin.html
 
-        changes: ndarray = librosa.yin(y=librosa.to_mono(y=recording.get_array_of_samples()), fmin=min_frequency, fmax=max_frequency, sr=recording.frame_rate, frame_length=frame_length)
+        changes: ndarray = (features if features is not None else Features(recording)).pitch(min_frequency, max_frequency, frame_length)
 
         clips = 0  # TODO turn the pitch change points array into sample clipping intervals
         for clip_index in range(clips):
@@ -52,9 +51,8 @@ class PitchSlicer(object):
             #         pos = index + 1
             # return 4 / 173 if -1 == pos else pos * (4 / 173)
 
-            sci = SampleClippingInterval(begin=0, end=0)
-            self.sci.append(sci)
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
+            self.sci.append(begin=0, end=0, weight=weight, stage=stage)
+            Logger.debug(f"Interval[{clip_index}]: {0} {0}")
 
     def get(self):
         return self.sci
@@ -0,0 +1,166 @@
+"""
+Slicer plugin registry module
+"""
+import importlib
+import importlib.util
+
+from logger import Logger
+
+
+class SlicerPlugin(object):
+    """
+    The declaration of a slicer: the module that implements it is only imported when a slicing logic uses it
+
+    The implementing class is constructed as cls(stage, arguments, recording) or, when the slicer declares features,
+    cls(stage, arguments, recording, features=features), and its get() returns the sample clipping intervals it produced
+    """
+
+    def __init__(self, name: str, target: str, weight: int = 1, features: [str] = None, dependencies: [str] = None, description: str = '', modes: {} = None, reduced: {} = None):
+        """
+        Args:
+        :param name:         the method name used in the slicing logic e.g., 'slice_on_beat'
+        :param target:       the implementing class as 'module:Class' e.g., 'beat:BeatSlicer'
+        :param weight:       the default weight of the slicer's sample clipping intervals
+        :param features:     the shared analysis features the slicer uses ('mono', 'stft', 'onset', 'stems')
+        :param dependencies: the (heavy) modules the slicer imports e.g., 'librosa'
+        :param description:  a one line description of the slicer
+        :param modes:        the (features, dependencies) of the slicer's alternative modes, by the name given as its 'mode' argument
+        :param reduced:      the arguments that select the slicer's cheaper, reduced resolution mode for an anytime slicing short of time e.g., {'mode': 'fast'}
+        """
+        self.name: str = name
+        self.target: str = target
+        self.weight: int = weight
+        self.features: [str] = features if features is not None else []
+        self.dependencies: [str] = dependencies if dependencies is not None else []
+        self.description: str = description
+        self.modes: {} = modes if modes is not None else {}
+        self.reduced: {} = reduced if reduced is not None else {}
+        self.implementation = None
+
+    def mode(self, arguments: {} = None) -> ([str], [str]):
+        """
+        The (features, dependencies) of the slicer in the mode its arguments select
+        """
+        mode = arguments.get('mode') if isinstance(arguments, dict) else None
+        return self.modes[mode] if mode in self.modes else (self.features, self.dependencies)
+
+    def missing(self, arguments: {} = None) -> [str]:
+        """
+        The dependencies that are not installed (found without importing them)
+        Args:
+        :param arguments: the slicer arguments, their 'mode' may select a mode with other dependencies
+        """
+        return [dependency for dependency in self.mode(arguments)[1] if importlib.util.find_spec(dependency) is None]
+
+    def load(self):
+        """
+        Import the module of the slicer and return its implementing class
+        """
+        if self.implementation is None:
+            module_name, class_name = self.target.split(':')
+            self.implementation = getattr(importlib.import_module(module_name), class_name)
+        return self.implementation
+
+    def run(self, stage: int, arguments: {}, recording, features=None):
+        """
+        Slice a recording
+        Args:
+        :param stage:     the index of the slicing stage
+        :param arguments: the common and slicer specific operational parameters
+        :param recording: the recording to be sliced
+        :param features:  the shared analysis features of the recording
+        """
+        implementation = self.load()
+        if self.features and features is not None:
+            return implementation(stage, arguments, recording, features=features).get()
+        return implementation(stage, arguments, recording).get()
+
+
+class Registry(object):
+    """
+    The available slicers: the built in slicers and those declared by installed packages through the 'bytter.slicers' entry point group
+
+    An entry point names a SlicerPlugin (or a callable returning one or a list of them), e.g., in a package's pyproject.toml:
+        [project.entry-points."bytter.slicers"]
+        slice_on_drums = "drums_plugin:plugin"
+    where drums_plugin only declares SlicerPlugin('slice_on_drums', 'drums_plugin.slicer:DrumSlicer', ...), so that the slicer itself is imported on use
+    """
+    entry_point_group: str = 'bytter.slicers'
+
+    builtins: [SlicerPlugin] = [
+        SlicerPlugin('slice_on_beat', 'beat:BeatSlicer', 5, ['mono'], ['librosa'], 'Groups detected beats into clips of multiples of a beat count'),
+        SlicerPlugin('slice_at_interval', 'interval:SimpleIntervalSlicer', 1, [], [], 'Equally spaced clips'),
+        SlicerPlugin('slice_at_random', 'chaos:ChaosSlicer', 1, [], [], 'Randomly placed clips, adds noise to the clip weightings for statistical balancing'),
+        SlicerPlugin('slice_on_vocal_change', 'vocal:VocalSlicer', 1, ['stems', 'mono'], ['spleeter', 'librosa'], 'Volume change detection on the separated vocals', {'fast': (['stft'], ['librosa'])}, {'mode': 'fast'}),
+        SlicerPlugin('slice_on_volume_change', 'volume:VolumeSlicer', 5, ['envelope'], [], 'Volume fluctuations in detection window sized chunks'),
+        SlicerPlugin('slice_at_onset', 'onset:OnsetSlicer', 4, ['onset'], ['librosa'], 'Onset detection'),
+        SlicerPlugin('slice_on_tempo_change', 'tempo:TempoSlicer', 3, ['onset'], ['librosa'], 'Tempo change detection'),
+        SlicerPlugin('slice_on_pitch_change', 'pitch:PitchSlicer', 2, ['mono'], ['librosa'], 'Pitch change detection')
+    ]
+
+    plugins: {str: SlicerPlugin} = {plugin.name: plugin for plugin in builtins}
+    discovered: bool = False
+
+    @staticmethod
+    def register(plugin: SlicerPlugin) -> None:
+        if plugin.name in Registry.plugins:
+            Logger.debug(f"Slicer '{plugin.name}' ({Registry.plugins[plugin.name].target}) replaced by {plugin.target}")
+        Registry.plugins[plugin.name] = plugin
+
+    @staticmethod
+    def discover() -> None:
+        """
+        Register the slicers declared through entry points (once, entry point targets are only the light weight declarations)
+        """
+        from importlib.metadata import entry_points
+
+        if Registry.discovered:
+            return
+        Registry.discovered = True
+
+        try:
+            points = entry_points(group=Registry.entry_point_group)
+        except TypeError:  # Python < 3.10
+            points = entry_points().get(Registry.entry_point_group, [])
+
+        for point in points:
+            try:
+                declared = point.load()
+                declared = declared() if callable(declared) else declared
+            except Exception as error:
+                Logger.warning(f"Unable to load the slicer plugin entry point '{point.name}' [{error}]")
+                continue
+            for plugin in declared if isinstance(declared, (list, tuple)) else [declared]:
+                Registry.register(plugin)
+
+    @staticmethod
+    def get(name: str) -> SlicerPlugin:
+        """
+        The slicer with a method name, or None when no such slicer is available
+        """
+        Registry.discover()
+        return Registry.plugins.get(name)
+
+    @staticmethod
+    def names() -> [str]:
+        Registry.discover()
+        return sorted(Registry.plugins)
+
+    @staticmethod
+    def plan(logic: [{}]) -> [str]:
+        """
+        The shared analysis features needed by the active stages of a slicing logic, in the order they are to be computed
+        Note: a chained stage (a slicer with an 'input') analyzes windows of the recording, it does not use the shared features
+        Args:
+        :param logic: the slicers to use to slice the recording and the slicer arguments
+        """
+        from features import Features
+
+        needed: [str] = []
+        for slicer in logic:
+            if ("active" in slicer and not slicer["active"]) or ("weight" in slicer and 0 == int(slicer["weight"])) or "input" in slicer:
+                continue
+            plugin: SlicerPlugin = Registry.get(slicer.get("method"))
+            if plugin is not None:
+                needed += [feature for feature in plugin.mode(slicer.get("arguments"))[0] if feature not in needed]
+        return Features.order(needed)
@@ -6,7 +6,7 @@ class SampleClippingInterval(object):
     Value object for a sample clipping interval
     """
 
-    def __init__(self, begin=None, end=None):
+    def __init__(self, begin=None, end=None, stage=None):
         """
         A sample index range within a source audio recording from which a clip can be produced
         Note: when reversed, begin and end will be swapped
@@ -14,6 +14,7 @@ class SampleClippingInterval(object):
         Args:
         :param begin: the index of the first sample in the interval
         :param end:   the index of the last sample in the interval
+        :param stage: the index of the slicing stage that produced the interval (its provenance)
         """
         maximum_samples = Configuration().get('maximum_samples')
 
@@ -30,9 +31,129 @@ class SampleClippingInterval(object):
 
         self.begin = int(begin)
         self.end = int(end)
+        self.stage = stage
 
     def get(self):
         """
         :return: the sample interval
         """
         return self.begin, self.end
+
+
+class SampleClippingIntervals(object):
+    """
+    Columnar collection of sample clipping intervals backed by NumPy arrays of begin, end, weight, and stage
+
+    A stage's weight is stored as a numeric value with each interval rather than by repeating the interval weight times
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+        :param capacity: the number of intervals to allocate space for (the columns grow as needed)
+        """
+        import numpy
+
+        self.size: int = 0
+        self._begin = numpy.zeros(capacity, dtype=numpy.int64)
+        self._end = numpy.zeros(capacity, dtype=numpy.int64)
+        self._weight = numpy.zeros(capacity, dtype=numpy.float64)
+        self._stage = numpy.zeros(capacity, dtype=numpy.int32)
+
+    def reserve(self, capacity: int) -> None:
+        """
+        Grow the columns (by doubling) to hold at least capacity intervals
+        """
+        import numpy
+
+        if capacity <= len(self._begin):
+            return
+        capacity = max(capacity, 2 * len(self._begin))
+        for name in ('_begin', '_end', '_weight', '_stage'):
+            column = getattr(self, name)
+            grown = numpy.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def append(self, begin, end, weight=1, stage=-1):
+        """
+        Append one or many intervals
+        Note: when reversed, begin and end will be swapped
+        Note: intervals will be limited to between 0 and MAXIMUM_SAMPLES
+        Args:
+        :param begin:  the index (or an array of indexes) of the first sample in the interval(s)
+        :param end:    the index (or an array of indexes) of the last sample in the interval(s)
+        :param weight: the vote weight of the interval(s)
+        :param stage:  the index of the slicing stage that produced the interval(s) (-1 when unknown)
+        """
+        import numpy
+
+        begin = numpy.atleast_1d(numpy.asarray(begin, dtype=numpy.int64))
+        end = numpy.atleast_1d(numpy.asarray(end, dtype=numpy.int64))
+        count: int = len(begin)
+        if 0 == count:
+            return self
+
+        maximum_samples: int = Configuration().get('maximum_samples')
+        low = numpy.clip(numpy.minimum(begin, end), 0, maximum_samples)
+        high = numpy.clip(numpy.maximum(begin, end), 0, maximum_samples)
+
+        self.reserve(self.size + count)
+        self._begin[self.size:self.size + count] = low
+        self._end[self.size:self.size + count] = high
+        self._weight[self.size:self.size + count] = weight
+        self._stage[self.size:self.size + count] = stage
+        self.size += count
+        return self
+
+    def extend(self, other):
+        """
+        Append the intervals of another collection (or a list of SampleClippingInterval objects)
+        """
+        if isinstance(other, SampleClippingIntervals):
+            return self.append(other.begin, other.end, other.weight, other.stage)
+        for sci in other:
+            self.append(sci.begin, sci.end, 1, -1 if sci.stage is None else sci.stage)
+        return self
+
+    def __iadd__(self, other):
+        return self.extend(other)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> SampleClippingInterval:
+        if not -self.size <= index < self.size:
+            raise IndexError(f"Sample clipping interval index {index} out of range")
+        index %= self.size
+        return SampleClippingInterval(begin=self._begin[index], end=self._end[index], stage=int(self._stage[index]))
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+    @property
+    def begin(self):
+        return self._begin[:self.size]
+
+    @property
+    def end(self):
+        return self._end[:self.size]
+
+    @property
+    def weight(self):
+        return self._weight[:self.size]
+
+    @property
+    def stage(self):
+        return self._stage[:self.size]
+
+    def total_weight(self) -> float:
+        return float(self.weight.sum())
+
+    def select(self, mask):
+        """
+        A new collection of the intervals selected by a boolean mask (or an index array)
+        """
+        selected = SampleClippingIntervals(capacity=max(1, len(self.begin[mask])))
+        return selected.append(self.begin[mask], self.end[mask], self.weight[mask], self.stage[mask])
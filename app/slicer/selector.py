@@ -0,0 +1,147 @@
+"""
+Clip selection module
+"""
+import heapq
+
+from configuration.configuration import Configuration
+from envelope import Envelope
+from logger import Logger
+from overlap import OverlapIndex
+
+
+class Selector(object):
+    """
+    Ranks candidate clips (a voted begin boundary paired with a voted end boundary) and returns the best of them page by page
+
+    - the valid end boundaries of each begin boundary are found by binary search (searchsorted) under the maximum clip size
+    - each candidate is scored by the votes of its boundaries, the stages whose intervals agree with (overlap) it, and cheap energy features of the recording
+    - the best candidates are selected through a heap, and ranked candidates are kept so later pages do not recompute anything
+    """
+    import pydub
+    from numpy import ndarray
+
+    def __init__(self, recording: pydub.AudioSegment, begin_edges: ndarray, begin_votes: ndarray, end_edges: ndarray, end_votes: ndarray, maximum_clip_samples: int = None, block_miliseconds: int = None, index: OverlapIndex = None, envelope: Envelope = None):
+        """
+        Args:
+        :param recording:            the recording the boundaries were voted on
+        :param begin_edges:          the sample indexes of the voted begin boundaries
+        :param begin_votes:          the votes received by each begin boundary
+        :param end_edges:            the sample indexes of the voted end boundaries
+        :param end_votes:            the votes received by each end boundary
+        :param maximum_clip_samples: the maximum clip length in samples (defaults to the configured maximum clip size)
+        :param block_miliseconds:    the size of the blocks over which the energy envelope is measured (defaults to the detection window)
+        :param index:                the overlap index of the stage intervals, used to score the agreement of the stages with each candidate
+        :param envelope:             the envelope of the recording (measured when not provided)
+        """
+        import pydub
+
+        self.recording: pydub.AudioSegment = recording
+        self.maximum_clip_samples: int = maximum_clip_samples if maximum_clip_samples is not None else (recording.frame_rate // 1000) * Configuration().get('maximum_clip_size_miliseconds')
+        self.index: OverlapIndex = index
+        self.levels: Envelope = envelope if envelope is not None else Envelope.build(recording)
+        self.block_miliseconds: int = max(1, block_miliseconds if block_miliseconds is not None else Configuration().get('detection_window_miliseconds'))
+        self.block_samples: int = self.levels.block(self.block_miliseconds)
+
+        self.begin_edges, self.begin_votes = Selector.merge(begin_edges, begin_votes)
+        self.end_edges, self.end_votes = Selector.merge(end_edges, end_votes)
+
+        self.begins, self.ends, self.scores = self.candidates()
+        self.ranked: [int] = []  # candidate indexes ordered best first, extended a page at a time
+        self.cursor: int = 0
+
+        Logger.debug(f"Selector: {len(self.begin_edges)} begin and {len(self.end_edges)} end boundaries make {len(self.scores)} candidate clips")
+
+    @staticmethod
+    def merge(edges: ndarray, votes: ndarray) -> (ndarray, ndarray):
+        """
+        Sort boundaries and merge duplicates (keeping the highest vote)
+        """
+        import numpy
+
+        unique_edges, inverse = numpy.unique(edges, return_inverse=True)
+        unique_votes = numpy.zeros(len(unique_edges), dtype=numpy.float64)
+        numpy.maximum.at(unique_votes, inverse, votes)
+        return unique_edges, unique_votes
+
+    def envelope(self) -> ndarray:
+        """
+        The RMS level (0.0 to 1.0) of each block of the recording, all channels mixed (read from the envelope of the recording, not the samples)
+        """
+        import numpy
+
+        _, _, levels = self.levels.query(0, None, self.block_miliseconds)
+        return levels if len(levels) else numpy.zeros(1)
+
+    def candidates(self) -> (ndarray, ndarray, ndarray):
+        """
+        Pair every begin boundary with the end boundaries that follow it within the maximum clip size, and score each pair
+        """
+        import numpy
+
+        low = numpy.searchsorted(self.end_edges, self.begin_edges, side='right')
+        high = numpy.searchsorted(self.end_edges, self.begin_edges + self.maximum_clip_samples, side='right')
+        counts = high - low
+        total: int = int(counts.sum())
+
+        if 0 == total:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+
+        begin_positions = numpy.repeat(numpy.arange(len(self.begin_edges)), counts)
+        end_positions = numpy.arange(total) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(low, counts)
+
+        begins = self.begin_edges[begin_positions]
+        ends = self.end_edges[end_positions]
+
+        # Boundary vote strength (normalized so the best possible pair scores 1.0)
+
+        votes = (self.begin_votes[begin_positions] + self.end_votes[end_positions]) / max(1e-9, float(self.begin_votes.max() + self.end_votes.max()))
+
+        # Energy features: a loud clip body (mean level from a prefix sum over the envelope) that starts and ends at quiet points (natural cuts)
+
+        envelope = self.envelope()
+        peak: float = max(1e-9, float(envelope.max()))
+        prefix = numpy.concatenate(([0.0], numpy.cumsum(envelope)))
+        begin_blocks = numpy.minimum(begins // self.block_samples, len(envelope) - 1)
+        end_blocks = numpy.minimum(numpy.maximum(ends // self.block_samples, begin_blocks + 1), len(envelope))
+        body = (prefix[end_blocks] - prefix[begin_blocks]) / (end_blocks - begin_blocks) / peak
+        edges = (envelope[begin_blocks] + envelope[end_blocks - 1]) / (2 * peak)
+
+        # Method combining: the share of the stages that produced an interval overlapping the candidate
+
+        agreement = numpy.zeros(len(begins))
+        if self.index is not None and 0 < self.index.stage_count:
+            stages, _ = self.index.agreements(begins, ends, Configuration().get('agreement_overlap_ratio'))
+            agreement = stages / self.index.stage_count
+
+        return begins, ends, votes + 0.5 * agreement + 0.5 * body - 0.25 * edges
+
+    def rank(self, count: int) -> None:
+        """
+        Extend the ranking to at least count candidates (a heap keeps only the best count candidates while scanning the scores)
+        """
+        import numpy
+
+        count = min(count, len(self.scores))
+        if count <= len(self.ranked):
+            return
+        contenders = numpy.argpartition(-self.scores, count - 1)[:count] if count < len(self.scores) else numpy.arange(len(self.scores))  # linear time pre-selection
+        self.ranked = heapq.nlargest(count, contenders.tolist(), key=self.scores.__getitem__)
+
+    def page(self, start: int, length: int) -> [(int, int, float)]:
+        """
+        The (begin, end, score) of the candidates ranked start to start + length - 1, best first
+        Args:
+        :param start:  the zero based rank of the first candidate to return
+        :param length: the maximum number of candidates to return
+        """
+        self.rank(start + length)
+        self.cursor = min(start + length, len(self.ranked))
+        return [(int(self.begins[index]), int(self.ends[index]), float(self.scores[index])) for index in self.ranked[start:start + length]]
+
+    def next(self, length: int) -> [(int, int, float)]:
+        """
+        The next page of candidates after the last page returned
+        Args:
+        :param length: the maximum number of candidates to return
+        """
+        return self.page(self.cursor, length)
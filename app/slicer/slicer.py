@@ -3,20 +3,24 @@ Slicer module
 """
 from __future__ import annotations
 
+import time
+from contextlib import nullcontext
 from typing import List, Optional, Union, Literal
 
-from beat import BeatSlicer
-from chaos import ChaosSlicer
+from budget import Budget
+from cache import AnalysisCache
 from clip import Clip
 from configuration.configuration import Configuration
-from interval import SimpleIntervalSlicer
+from envelope import Envelope
+from features import Features
 from logger import Logger
-from onset import OnsetSlicer
-from pitch import PitchSlicer
-from sci import SampleClippingInterval
-from tempo import TempoSlicer
-from .vocal import VocalSlicer
-from .volume import VolumeSlicer
+from metrics import Metrics
+from overlap import OverlapIndex
+from pcm import PCMRecording
+from registry import Registry, SlicerPlugin
+from sci import SampleClippingInterval, SampleClippingIntervals
+from selector import Selector
+from stages import StageCache
 
 
 class Slicer(object):
@@ -25,26 +29,46 @@ class Slicer(object):
     from which lists of auido array sample arrays (known as clips) are prepared from a source audio recording
     """
 
-    def __init__(self):
+    def __init__(self, analysis_cache: AnalysisCache = None):
         """
         Instantiate the Slicer class
         Args:
+        :param analysis_cache: the persistent cache of analysis results (defaults to the configured analysis cache)
         """
         import pydub
 
         self.recording: Optional[pydub.AudioSegment] = None
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
+        self.selector: Optional[Selector] = None
+        self.features: Optional[Features] = None
+        self.envelope: Optional[Envelope] = None
+        self.analysis_cache: AnalysisCache = analysis_cache if analysis_cache is not None else AnalysisCache()
+        self.stage_cache: StageCache = StageCache(self.analysis_cache)
+        self.cut: [{}] = []  # the stages an anytime slicing reduced or cut to stay within its budget
 
     import pydub
 
-    def slice(self, recording: pydub.AudioSegment = None, logic: [{}] = None, sci: List[SampleClippingInterval] = None) -> Slicer:
+    def slice(self, recording: pydub.AudioSegment = None, logic: [{}] = None, sci: Union[SampleClippingIntervals, List[SampleClippingInterval]] = None, envelope: Envelope = None, meter=None, deadline: float = None, cpu_budget: float = None) -> Slicer:
         """
         Apply slicer methods to build a set of recording sample clipping intervals
         Args:
         :param recording: the audio recording to be sliced
         :param logic:     the slicers to use to slice the recording and the slicer arguments
         :param sci:       starter sample clipping intervals
+        :param envelope:  the envelope of the recording, shared by the slicers and the clip selection (measured when needed if not provided)
+        :param meter:     measures the memory and CPU time of each stage's analysis (a scheduler.Meter, not measured when not provided)
+        :param deadline:   the wall clock seconds the slicing may take, an anytime slicing (defaults to the configured slice deadline, 0 for no limit)
+        :param cpu_budget: the CPU seconds the slicing may take, an anytime slicing (defaults to the configured slice CPU seconds, 0 for no limit)
+        Note: an anytime slicing runs the stages cheapest per vote first, a stage that no longer fits the budget is run at a reduced resolution or cut
+              (see Budget), and get() selects clips from the stages that ran
+        Note: a slicer with an 'input' (a stage index or a list of stage indexes) is chained, it only analyzes the windows of the
+              sample clipping intervals emitted by those earlier stages and emits refined sub-intervals of them
+        Note: a memory mapped (out of core) recording is sliced a window at a time
+        Note: each stage's output is kept in the stage cache, a stage whose audio, method, arguments, configuration, and code are unchanged
+              (and, for a chained stage, whose input stages are unchanged) is read from it rather than run again
         """
+        import numpy
+
         if recording is None:
             raise RuntimeError("Recording not provided, use the Loader class to load a file to slice")
         if Configuration().get('minimum_recording_size_miliseconds') > len(recording):  # refuse to slice recordings shorter than 1 second (for no particular reason)
@@ -52,11 +76,20 @@ class Slicer(object):
         if logic is None or 0 == len(logic):
             raise RuntimeError("Slicer methods not declared, create a method dictionary that describes how to process and slice the recording")
 
+        self.envelope = envelope
+        self.cut = []
+
+        if isinstance(recording, PCMRecording):
+            return self.slice_out_of_core(recording, logic, sci, meter, deadline, cpu_budget)
+
         self.recording = recording
-        self.sci = [] if sci is None else sci
+        self.selector = None
+        self.features = Features(recording, self.analysis_cache, envelope)
+        self.sci = SampleClippingIntervals() if sci is None else sci if isinstance(sci, SampleClippingIntervals) else SampleClippingIntervals().extend(sci)
 
         Logger.debug("Slicing sample clipping intervals from the recording")
 
+        stages: [(int, {}, str, SlicerPlugin, {})] = []
         for stage, slicer in enumerate(logic):  # execution each slicer is a "stage" in the processing of the source
             if "active" in slicer and not slicer["active"]:  # skip methods that are deactivated
                 continue
@@ -65,16 +98,15 @@ class Slicer(object):
 
             try:
                 method_name = slicer["method"]
-            except AttributeError:
+            except KeyError:
                 Logger.warning(f"Attribute 'method' not defined on slicer[{stage}]")
-                Logger.warning(f"Available methods are: 'slice_on_beat', 'slice_at_random', 'slice_on_vocal_change', 'slice_on_volume_change'")
+                Logger.warning(f"Available methods are: {Registry.names()}")
                 continue
 
-            try:
-                method = getattr(Slicer, method_name)
-            except AttributeError:
-                Logger.warning(f"No slicer method named '{method_name}' is avaialable in the slicer module, referenced in slicer[{stage}]")
-                Logger.warning(f"Available methods are: 'slice_on_beat', 'slice_at_random', 'slice_on_vocal_change', 'slice_on_volume_change'")
+            method: SlicerPlugin = Registry.get(method_name)
+            if method is None:
+                Logger.warning(f"No slicer method named '{method_name}' is avaialable in the slicer registry, referenced in slicer[{stage}]")
+                Logger.warning(f"Available methods are: {Registry.names()}")
                 continue
 
             try:
@@ -83,231 +115,355 @@ class Slicer(object):
                 Logger.debug(f"'arguments' not provided for '{method_name}', using default values")
                 arguments = {}
 
+            missing: [str] = method.missing(arguments)
+            if missing:
+                Logger.warning(f"Slicer method '{method_name}' referenced in slicer[{stage}] requires {missing}, which are not installed [Skipping stage]")
+                continue
+
             arguments["weight"] = slicer["weight"] if "weight" in slicer else "1"
+            stages.append((stage, slicer, method_name, method, arguments))
+
+        budget: Optional[Budget] = None
+        if Budget.limited(deadline, cpu_budget):
+            budget = Budget(deadline, cpu_budget, len(self.recording) / 1000, meter.costs if meter is not None else None, observe=meter is None)
+            stages = budget.order(stages)
+
+        # The stage cache keys of the stages that ran, None for a stage whose output is not cached (a stage that has not run, was skipped, or was cut
+        # has produced no intervals yet, which a chained stage's key records as 'empty'), a chained stage refining an output that is not cached is not cached either
+        # A chained stage ranks its windows by their agreement with the intervals of every stage that ran before it, so its key includes all their keys
+
+        # The shared analysis features are planned and computed once, ahead of the first stage that analyzes the whole recording (a stage read
+        # from the stage cache computes nothing), and outside its timing so the cost model measures each stage's own analysis
+        # A budgeted slicing plans only that stage's features, a later stage may yet be cut
+
+        planned: Optional[List[str]] = None
+        keys: {int: Optional[str]} = {}
+        for position, (stage, slicer, method_name, method, arguments) in enumerate(stages):
+            inputs: Optional[list] = [keys.get(index, 'empty') for index in numpy.atleast_1d(slicer["input"]).tolist()] if "input" in slicer else None
+            preceding: Optional[list] = [[index, keys[index]] for index in sorted(keys)] if "input" in slicer else None
+            cacheable: bool = self.stage_cache.enabled and (inputs is None or (None not in inputs and None not in keys.values()))
+            key: Optional[str] = self.stage_cache.key(self.features.audio_hash(), self.recording.frame_rate, method_name, method, arguments, inputs, preceding) if cacheable else None
+            cached: Optional[SampleClippingIntervals] = self.stage_cache.get(key, stage)
+            if cached is not None:
+                self.sci += cached
+                keys[stage] = key
+                continue
+
+            frame_rate: Optional[int] = None
+            if budget is not None:
+                action, admitted, frame_rate = budget.admit(stage, slicer, method_name, method, arguments, self.recording.frame_rate)
+                if 'cut' == action:
+                    Logger.debug(f"Stage {stage} [{method_name}] cut, its estimated analysis does not fit the remaining {budget.remaining():.2f} secs")
+                    continue
+                if "input" in slicer:  # a chained stage analyzes its windows at the recording's frame rate, its key records the rate it runs at
+                    frame_rate = None
+                if admitted is not arguments or frame_rate is not None:  # the reduced mode, or the analysis at the reduced frame rate, is a stage of its own in the stage cache
+                    arguments = admitted
+                    key = self.stage_cache.key(self.features.audio_hash(), frame_rate or self.recording.frame_rate, method_name, method, arguments, inputs, preceding) if cacheable else None
+                    cached = self.stage_cache.get(key, stage)
+                    if cached is not None:
+                        self.sci += cached
+                        keys[stage] = key
+                        continue
+
+            if planned is None and "input" not in slicer and frame_rate is None:
+                later: [{}] = [] if budget is not None else [{'method': later_name, 'arguments': later_arguments} for _, later_slicer, later_name, _, later_arguments in stages[position + 1:] if "input" not in later_slicer]
+                planned = Registry.plan([{'method': method_name, 'arguments': arguments}] + later)
+                if planned:
+                    Logger.debug(f"Shared analysis features: {planned}")
+                    with Metrics.timer('analysis_seconds', method='features'):
+                        self.features.compute(planned)
 
             Logger.properties(recording, f"Pre-stage:{stage} [{method_name}] slicing recording characteristics")
-            method(self, stage, arguments)  # -> None
+            emitted: int = len(self.sci)
+            cpu: float = time.thread_time()
+            with Metrics.timer('analysis_seconds', method=method_name), meter.analysis(method_name, arguments, len(self.recording) / 1000) if meter is not None else nullcontext():
+                if "input" in slicer:
+                    self.chain(stage, method, arguments, slicer["input"])
+                elif frame_rate is not None:
+                    self.sci += self.reduced(stage, method, arguments, frame_rate)
+                else:
+                    self.sci += method.run(stage, arguments, self.recording, self.features)
+            if budget is not None and frame_rate is None:
+                budget.measured(method_name, arguments, time.thread_time() - cpu)
+            if key is not None:
+                self.stage_cache.put(key, self.sci.select(numpy.arange(emitted, len(self.sci))))
+            keys[stage] = key
             Logger.properties(recording, f"Post-stage:{stage} [{method_name}] slicing recording characteristics")
 
-        Logger.debug(f"Sliced {len(self.sci)} sample clipping intervals from the recording")
+        if budget is not None:
+            self.cut = budget.close()
+
+        Logger.debug(f"Analysis cache: {self.analysis_cache.hits} hits, {self.analysis_cache.misses} misses, stage cache: {self.stage_cache.hits} hits, {self.stage_cache.misses} misses")
+        Logger.debug(f"Sliced {len(self.sci)} sample clipping intervals (total weight {self.sci.total_weight():g}) from the recording")
         return self
 
-    def cluster_indexes(self, sample_indexes: [int], proximity: Union[int, None] = None) -> [[int]]:
+    def slice_out_of_core(self, recording: PCMRecording, logic: [{}], sci: Union[SampleClippingIntervals, List[SampleClippingInterval]] = None, meter=None, deadline: float = None, cpu_budget: float = None) -> Slicer:
         """
-        Group Sample Clipping Intervals by beginning or ending sample index to "vote" for likely clip edges
+        Slice a memory mapped recording one window at a time, so that only a window of samples and its analysis features are in memory
+        Note: windows overlap by the maximum clip size, and each window keeps the intervals that begin before the next window's own samples
+              so that no clip is lost at a window edge and no interval is voted for twice
+        Note: the logic is applied to each window as to a recording, e.g., a stage's 'clips' are per window
         Args:
-        :param sample_indexes: a list of begin or end Sample Clipping Intervals to cluster
-        :param proximity:   the nearness in miliseconds by which to cluster Sample Clipping Intervals
+        :param recording: the memory mapped recording to be sliced
+        :param logic:     the slicers to use to slice each window and the slicer arguments
+        :param sci:       starter sample clipping intervals
+        :param meter:     measures the memory and CPU time of each stage's analysis of each window
+        :param deadline:   the wall clock seconds the slicing of all the windows may take (each window is given what is left of it)
+        :param cpu_budget: the CPU seconds the slicing of all the windows may take
         """
-        sample_indexes.sort()
-        sample_index_proximity_threshold = (self.recording.frame_rate // 1000) * (proximity if proximity is not None else Configuration().get("cluster_window_miliseconds"))
+        samples_per_milisecond: int = recording.frame_rate // 1000
+        total_samples: int = recording.frame_count()
+        overlap_samples: int = samples_per_milisecond * Configuration().get('maximum_clip_size_miliseconds')
+        window_samples: int = max(2 * overlap_samples, recording.window_frames())
+        minimum_samples: int = samples_per_milisecond * Configuration().get('minimum_recording_size_miliseconds')
 
-        cluster: [int] = []
-        trailing_sample_indexes_index: int = len(sample_indexes) - 1
-        while 0 <= trailing_sample_indexes_index:
-            trailing_sample_index: int = sample_indexes[trailing_sample_indexes_index]
-            leading_sample_indexes_index: int = trailing_sample_indexes_index
-            while 0 <= leading_sample_indexes_index:
-                current_sample_index: int = sample_indexes[leading_sample_indexes_index]
-                if sample_index_proximity_threshold < trailing_sample_index - current_sample_index:
-                    yield cluster
-                    cluster = []
-                    break
-                cluster += [current_sample_index]
-                leading_sample_indexes_index -= 1
-            if cluster:
-                yield cluster
-                cluster = []
+        self.recording = recording
+        self.selector = None
+        self.features = None
+        self.sci = SampleClippingIntervals() if sci is None else sci if isinstance(sci, SampleClippingIntervals) else SampleClippingIntervals().extend(sci)
 
-            # Scan for the next (potentially) overlapping cluster at a fraction of the proximity threshold away from the last trailing sample indexes index
+        Logger.debug(f"Slicing the memory mapped recording in windows of {window_samples} samples overlapping by {overlap_samples} samples")
+
+        budget: Optional[Budget] = Budget(deadline, cpu_budget, 0.0, observe=False) if Budget.limited(deadline, cpu_budget) else None
 
-            trailing_sample_index -= sample_index_proximity_threshold // 4
-            while 0 <= trailing_sample_indexes_index and trailing_sample_index < sample_indexes[trailing_sample_indexes_index]:
-                trailing_sample_indexes_index -= 1
+        for begin in range(0, total_samples, window_samples - overlap_samples):
+            end: int = min(total_samples, begin + window_samples)
+            if end - begin < minimum_samples:
+                break
+            if budget is not None and 0 >= budget.remaining():  # the budget ran out, the later windows are not sliced
+                self.cut.append({'window': [begin, total_samples], 'action': 'cut'})
+                Logger.warning(f"Anytime slicing ran out of time at sample {begin} of {total_samples} of the memory mapped recording")
+                break
+            seconds, cpu_seconds = budget.left() if budget is not None else (None, None)
+            window: Slicer = Slicer(self.analysis_cache).slice(recording.get_sample_slice(begin, end), logic, meter=meter, deadline=seconds, cpu_budget=cpu_seconds)
+            self.cut += [dict(entry, window=[begin, end]) for entry in window.cut]
+            kept = window.sci.begin < (window_samples - overlap_samples if end < total_samples else end - begin)
+            self.sci.append(window.sci.begin[kept] + begin, window.sci.end[kept] + begin, window.sci.weight[kept], window.sci.stage[kept])
+            if end == total_samples:
+                break
 
-        if cluster:
-            yield cluster
+        Logger.debug(f"Sliced {len(self.sci)} sample clipping intervals (total weight {self.sci.total_weight():g}) from the memory mapped recording")
+        return self
 
-    @staticmethod
-    def cluster_size_histogram(sci_index_clusters) -> ({int: int}, int, int, float):
-        histogram: {} = {}
-        for sci_cluster in sci_index_clusters:
-            key: int = len(sci_cluster)
-            histogram[key] = histogram[key] + 1 if key in histogram else 1
-
-        low: int = len(sci_index_clusters)
-        high: int = 0
-        accumulator: int = 0
-        for key in sorted(histogram, reverse=True):
-            frequency: int = histogram[key]
-            if low > frequency:
-                low = frequency
-            if high < frequency:
-                high = frequency
-            accumulator += frequency
-            del histogram[key]
-            histogram[key] = frequency
-
-        return histogram, low, high, accumulator // len(histogram)
+    def reduced(self, stage: int, method: SlicerPlugin, arguments: {}, frame_rate: int) -> SampleClippingIntervals:
+        """
+        Run a slicer method on the recording resampled to a lower frame rate, its intervals are scaled back to the samples of the recording
+        Args:
+        :param stage:      the index of the slicing stage
+        :param method:     the slicer method to run
+        :param arguments:  the slicer method arguments
+        :param frame_rate: the reduced frame rate
+        """
+        import numpy
 
-    @staticmethod
-    def cluster_prune(index_clusters: [[int]], threshold: int) -> [[int]]:
-        clusters: [[int]] = []
-        minimums: [int] = []
-        maximums: [int] = []
-
-        for index_cluster in index_clusters:
-            if threshold <= len(index_cluster):
-                clusters += [index_cluster]
-                minimums += [min(index_cluster)]
-                maximums += [max(index_cluster)]
-        return clusters, minimums, maximums
-
-    def clip_boundries(self, side: Literal["begin", "end"]) -> ([int], [int]):
-        indexes: [int] = []
-        indexes += (getattr(sci, side) for sci in self.sci)
-        index_clusters: List[List[int]] = []
-        index_clusters += self.cluster_indexes(indexes)
-        index_cluster_sizes_histogram, low, high, average = Slicer.cluster_size_histogram(index_clusters)
-        pruned_index_clusters, lowest_cluster_index, highest_cluster_index = Slicer.cluster_prune(index_clusters, average)
-
-        return pruned_index_clusters, lowest_cluster_index if "begin" == side else highest_cluster_index
+        reduced = self.recording.set_frame_rate(frame_rate)
+        Logger.debug(f"Stage {stage} analyzes the recording at a reduced {frame_rate} hz")
+        sci: SampleClippingIntervals = method.run(stage, arguments, reduced, Features(reduced, self.analysis_cache))
+        scale: float = self.recording.frame_rate / frame_rate
+        return SampleClippingIntervals().append(numpy.rint(sci.begin * scale), numpy.rint(sci.end * scale), sci.weight, sci.stage)
 
-    def get(self, start: int = None, length: int = None) -> [Clip]:
+    def windows(self, inputs: Union[int, List[int]], maximum: int = None) -> [(int, int)]:
         """
-        Generate audio segment clips from the recording based upon the Sample Clipping Intervals determined by slice()
+        The (begin, end) sample windows covered by the best ranked sample clipping intervals of earlier stages, overlapping intervals are merged
+        Note: the intervals are ranked by the total weight of the intervals (of every stage) that agree with them, and only the best are refined,
+              so a dense earlier stage (e.g., beat or chaos) does not merge into a single window spanning the whole recording
         Args:
-        :param start:  the zero based index of the first clip to return (to support pagination/memory management)
-        :param length: the maximum number of clips to return (to support pagination/memory management)
+        :param inputs:  the index (or list of indexes) of the stages whose sample clipping intervals are to be refined
+        :param maximum: the number of best ranked intervals to refine (defaults to the configured chain windows, 0 for every interval)
         """
-        start = 0 if start is None else start
-        length = len(self.sci) if length is None else length
+        import numpy
+
+        maximum = maximum if maximum is not None else Configuration().get('chain_windows')
+        stages = numpy.atleast_1d(numpy.asarray(inputs, dtype=numpy.int64))
+        parents = self.sci.select(numpy.isin(self.sci.stage, stages))
+        if 0 == len(parents):
+            return []
+
+        if 0 < maximum < len(parents):
+            _, weights = OverlapIndex(self.sci).agreements(parents.begin, parents.end, Configuration().get('agreement_overlap_ratio'))
+            parents = parents.select(numpy.sort(numpy.argpartition(-weights, maximum - 1)[:maximum]))
+
+        order = numpy.argsort(parents.begin, kind='stable')
+        begins = parents.begin[order]
+        ends = numpy.maximum.accumulate(parents.end[order])
+        starts = numpy.concatenate(([True], begins[1:] > ends[:-1]))  # a window starts where an interval begins after every earlier interval has ended
+        last = numpy.concatenate((numpy.flatnonzero(starts)[1:] - 1, [len(begins) - 1]))
+        return list(zip(begins[starts].tolist(), ends[last].tolist()))
+
+    def chain(self, stage: int, method: SlicerPlugin, arguments: {}, inputs: Union[int, List[int]]) -> None:
+        """
+        Run a slicer method on each window of the best ranked sample clipping intervals of earlier stages, the sub-intervals it emits are
+        offset back into the recording and clamped to their window
+        Note: pydub segments hold immutable bytes so each window is cut with get_sample_slice (a copy of only the window's samples)
+        Args:
+        :param stage:     the index of the chained slicing stage
+        :param method:    the slicer method to run on each window
+        :param arguments: the slicer method arguments
+        :param inputs:    the index (or list of indexes) of the stages whose sample clipping intervals are to be refined
+        """
+        recording, sci, features = self.recording, self.sci, self.features
+        emitted: int = len(sci)
+        minimum_samples: int = (recording.frame_rate // 1000) * Configuration().get('minimum_recording_size_miliseconds')
+        windows: [(int, int)] = self.windows(inputs)
+
+        Logger.debug(f"Chaining stage {stage} to stage(s) {inputs}: {len(windows)} windows")
+
+        try:
+            for begin, end in windows:
+                if end - begin < minimum_samples:  # too short to analyze
+                    continue
+                self.recording = recording.get_sample_slice(begin, end)
+                self.features = Features(self.recording, self.analysis_cache)
+                self.sci = method.run(stage, arguments, self.recording, self.features)
+                if len(self.sci):
+                    sci.append(self.sci.begin.clip(0, end - begin) + begin, self.sci.end.clip(0, end - begin) + begin, self.sci.weight, stage)
+        finally:
+            self.recording, self.sci, self.features = recording, sci, features
+
+        Logger.debug(f"Stage {stage} refined {len(windows)} windows into {len(sci) - emitted} sample clipping intervals")
+
+    from numpy import ndarray
+
+    def cluster_indexes(self, sample_indexes: ndarray, weights: ndarray, proximity: Union[int, None] = None) -> (ndarray, ndarray, ndarray):
+        """
+        Group Sample Clipping Intervals by beginning or ending sample index to "vote" for likely clip edges
+        Each cluster spans the proximity window ending at a trailing sample index, the next (potentially overlapping) window trails
+        a fraction of the proximity threshold below the last, and a cluster's votes are the sum of its intervals' weights
+        Args:
+        :param sample_indexes: the begin or end sample indexes of the Sample Clipping Intervals to cluster
+        :param weights:        the vote weight of each sample index
+        :param proximity:      the nearness in miliseconds by which to cluster Sample Clipping Intervals
+        :return: the lowest sample index, highest sample index, and votes of each cluster
+        """
+        import numpy
 
-        Logger.properties(self.recording, "Clip creation recording characteristics")
+        order: ndarray = numpy.argsort(sample_indexes, kind='stable')
+        sorted_indexes: ndarray = sample_indexes[order]
+        cumulative_weights: ndarray = numpy.concatenate(([0.0], numpy.cumsum(weights[order])))
+        sample_index_proximity_threshold = (self.recording.frame_rate // 1000) * (proximity if proximity is not None else Configuration().get("cluster_window_miliseconds"))
+        step: int = max(1, sample_index_proximity_threshold // 4)
 
-        # Find clusters in the begin and end lists from the Sample Clipping Intervals
+        lows: [int] = []
+        highs: [int] = []
+        votes: [float] = []
+        trailing_sample_indexes_index: int = len(sorted_indexes) - 1
+        while 0 <= trailing_sample_indexes_index:
+            trailing_sample_index: int = int(sorted_indexes[trailing_sample_indexes_index])
+            leading_sample_indexes_index: int = int(numpy.searchsorted(sorted_indexes, trailing_sample_index - sample_index_proximity_threshold, side='left'))
+            lows += [int(sorted_indexes[leading_sample_indexes_index])]
+            highs += [trailing_sample_index]
+            votes += [cumulative_weights[trailing_sample_indexes_index + 1] - cumulative_weights[leading_sample_indexes_index]]
 
-        pruned_index_clusters_begin, lowest_index_in_cluster_begin = self.clip_boundries("begin")
-        pruned_index_clusters_end, highest_index_in_cluster_end = self.clip_boundries("end")
-
-        maximum_clip_size_samples: int = (self.recording.frame_rate // 1000) * Configuration().get("maximum_clip_size_miliseconds")
-        clips_considered: int = 0
-        clips_generated: int = 0
-        intervals: List[SampleClippingInterval] = []
-        for begin_sample_index in lowest_index_in_cluster_begin:
-            for end_sample_index in highest_index_in_cluster_end:
-                if end_sample_index > begin_sample_index and maximum_clip_size_samples >= end_sample_index - begin_sample_index:
-                    if start <= clips_considered:
-                        intervals += [SampleClippingInterval(begin=begin_sample_index, end=end_sample_index)]
-                        clips_generated += 1
-                    if length <= clips_generated:
-                        break
-                    clips_considered += 1
-            if length <= clips_generated:
-                break
+            # Scan for the next (potentially) overlapping cluster at a fraction of the proximity threshold away from the last trailing sample indexes index
 
-        clips: [Clip] = []
-        for interval in intervals:
-            clips += [Clip(self.recording, interval)]
-        return clips
+            trailing_sample_indexes_index = min(trailing_sample_indexes_index - 1, int(numpy.searchsorted(sorted_indexes, trailing_sample_index - step, side='right')) - 1)
 
-    slice_on_beat_weight: int = 5
+        return numpy.array(lows, dtype=numpy.int64), numpy.array(highs, dtype=numpy.int64), numpy.array(votes, dtype=numpy.float64)
 
-    def slice_on_beat(self, stage: int, arguments: {}) -> None:
+    @staticmethod
+    def cluster_size_histogram(votes: ndarray) -> ({float: int}, int, int, float):
         """
-        Wrapper for the slice on the musical every beat slicer:
-        Identifies single beats and groups these into consecutive ranges in overlapping multiples of the requested beat count
-        Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        Histogram of the cluster vote totals
+        :return: the histogram (vote total: frequency, highest vote total first), the lowest and highest frequency, and the average frequency
         """
-        self.sci += BeatSlicer(stage, arguments, self.recording).get()
+        import numpy
 
-    slice_at_interval_weight: int = 1
+        if 0 == len(votes):
+            return {}, 0, 0, 0
 
-    def slice_at_interval(self, stage: int, arguments: {}) -> None:
-        """
-        Wrapper for the slice equally spaced clips slicer:
-        Processes based upon the clip size slicer, the desired number of clips, and the duration of the downloaded audio recording
-        Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
-        """
-        self.sci += SimpleIntervalSlicer(stage, arguments, self.recording).get()
+        keys, frequencies = numpy.unique(votes, return_counts=True)
+        histogram: {} = dict((float(key), int(frequency)) for key, frequency in zip(keys[::-1], frequencies[::-1]))
 
-    slice_at_random_weight: int = 1
+        return histogram, int(frequencies.min()), int(frequencies.max()), int(frequencies.sum()) // len(histogram)
 
-    def slice_at_random(self, stage: int, arguments: {}) -> None:
+    @staticmethod
+    def cluster_prune(lows: ndarray, highs: ndarray, votes: ndarray, threshold: float) -> (ndarray, ndarray, ndarray):
         """
-        Wrapper for the slice randomly slicer:
-        Adds noise to the clip weightings for statistical balancing
-        Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        Keep the clusters that received at least the threshold number of votes
         """
-        self.sci += ChaosSlicer(stage, arguments, self.recording).get()
-
-    slice_on_vocal_change_weight: int = 1
+        keep: ndarray = threshold <= votes
+        return votes[keep], lows[keep], highs[keep]
 
-    def slice_on_vocal_change(self, stage: int, arguments: {}) -> None:
+    def clip_boundries(self, side: Literal["begin", "end"]) -> (ndarray, ndarray):
         """
-        Wrapper for the slice on vocal cues slicer:
-        Processes by filtering vocal and then performing volume change detection
-        Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        Vote for clip boundaries
+        :return: the votes and the boundary sample index (lowest index of a begin cluster, highest index of an end cluster) of the surviving clusters
         """
-        self.sci += VocalSlicer(stage, arguments, self.recording).get()
+        lows, highs, votes = self.cluster_indexes(getattr(self.sci, side), self.sci.weight)
+        index_cluster_sizes_histogram, low, high, average = Slicer.cluster_size_histogram(votes)
+        pruned_votes, lowest_cluster_index, highest_cluster_index = Slicer.cluster_prune(lows, highs, votes, average)
 
-    slice_on_volume_change_weight: int = 5
+        return pruned_votes, lowest_cluster_index if "begin" == side else highest_cluster_index
 
-    def slice_on_volume_change(self, stage: int, arguments: {}) -> None:
+    def get(self, start: int = None, length: int = None) -> [Clip]:
         """
-        Wrapper for the slice on volume change slicer:
-        Processes by measuring volume fluctuations in 'detection_window' sized chunks of the recording
+        Generate audio segment clips from the recording based upon the Sample Clipping Intervals determined by slice()
         Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        :param start:  the zero based index of the first clip to return (to support pagination/memory management)
+        :param length: the maximum number of clips to return (to support pagination/memory management)
         """
-        self.sci += VolumeSlicer(stage, arguments, self.recording).get()
+        start = 0 if start is None else start
+        length = len(self.sci) if length is None else length
 
-    slice_at_onset_weight: int = 4
+        if 0 == len(self.sci):
+            return []
 
-    def slice_at_onset(self, stage: int, arguments: {}) -> None:
+        return self.clips(self.select().page(start, length))
+
+    def next(self, length: int = None) -> [Clip]:
         """
-        Wrapper for the slice on onset detection slicer:
+        Generate the next page of audio segment clips after the last page returned by get() or next()
         Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        :param length: the maximum number of clips to return (to support pagination/memory management)
         """
-        self.sci += OnsetSlicer(stage, arguments, self.recording).get()
+        length = len(self.sci) if length is None else length
 
-    slice_on_tempo_change_weight: int = 3
+        if 0 == len(self.sci):
+            return []
 
-    def slice_on_tempo_change(self, stage: int, arguments: {}) -> None:
+        return self.clips(self.select().next(length))
+
+    def select(self) -> Selector:
         """
-        Wrapper for the slice on tempo change detection slicer:
-        Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        Vote for clip boundaries and rank the candidate clips (once per slice(), pages are then served from the ranking)
         """
-        self.sci += TempoSlicer(stage, arguments, self.recording).get()
+        if self.selector is not None:
+            return self.selector
 
-    slice_on_pitch_change_weight: int = 2
+        Logger.properties(self.recording, "Clip creation recording characteristics")
+
+        # Find clusters in the begin and end lists from the Sample Clipping Intervals
+
+        begin_votes, lowest_index_in_cluster_begin = self.clip_boundries("begin")
+        end_votes, highest_index_in_cluster_end = self.clip_boundries("end")
+
+        self.selector = Selector(self.recording, lowest_index_in_cluster_begin, begin_votes, highest_index_in_cluster_end, end_votes, index=OverlapIndex(self.sci), envelope=self.features.envelope() if self.features is not None else self.envelope)
+        return self.selector
 
-    def slice_on_pitch_change(self, stage: int, arguments: {}) -> None:
+    def clips(self, candidates: [(int, int, float)]) -> [Clip]:
+        clips: [Clip] = []
+        for begin_sample_index, end_sample_index, score in candidates:
+            interval = SampleClippingInterval(begin=begin_sample_index, end=end_sample_index)
+            clips += [Clip(self.recording, interval, self.provenance(interval))]
+        return clips
+
+    def provenance(self, interval: SampleClippingInterval, proximity: Union[int, None] = None) -> [int]:
         """
-        Wrapper for the slice on pitch change detection slicer:
+        The slicing stages that voted for a clip boundary, i.e., produced an interval that begins or ends within the cluster window of the clip's
         Args:
-        :param stage:     the index of the slicing method being processed
-        :param arguments: a dictionary of the common and slicing method specific processing parameters
+        :param interval:  the clip sample clipping interval
+        :param proximity: the nearness in miliseconds by which Sample Clipping Intervals were clustered
         """
-        self.sci += PitchSlicer(stage, arguments, self.recording).get()
+        import numpy
+
+        threshold: int = (self.recording.frame_rate // 1000) * (proximity if proximity is not None else Configuration().get("cluster_window_miliseconds"))
+        voted: ndarray = (0 <= self.sci.stage) & ((numpy.abs(self.sci.begin - interval.begin) <= threshold) | (numpy.abs(self.sci.end - interval.end) <= threshold))
+        return numpy.unique(self.sci.stage[voted]).tolist()
 
     @staticmethod
     def get_slicer_methods() -> list[(str, int)]:
         """
-        Returns a list of the available slicer methods to assist users in writing slicing scripts:
-        Note: all slicer wrapper method names must begin with "slice_"
+        Returns a list of the available slicer methods and their default weights to assist users in writing slicing scripts
         """
-        return [(attribute, getattr(Slicer, f"{getattr(Slicer, attribute).__name__}_weight")) for attribute in dir(Slicer) if attribute.startswith("slice_") and callable(getattr(Slicer, attribute))]
+        return [(name, Registry.get(name).weight) for name in Registry.names()]
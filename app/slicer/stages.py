@@ -0,0 +1,163 @@
+"""
+Slicing stage output cache module
+"""
+import ast
+import hashlib
+import importlib.util
+import inspect
+import os
+from typing import Optional
+
+from cache import AnalysisCache
+from configuration.configuration import Configuration
+from logger import Logger
+from metrics import Metrics
+from sci import SampleClippingIntervals
+
+
+class StageCache(object):
+    """
+    The sample clipping intervals each slicing stage produced, kept across runs so that re-slicing a recording after a logic file changes
+    only runs the stages whose key changed (and a batch that crashed resumes at the first stage of a recording that did not finish)
+
+    - an entry is keyed by the hash of the decoded audio, the slicer method, its normalized arguments, the configured slicing keys,
+      and the code version (the source of the slicer's module, of the shared slicing modules, and of every application module they import)
+    - a chained stage's key includes the keys of the stages it refines and of every stage that ran before it (its windows are ranked by their
+      agreement with all the earlier stages' intervals), so it runs again when any of them changes
+    - the entries are kept in the analysis cache directory, and are read and written only when the analysis cache is enabled
+    """
+
+    # the slicing modules every stage runs through (the slicer chains, reduces, and ranks the stage outputs)
+    shared: [str] = ['arguments.py', 'features.py', 'overlap.py', 'sci.py', 'slicer.py']
+
+    versions: {} = {}  # the code version of each slicer method, by method name
+
+    def __init__(self, analysis_cache: AnalysisCache, enabled: bool = None):
+        """
+        Args:
+        :param analysis_cache: the analysis cache whose directory holds the entries
+        :param enabled:        read and write stage outputs (defaults to the configured setting, and only when the analysis cache is enabled)
+        """
+        self.analysis_cache: AnalysisCache = analysis_cache
+        self.enabled: bool = analysis_cache.enabled and (enabled if enabled is not None else Configuration().get('stage_cache'))
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def dependencies(file_paths: [str]) -> [str]:
+        """
+        The source files of the modules, and of every application module they import (at module level or within a function), sorted
+        Note: the modules are read, not imported, an import that does not resolve to a source file of the application is not followed
+        Args:
+        :param file_paths: the source files of the modules
+        """
+        root: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        found: {str} = set()
+        pending: [str] = [os.path.abspath(file_path) for file_path in file_paths]
+        while pending:
+            file_path: str = pending.pop()
+            if file_path in found:
+                continue
+            found.add(file_path)
+            with open(file_path, 'rb') as source_file:
+                tree = ast.parse(source_file.read(), filename=file_path)
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    names: [str] = [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom) and 0 == node.level and node.module is not None:
+                    names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]  # a name imported from a package can be a module
+                else:
+                    continue
+                for name in names:
+                    try:
+                        spec = importlib.util.find_spec(name)
+                    except (ImportError, ValueError):
+                        continue
+                    origin: str = os.path.abspath(spec.origin) if spec is not None and spec.origin is not None and spec.has_location else ''
+                    if origin.endswith('.py') and origin.startswith(root + os.sep) and origin not in found:
+                        pending.append(origin)
+        return sorted(found)
+
+    @staticmethod
+    def version(method_name: str, plugin) -> str:
+        """
+        The hash of the source of a slicer's module, of the shared slicing modules, and of every application module they import
+        (a changed slicer, or a changed module it depends on, invalidates its entries)
+        """
+        if method_name not in StageCache.versions:
+            directory: str = os.path.dirname(os.path.abspath(__file__))
+            root: str = os.path.dirname(directory)
+            digest = hashlib.md5()
+            for file_path in StageCache.dependencies([inspect.getsourcefile(plugin.load())] + [os.path.join(directory, name) for name in StageCache.shared]):
+                digest.update(os.path.relpath(file_path, root).replace(os.sep, '/').encode('utf-8'))
+                with open(file_path, 'rb') as source_file:
+                    digest.update(source_file.read())
+            StageCache.versions[method_name] = digest.hexdigest()
+        return StageCache.versions[method_name]
+
+    @staticmethod
+    def normalized(arguments: {}) -> {}:
+        """
+        The arguments as the slicers read them: the weight as an integer (e.g., "1" and 1 are the same stage)
+        """
+        normalized: {} = dict(arguments)
+        if 'weight' in normalized:
+            try:
+                normalized['weight'] = int(normalized['weight'])
+            except (TypeError, ValueError):
+                pass
+        return normalized
+
+    def key(self, audio_hash: str, frame_rate: int, method_name: str, plugin, arguments: {}, inputs: [Optional[str]] = None, preceding: [[int, Optional[str]]] = None) -> Optional[str]:
+        """
+        The key of a stage's output, None when the stage output cache is disabled
+        Args:
+        :param audio_hash: the hash of the decoded audio samples
+        :param frame_rate: the frame rate of the recording
+        :param method_name: the slicer method name
+        :param plugin:     the slicer method
+        :param arguments:  the slicer method arguments
+        :param inputs:     the keys of the stages a chained stage refines (None for a stage that did not produce a cached output)
+        :param preceding:  the (stage index, key) of every stage that ran before a chained stage
+        """
+        if not self.enabled:
+            return None
+
+        configuration: {} = Configuration().values(Configuration().slicing_keys)
+        try:
+            return self.analysis_cache.key(audio_hash, frame_rate, f"stage_{method_name}", {
+                'arguments': StageCache.normalized(arguments),
+                'inputs': inputs,
+                'preceding': preceding,
+                'configuration': configuration,
+                'version': StageCache.version(method_name, plugin)
+            })
+        except (OSError, TypeError) as error:  # e.g., a plugin whose source is not available is not cached
+            Logger.debug(f"Slicer method '{method_name}' outputs are not cached [{error}]")
+            return None
+
+    def get(self, key: Optional[str], stage: int) -> Optional[SampleClippingIntervals]:
+        """
+        The cached sample clipping intervals of a stage (attributed to the stage's index in the current logic), None when not cached
+        """
+        if key is None:
+            return None
+
+        cached = self.analysis_cache.get(key)
+        if cached is None:
+            self.misses += 1
+            Metrics.increment('cache_requests_total', cache='stage', result='miss')
+            return None
+
+        self.hits += 1
+        Metrics.increment('cache_requests_total', cache='stage', result='hit')
+        begin, end, weight = cached
+        Logger.debug(f"Stage {stage} output read from the stage cache [{key}]")
+        return SampleClippingIntervals(max(1, len(begin))).append(begin, end, weight, stage)
+
+    def put(self, key: Optional[str], sci: SampleClippingIntervals) -> None:
+        """
+        Store the sample clipping intervals a stage produced
+        """
+        if key is not None:
+            self.analysis_cache.put(key, (sci.begin, sci.end, sci.weight))
@@ -1,8 +1,7 @@
-from typing import List
-
 from arguments import parse_common_arguments
+from features import Features
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class TempoSlicer(object):
@@ -12,18 +11,18 @@ class TempoSlicer(object):
     """
     import pydub
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None) -> None:
         """
         Creates a list of potential clip begin and end sample indexes using tempo (beats per minute) change detection
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording
         """
-        import librosa
         from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
@@ -37,8 +36,7 @@ class TempoSlicer(object):
         # https://librosa.org/doc/main/generated/librosa.onset.onset_strength.html
         # https://librosa.org/doc/main/generated/librosa.beat.tempo.html
 
-        onset_env = librosa.onset.onset_strength(y=librosa.to_mono(y=recording.get_array_of_samples()), sr=recording.frame_rate)
-        changes: ndarray = librosa.beat.tempo(onset_envelope=onset_env, sr=recording.frame_rate, aggregate=None)
+        changes: ndarray = (features if features is not None else Features(recording)).tempo()
 
         clips = 0  # TODO turn the tempo change points array into sample clipping intervals
         for clip_index in range(clips):
@@ -49,9 +47,8 @@ class TempoSlicer(object):
             # if difference == math.fabs(changes[1] - changes[0]):
             #     return
 
-            sci = SampleClippingInterval(begin=0, end=0)
-            self.sci.append(sci)
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
+            self.sci.append(begin=0, end=0, weight=weight, stage=stage)
+            Logger.debug(f"Interval[{clip_index}]: {0} {0}")
 
     def get(self):
         return self.sci
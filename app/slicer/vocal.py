@@ -1,9 +1,8 @@
-from typing import List
-
-from arguments import parse_common_arguments
+from arguments import parse_common_arguments, to_hertz
 from configuration.configuration import Configuration
+from features import Features
 from logger import Logger
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 from volume import VolumeSlicer
 
 models = ['spleeter:2stems', 'spleeter:4stems', 'spleeter:5stems', 'spleeter:2stems-16kHz', 'spleeter:4stems-16kHz', 'spleeter:5stems-16kHz']
@@ -12,26 +11,43 @@ models = ['spleeter:2stems', 'spleeter:4stems', 'spleeter:5stems', 'spleeter:2st
 class VocalSlicer(object):
     """
     Slice source audio recording using vocal cues
+
+    - 'spleeter' mode (the default): the vocals are separated from the recording by a Spleeter training model
+    - 'fast' mode: each run of voiced frames found by a vocal activity detector working on the shared short time Fourier transform
+      (no separation) is an interval, rough vocal boundaries at a small fraction of the cost
     """
     import pydub
+    from numpy import ndarray
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None) -> None:
         """
         Creates a list of potential clip begin and end sample indexes using utterance onset and cessation events
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording (the first pass reuses its separated stems)
         """
         import pydub
         import numpy
         from numpy import ndarray
-        from spleeter.separator import Separator
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
+        if 'fast' == (arguments['mode'] if 'mode' in arguments else 'spleeter'):
+            Logger.debug(f"Slicing stage[{stage}], Vocal Slicer: {clips} clips using spectral vocal activity detection", separator=True)
+            begins, ends = VocalSlicer.voiced(arguments, recording, segment, segment_offset_index, features)
+            if 0 < clips < len(begins):  # the longest voiced runs
+                longest: ndarray = numpy.sort(numpy.argsort(begins - ends, kind='stable')[:clips])
+                begins, ends = begins[longest], ends[longest]
+            total_samples: int = int(segment.frame_count())
+            self.sci.append(segment_offset_index + numpy.minimum(begins * Features.stft_hop, total_samples), segment_offset_index + numpy.minimum(ends * Features.stft_hop, total_samples), weight, stage)
+            for clip_index, (begin, end) in enumerate(zip(self.sci.begin.tolist(), self.sci.end.tolist())):
+                Logger.debug(f"Interval[{clip_index}]: {begin} {end}")
+            return
+
         passes: int = arguments['passes'] if 'passes' in arguments else 1
         model: str = arguments['model'] if 'model' in arguments else 0
 
@@ -74,9 +90,8 @@ class VocalSlicer(object):
             Logger.debug(f"Vocal slicer Spleeter pass [{iteration + 1} of {passes}] starting")
             Logger.properties(segment, f"Recording characteristics")
 
-            samples: ndarray = segment.get_array_of_samples()  # [20,000,000] (int16) = 40,000,000 bytes
-            samples_reshaped: ndarray = numpy.reshape(samples, (-1, segment.channels))  # [10,000,000 (int16), 2] = 20,000,000 (int16) = 40,000,000 bytes
-            instruments: {} = Separator(model, multiprocess=False).separate(samples_reshaped)
+            # [20,000,000] (int16) = 40,000,000 bytes reshaped to [10,000,000 (int16), 2] then separated, the first pass stems are shared with other stages
+            instruments: {} = (features if features is not None else Features(recording)).of(segment, segment_offset_index).stems(model) if 0 == iteration else Features(segment).stems(model)
 
             vocals: pydub.AudioSegment = instrument_to_segment(recording, instruments, 'vocals')
             # drums: pydub.AudioSegment = instrument_to_segment(recording, instruments, 'drums')
@@ -93,5 +108,59 @@ class VocalSlicer(object):
 
         self.sci = VolumeSlicer(stage, arguments, segment).get()
 
+    @staticmethod
+    def voiced(arguments: {}, recording: pydub.AudioSegment, segment: pydub.AudioSegment, segment_offset_index: int, features: Features = None) -> (ndarray, ndarray):
+        """
+        The (begin, end) short time Fourier transform frame indexes of the voiced runs of the segment, frame i is centered on sample i * hop of the segment
+        A frame is voiced once its smoothed vocal activity score rises above the on threshold, and until it falls below the off threshold (hysteresis),
+        voiced runs shorter than the minimum vocal duration are dropped and gaps shorter than the minimum gap duration are bridged
+        Args:
+        :param arguments:            the slicer operational parameters
+        :param recording:            the recording the segment was cut from
+        :param segment:              the segment of the recording to be analyzed
+        :param segment_offset_index: the index of the first sample of the segment in the recording
+        :param features:             the shared analysis features of the recording (the segment shares their short time Fourier transform)
+        """
+        import numpy
+        from numpy import ndarray
+
+        min_formant: float = to_hertz(arguments['min_formant']) if 'min_formant' in arguments else 250  # hz, the first formant of most vowels is above it
+        max_formant: float = to_hertz(arguments['max_formant']) if 'max_formant' in arguments else 4000  # hz, and the third below it
+        min_pitch: float = to_hertz(arguments['min_pitch']) if 'min_pitch' in arguments else 80  # hz, a low male voice
+        max_pitch: float = to_hertz(arguments['max_pitch']) if 'max_pitch' in arguments else 1000  # hz, a high soprano
+        on_threshold: float = arguments['on_threshold'] if 'on_threshold' in arguments else 0.55
+        off_threshold: float = arguments['off_threshold'] if 'off_threshold' in arguments else 0.45
+        smoothing: int = arguments['smoothing'] if 'smoothing' in arguments else 200  # miliseconds
+        minimum_vocal: int = arguments['minimum_vocal'] if 'minimum_vocal' in arguments else 250  # miliseconds
+        minimum_gap: int = arguments['minimum_gap'] if 'minimum_gap' in arguments else 250  # miliseconds
+
+        frames_per_milisecond: float = segment.frame_rate / Features.stft_hop / 1000
+        scores: ndarray = (features if features is not None else Features(recording)).of(segment, segment_offset_index).vocal_activity(min_formant, max_formant, min_pitch, max_pitch)
+        width: int = max(1, int(smoothing * frames_per_milisecond))
+        scores = numpy.convolve(scores, numpy.full(width, 1.0 / width), mode='same')
+
+        # hysteresis: each frame takes the state of the last frame that crossed a threshold (-1 neither, 0 below the off threshold, 1 above the on threshold)
+        crossed: ndarray = numpy.where(scores >= on_threshold, 1, numpy.where(scores < off_threshold, 0, -1))
+        last: ndarray = numpy.maximum.accumulate(numpy.where(crossed >= 0, numpy.arange(len(crossed)), -1))
+        voiced: ndarray = numpy.where(last >= 0, crossed[numpy.maximum(last, 0)], 0).astype(bool)
+
+        def runs(mask: ndarray) -> (ndarray, ndarray):  # the (begin, end) frame indexes of the runs of True
+            edges: ndarray = numpy.diff(numpy.concatenate(([0], mask.view(numpy.int8), [0])))
+            return numpy.flatnonzero(1 == edges), numpy.flatnonzero(-1 == edges)
+
+        for value, shortest in ((False, minimum_gap), (True, minimum_vocal)):  # bridge the short gaps, then drop the short voiced runs
+            begins, ends = runs(voiced == value)
+            short: ndarray = (ends - begins) < shortest * frames_per_milisecond
+            if not value:
+                short &= (0 < begins) & (ends < len(voiced))  # leading and trailing silence are not gaps
+            change: ndarray = numpy.zeros(len(voiced) + 1, dtype=numpy.int64)
+            numpy.add.at(change, begins[short], 1)
+            numpy.add.at(change, ends[short], -1)
+            voiced = numpy.where(numpy.cumsum(change)[:-1] > 0, not value, voiced)
+
+        begins, ends = runs(voiced)
+        Logger.debug(f"Vocal activity: {len(begins)} voiced runs, {voiced.mean() * 100 if len(voiced) else 0:.1f}% of the segment")
+        return begins, ends
+
     def get(self):
         return self.sci
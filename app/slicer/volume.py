@@ -1,10 +1,10 @@
-from typing import List
+from itertools import accumulate
 
 from arguments import parse_common_arguments, to_decibels
 from configuration.configuration import Configuration
+from features import Features
 from logger import Logger
-from normalizer import Normalizer
-from sci import SampleClippingInterval
+from sci import SampleClippingIntervals
 
 
 class VolumeSlicer(object):
@@ -13,19 +13,19 @@ class VolumeSlicer(object):
     """
     import pydub
 
-    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment) -> None:
+    def __init__(self, stage: int, arguments: {}, recording: pydub.AudioSegment, features: Features = None) -> None:
         """
         Creates a list of potential clip begin and end sample indexes using volume change event boundaries
         Args:
         :param stage:     the number of the method step in the slicing process
         :param arguments: the common and slicer specific operational parameters
         :param recording: the downloaded audio recording from which clips will be sliced
+        :param features:  the shared analysis features of the recording
         """
-        import librosa
         import numpy
         from numpy import ndarray
 
-        self.sci: List[SampleClippingInterval] = []
+        self.sci: SampleClippingIntervals = SampleClippingIntervals()
 
         weight, segment, segment_offset_index, clip_size, clips = parse_common_arguments(arguments, recording)
 
@@ -41,35 +41,24 @@ class VolumeSlicer(object):
         Logger.debug(f"Silence Threshold Decibels: {low_threshold}")
         Logger.debug(f"Per Chunk Raise Limit Decibels: {drift}")
 
-        samples: ndarray = librosa.amplitude_to_db(Normalizer.monaural_normalization(segment))
-        chunk_remainder_count: int = len(samples) % chunk_size
-        padded_samples: ndarray = samples if 0 == chunk_remainder_count else numpy.pad(samples, (0, chunk_size - chunk_remainder_count))
+        # The peak of each detection window sized chunk is read from the envelope of the segment rather than from its samples
 
-        padded_sample_count: int = len(padded_samples)
-        sample_chunk_count: int = padded_sample_count // chunk_size
+        minimums, maximums, _ = (features if features is not None else Features(recording)).of(segment, segment_offset_index).envelope().query(0, None, chunk_size)
+        peaks: ndarray = 20 * numpy.log10(numpy.maximum(numpy.maximum(-minimums, maximums), 1e-5))
+        peaks = numpy.maximum(peaks, peaks.max(initial=-100.0) - 80.0)  # the librosa amplitude_to_db floor (top_db=80)
 
         Logger.debug(f"Segment Samples: {len(segment)}")
-        Logger.debug(f"Zero Padded Samples: {padded_sample_count}")
-        Logger.debug(f"Chunk Size: {chunk_size}")
-        Logger.debug(f"Segment Chunks: {sample_chunk_count}")
-
-        chunk_peaks: List = []
-
-        for chunk in padded_samples.reshape(sample_chunk_count, chunk_size):
-            peak: float = low_threshold
-            for sample in chunk:
-                if sample > peak:
-                    if sample > peak + drift:
-                        peak += drift  # spiking up (attenuate the peak increase to the decibel drift factor)
-                    else:
-                        peak = sample  # drifting up
-            chunk_peaks.append(peak)
+        Logger.debug(f"Chunk Size Miliseconds: {chunk_size}")
+        Logger.debug(f"Segment Chunks: {len(peaks)}")
+
+        # A peak may fall at once but rise by at most the drift from one chunk to the next (attenuating spikes), and never below the threshold
+
+        chunk_peaks: ndarray = numpy.maximum(numpy.fromiter(accumulate(peaks.tolist(), lambda peak, level: min(level, peak + drift), initial=low_threshold), dtype=numpy.float64, count=len(peaks) + 1)[1:], low_threshold)
 
         clips = 0  # TODO turn peak decibels array into sample clipping intervals
         for clip_index in range(clips):
-            sci = SampleClippingInterval(begin=0, end=0)
-            self.sci += weight * [sci]  # append this Sample Clipping Interval to the list multiple times as specified by the weight
-            Logger.debug(f"Interval[{clip_index}]: {sci.begin} {sci.end}")
+            self.sci.append(begin=0, end=0, weight=weight, stage=stage)  # the weight is stored with the interval as its vote value
+            Logger.debug(f"Interval[{clip_index}]: {0} {0}")
 
     def get(self):
         return self.sci
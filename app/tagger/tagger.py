@@ -1,4 +1,5 @@
 import json
+import math
 import os
 import re
 from typing import List, Union
@@ -116,9 +117,21 @@ def is_multivalue_tag(tag: str):
     return tag in multivalue_tags
 
 
+def file_signature(filename: str) -> (int, int):
+    """
+    The size and modification time of a file, which change whenever the file is rewritten
+    """
+    try:
+        status = os.stat(filename)
+    except OSError:
+        return None
+    return status.st_size, status.st_mtime_ns
+
+
 class Tagger(object):
     def __init__(self):
         self.tags: dict[str, str] = {}
+        self.written: dict[str, (int, (int, int))] = {}  # filename: (tags hash, file signature) of the last tags written this run
 
     def clear(self):
         self.tags = {}
@@ -203,9 +216,56 @@ class Tagger(object):
 
     # https://github.com/supermihi/pytaglib/blob/39aabb26f4d6016c110794361b20b7fb76e64ecc/src/taglib.pyx#L43
 
-    def load_audio_file_tags(self, filename: str):
+    statistics_tags: [] = ['asr', 'channels', 'converter', 'duration', 'frame rate', 'full scale decibels', 'max full scale decibels', 'max possible amplitude', 'max', 'rms', 'sample width']
+
+    import pydub
+
+    @staticmethod
+    def statistics(recording: pydub.AudioSegment, envelope=None) -> {}:
+        """
+        Generate the audio statistics metadata values from an already decoded recording (mimicking YouTube Download option 'writeinfojson': True)
+        Args:
+        :param recording: the decoded audio recording held in memory
+        :param envelope:  the envelope of the recording, the levels are taken from it rather than by scanning the samples
+        """
+        if envelope is not None:
+            maximum: int = min(int(recording.max_possible_amplitude), int(envelope.peak() * recording.max_possible_amplitude))
+            rms: int = int(envelope.rms() * recording.max_possible_amplitude)
+            return {
+                'asr': recording.frame_rate,
+                'channels': recording.channels,
+                'converter': recording.converter,
+                'duration': int(recording.duration_seconds),
+                'frame rate': recording.frame_rate,
+                'full scale decibels': 20 * math.log10(rms / recording.max_possible_amplitude) if rms else -float("infinity"),
+                'max full scale decibels': 20 * math.log10(maximum / recording.max_possible_amplitude) if maximum else -float("infinity"),
+                'max possible amplitude': recording.max_possible_amplitude,
+                'max': maximum,
+                'rms': rms,
+                'sample width': recording.sample_width
+            }
+        return {
+            'asr': recording.frame_rate,
+            'channels': recording.channels,
+            'converter': recording.converter,
+            'duration': int(recording.duration_seconds),
+            'frame rate': recording.frame_rate,
+            'full scale decibels': recording.dBFS,
+            'max full scale decibels': recording.max_dBFS,
+            'max possible amplitude': recording.max_possible_amplitude,
+            'max': recording.max,
+            'rms': recording.rms,
+            'sample width': recording.sample_width
+        }
+
+    def load_audio_file_tags(self, filename: str, recording: pydub.AudioSegment = None, statistics: bool = True):
         """
         Read tags from an audio file
+        Args:
+        :param filename:   the audio file
+        :param recording:  the already decoded audio of the file, from which the statistics metadata values are taken
+        :param statistics: generate the statistics metadata values (when no recording is provided the values already loaded,
+                           e.g., from the metadata file record, are reused and the file is only decoded when there are none)
         """
         import pydub
         import taglib
@@ -220,21 +280,16 @@ class Tagger(object):
             Logger.warning(f"Audio file {filename} could not be opened to retrieve metadata")
             return self
 
-        recording: pydub.AudioSegment = pydub.AudioSegment.from_file(filename)
-
-        Logger.debug(f"Generating additional metadata values (minicking YouTube Download option 'writeinfojson': True)", separator=True)
-        metadata['asr'] = recording.frame_rate
-        metadata['channels'] = recording.channels
-        metadata['converter'] = recording.converter
-        metadata['duration'] = int(recording.duration_seconds)
-        metadata['filesize'] = os.path.getsize(filename)
-        metadata['frame rate'] = recording.frame_rate
-        metadata['full scale decibels'] = recording.dBFS
-        metadata['max full scale decibels'] = recording.max_dBFS
-        metadata['max possible amplitude'] = recording.max_possible_amplitude
-        metadata['max'] = recording.max
-        metadata['rms'] = recording.rms
-        metadata['sample width'] = recording.sample_width
+        if statistics:
+            if recording is not None:
+                Logger.debug(f"Generating additional metadata values from the decoded recording", separator=True)
+                metadata.update(Tagger.statistics(recording))
+            elif all(self.exists(tag) for tag in Tagger.statistics_tags):
+                Logger.debug(f"Reusing additional metadata values from the metadata record", separator=True)
+            else:
+                Logger.debug(f"Generating additional metadata values by decoding {filename}", separator=True)
+                metadata.update(Tagger.statistics(pydub.AudioSegment.from_file(filename)))
+            metadata['filesize'] = os.path.getsize(filename)
 
         for tag, value in metadata.items():
             tag = tag.lower()
@@ -250,10 +305,14 @@ class Tagger(object):
 
     def write_audio_file_tags(self, filename: str):
         """
-        Write tags to an audio file
+        Write tags to an audio file (skipped when the same tags were already written to the file, and it has not been rewritten since)
         """
         import taglib
 
+        if self.is_written(filename):
+            Logger.debug(f"Tags of audio file {filename} are unchanged")
+            return self
+
         Logger.debug(f"Saving tags to audio file {filename}", separator=True)
 
         for tag, value in self.tags.items():
@@ -269,9 +328,23 @@ class Tagger(object):
             file.close()
         except IOError as error:
             Logger.error(f"Was not able to write audio file {filename} metadata {error}")
+            return self
 
+        self.mark_written(filename)
         return self
 
+    def tags_hash(self) -> int:
+        return hash(tuple(sorted(self.tags.items())))
+
+    def is_written(self, filename: str) -> bool:
+        """
+        Were the current tags already written to the file during this run
+        """
+        return self.written.get(filename) == (self.tags_hash(), file_signature(filename))
+
+    def mark_written(self, filename: str) -> None:
+        self.written[filename] = (self.tags_hash(), file_signature(filename))
+
     def load_metadata_file(self, filename: str):
         """
         Read audio recording metadata from a YouTube Downloader format JSON file
@@ -308,9 +381,14 @@ class Tagger(object):
     def write_downloader_metadata(self, filename: str):
         """
         Write audio recording metadata to a YouTube Downloader format JSON file
+        (skipped when the same tags were already written to the file, and it has not been rewritten since)
         Args:
         :param filename: YouTube Downloader format JSON file to be created
         """
+        if self.is_written(filename):
+            Logger.debug(f"Metadata file {filename} is unchanged")
+            return filename
+
         Logger.debug(f"Saving tags to metadata file {filename}", separator=True)
 
         metadata: dict[str, Union[str, List[str]]] = {}
@@ -329,17 +407,29 @@ class Tagger(object):
                 json.dump(metadata, json_file, ensure_ascii=False, indent=4)
         except IOError as error:
             Logger.error(f"Was not able to overwrite YouTube Download metadata file {error}")
+            return filename
 
+        self.mark_written(filename)
         return filename
 
-    def synchronize_metadata(self, media_filename: str, metadata_filename: str):
+    def synchronize_metadata(self, media_filename: str, metadata_filename: str, recording: pydub.AudioSegment = None, source_filename: str = None):
+        """
+        Merge the metadata file and audio file tags in memory, then write each file once
+        Args:
+        :param media_filename:    the media (video or audio) file
+        :param metadata_filename: the YouTube Download metadata file
+        :param recording:         the already decoded audio of the media file (avoids decoding the file to generate the statistics metadata values)
+        :param source_filename:   a media file the media file was converted from, whose tags are merged but which is not rewritten
+        """
         Logger.debug(f"Reading and rewriting metadata for:", separator=True)
         Logger.debug(f"  - Media (video or audio) file: {media_filename}")
         Logger.debug(f"  - YouTube Download metadata file: {metadata_filename}")
 
         self.clear()
         self.load_metadata_file(metadata_filename)
-        self.load_audio_file_tags(media_filename)
+        if source_filename is not None:
+            self.load_audio_file_tags(source_filename, statistics=False)
+        self.load_audio_file_tags(media_filename, recording=recording)
         self.derive_clip_title()
         self.write_downloader_metadata(metadata_filename)
         self.write_audio_file_tags(media_filename)
@@ -0,0 +1,69 @@
+"""
+Vocal slicer tests
+"""
+import os
+import sys
+import unittest
+
+application_directory: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path[0:0] = [application_directory] + [os.path.join(application_directory, name) for name in sorted(os.listdir(application_directory))
+                                          if os.path.isdir(os.path.join(application_directory, name)) and not name.startswith('_')]
+
+
+class VocalSlicerTest(unittest.TestCase):
+    """
+    A synthetic voiced burst (a harmonic tone with vowel like formants) in a quiet stereo recording is sliced in fast mode
+    """
+    frame_rate: int = 22050
+    burst_begin: float = 2.0  # seconds
+    burst_end: float = 4.0  # seconds
+    duration: float = 6.0  # seconds
+
+    @staticmethod
+    def recording(frame_rate: int, burst_begin: float, burst_end: float, duration: float):
+        import numpy
+        import pydub
+
+        generator = numpy.random.default_rng(0)
+        time = numpy.arange(int(duration * frame_rate)) / frame_rate
+        pitch: float = 150  # hz
+        formants: [(float, float)] = [(700, 130), (1200, 70), (2600, 160)]  # hz and bandwidth, an 'a' vowel
+        voice = numpy.zeros_like(time)
+        for harmonic in range(1, int(frame_rate / 2 / pitch)):
+            frequency: float = harmonic * pitch
+            amplitude: float = sum(numpy.exp(-0.5 * ((frequency - center) / bandwidth) ** 2) for center, bandwidth in formants) + 0.02
+            voice += amplitude * numpy.sin(2 * numpy.pi * frequency * time * (1 + 0.01 * numpy.sin(2 * numpy.pi * 5 * time)))
+        voice *= ((burst_begin <= time) & (time < burst_end)) / numpy.abs(voice).max()
+        samples = 0.5 * voice + 0.001 * generator.standard_normal(len(time))
+        return pydub.AudioSegment((samples * 32767).astype(numpy.int16).tobytes(), frame_rate=frame_rate, sample_width=2, channels=1).set_channels(2)
+
+    def test_fast_mode_interval(self):
+        from features import Features
+        from vocal import VocalSlicer
+
+        recording = VocalSlicerTest.recording(self.frame_rate, self.burst_begin, self.burst_end, self.duration)
+        sci = VocalSlicer(1, {'mode': 'fast', 'weight': 2}, recording).get()
+
+        self.assertEqual(1, len(sci.begin))
+        tolerance: int = int(0.15 * self.frame_rate)  # the smoothing spreads the boundaries by about half its width
+        self.assertAlmostEqual(self.burst_begin * self.frame_rate, int(sci.begin[0]), delta=tolerance)
+        self.assertAlmostEqual(self.burst_end * self.frame_rate, int(sci.end[0]), delta=tolerance)
+        self.assertEqual(0, (int(sci.begin[0]) % Features.stft_hop))
+        self.assertEqual(2, int(sci.weight[0]))
+        self.assertEqual(1, int(sci.stage[0]))
+
+    def test_fast_mode_segment_offset(self):
+        from vocal import VocalSlicer
+
+        recording = VocalSlicerTest.recording(self.frame_rate, self.burst_begin, self.burst_end, self.duration)
+        whole = VocalSlicer(1, {'mode': 'fast'}, recording).get()
+        segment = VocalSlicer(1, {'mode': 'fast', 'begin': 1000, 'end': 5000}, recording).get()  # miliseconds
+
+        self.assertEqual(1, len(segment.begin))
+        tolerance: int = int(0.15 * self.frame_rate)
+        self.assertAlmostEqual(int(whole.begin[0]), int(segment.begin[0]), delta=tolerance)
+        self.assertAlmostEqual(int(whole.end[0]), int(segment.end[0]), delta=tolerance)
+
+
+if __name__ == '__main__':
+    unittest.main()